@@ -0,0 +1,467 @@
+from __future__ import annotations
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from session_pool import SessionPool
+from timing import StepTimings, measure
+
+# requests is imported by the HttpBackend itself, so the GUI starts without loading it
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+
+# Device fields written and read by the backends
+NAME_FIELD_ID = 'PhysicalIdentification.UserApplicationName'
+LABEL_FIELD_ID = 'ElectricalTopology.Label'
+UNIT_ID_FIELD_ID = 'Device.Component_virtual_device_elements.unit_id'
+CURRENT_FLOW_FIELD_ID = 'ElectricalCharacteristics.CurrentFlow'
+SOURCE_ID_FIELD_ID = 'ZigBeeGreenPowerDevice.Identification_elements.source_id'
+DISCOVERY_STATUS_FIELD_ID = 'ZigBeePermitJoin.Information_elements.disco_status'
+
+# Titles of the real-time values used to check the readings, in the order of the returned tuple
+READING_TITLES = ('Total power factor', 'Active power A', 'Active power B', 'Active power C')
+
+# Readings of a PowerTag: total power factor and active power of phases A, B and C
+Readings = Tuple[str, str, str, str]
+
+
+class DeviceInfo(NamedTuple):
+    """
+    A device known to the gateway with its current settings.
+    """
+    device: object
+    rfid: str
+    name: str
+    label: str
+    unit_id: str
+    current_flow: str = ''
+
+
+def device_info(device, fields: Dict[str, object]) -> DeviceInfo:
+    """
+    Builds the description of a device from its fields as returned by the web backend of the gateway.
+
+    :param device: Handle of the device.
+    :param fields: Dictionary mapping the field ID to its value.
+    :return: The device with its RFID (last 4 digits of the source ID), name, label, virtual server ID and
+        direction of the current flow.
+    """
+    return DeviceInfo(device, str(fields.get(SOURCE_ID_FIELD_ID) or '')[-4::], str(fields.get(NAME_FIELD_ID) or ''),
+                      str(fields.get(LABEL_FIELD_ID) or ''), str(fields.get(UNIT_ID_FIELD_ID) or ''),
+                      str(fields.get(CURRENT_FLOW_FIELD_ID) or ''))
+
+
+def evaluate_readings(pf: str, pa: str, pb: str, pc: str) -> int:
+    """
+    Evaluates the readings of a PowerTag.
+
+    :param pf: Total power factor.
+    :param pa: Active power of phase A.
+    :param pb: Active power of phase B, not a number for single-phase PowerTags.
+    :param pc: Active power of phase C, not a number for single-phase PowerTags.
+    :return: -1 - Current flow needs to be change; 0 - Electrical or other problem to check by engineer,
+        1 - readings are OK
+    """
+    if is_float(pa) and is_float(pf):
+        if is_float(pb) and is_float(pc):
+            if float(pa) > 0 and float(pb) > 0 and float(pc) > 0 and float(pf) > 0.5:
+                return 1
+            elif float(pa) < 0 and float(pb) < 0 and float(pc) < 0 and float(pf) < 0.5:
+                return -1
+        else:
+            if float(pa) > 0 and float(pf) > 0.5:
+                return 1
+            elif float(pa) < 0 and float(pf) < 0.5:
+                return -1
+    return 0
+
+
+def is_float(string: str) -> bool:
+    """
+    Check if the given string can be converted to float.
+
+    :param string: String to check.
+    :return: Boolean information whether the string is a floating point number.
+    """
+    try:
+        float(string)
+        return True
+    except ValueError:
+        return False
+
+
+class BackendError(Exception):
+    """
+    Raised when a backend is unable to carry out an operation on the gateway.
+    """
+
+
+class Backend(ABC):
+    """
+    Interface of the ways of reading and writing the PowerTag settings on a PAS600 gateway.
+    """
+
+    # Whether the backend may be used from several threads at the same time
+    thread_safe = False
+
+    def __init__(self, timings: Optional[StepTimings] = None) -> None:
+        """
+        :param timings: Optional collection the durations of the waits are recorded in.
+        """
+        self.timings = timings
+
+    @abstractmethod
+    def open(self, url: str, password: str) -> None:
+        """
+        Connects to the gateway and logs in.
+
+        :param url: URL of the gateway.
+        :param password: Password to log in to the gateway.
+        """
+
+    @abstractmethod
+    def search_for_new_powertags(self) -> None:
+        """
+        Runs the ZigBee discovery of new PowerTags and waits until it is finished.
+        """
+
+    def show_devices(self) -> None:
+        """
+        Shows the list of the devices known to the gateway, which the search for new PowerTags otherwise does,
+        e.g. before only checking the readings of the configured PowerTags.
+        """
+
+    def start_discovery(self) -> bool:
+        """
+        Starts the ZigBee discovery of new PowerTags without waiting for it to finish.
+
+        :return: True if the discovery has been started, False if the backend can only run the whole search
+            with search_for_new_powertags.
+        """
+        return False
+
+    def discovery_running(self) -> bool:
+        """
+        :return: True while the ZigBee discovery started by start_discovery is still searching.
+        """
+        return False
+
+    def stop_discovery(self) -> None:
+        """
+        Ends the ZigBee discovery early, e.g. once all expected PowerTags have been found.
+        """
+
+    @abstractmethod
+    def devices(self) -> Iterable:
+        """
+        Yields handles of the devices known to the gateway, the iteration ends when open_device returns None.
+        """
+
+    @abstractmethod
+    def open_device(self, device) -> Optional[str]:
+        """
+        Opens a device for configuration.
+
+        :param device: Handle of the device.
+        :return: Full RFID (source ID) of the device, or None if the device does not exist.
+        """
+
+    def inventory(self, first: int = 0) -> Optional[List[DeviceInfo]]:
+        """
+        Lists the devices known to the gateway with their current settings in one query.
+
+        :param first: Number of devices at the start of the list to leave out, e.g. those already listed while
+            the search is running, as joining devices are added at the end of the list.
+        :return: The devices, or None if the backend cannot list them, the devices are then opened one by one.
+        """
+        return None
+
+    def import_configuration(self, configuration: Dict[str, object]) -> bool:
+        """
+        Applies the settings of many devices in a single import operation.
+
+        :param configuration: Configuration generated by bulk_config.generate_configuration.
+        :return: True if the configuration has been imported, False if the backend can only write the devices
+            one by one.
+        :raises BackendError: If the gateway rejected the configuration, none of its settings are applied then.
+        """
+        return False
+
+    def select_device(self, device) -> None:
+        """
+        Makes a device the current one before it is read or written again after other devices were opened.
+
+        :param device: Handle of the device.
+        """
+
+    @abstractmethod
+    def write_device(self, device, name: str, label: str, unit_id: str) -> None:
+        """
+        Writes the name, label and virtual Modbus server ID of a device and saves them.
+
+        :param device: Handle of the device.
+        :param name: Name of the PowerTag.
+        :param label: Label of the PowerTag.
+        :param unit_id: Virtual Modbus server ID of the PowerTag.
+        """
+
+    @abstractmethod
+    def read_values(self, device) -> Optional[Readings]:
+        """
+        Reads the current readings of a device.
+
+        :param device: Handle of the device.
+        :return: Total power factor and active power of phases A, B and C, or None if they are not available.
+        """
+
+    @abstractmethod
+    def reverse_current_flow(self, device) -> None:
+        """
+        Changes the direction of the current flow of a device to 'Reverse' and saves it.
+
+        :param device: Handle of the device.
+        """
+
+    def quit(self) -> None:
+        """
+        Closes the connection to the gateway.
+        """
+
+
+class HttpBackend(Backend):
+    """
+    Configures PowerTags with direct HTTP calls against the web backend of the gateway, without a browser.
+
+    The paths and payloads of the web backend are assumptions: they are the ones served by simulator.py and have
+    not been confirmed against a PAS600. The paths of a real gateway are given with endpoints, see load_endpoints.
+    """
+
+    thread_safe = True
+
+    # Assumed paths of the web backend, replaced by the endpoints given to the backend
+    LOGIN_PATH = '/api/login'
+    DISCOVERY_PATH = '/api/discovery'
+    DEVICES_PATH = '/api/devices'
+    CONFIGURATION_PATH = '/api/configuration'
+    # Attributes of the paths by their name in an endpoints file
+    ENDPOINT_NAMES = {'login': 'LOGIN_PATH', 'discovery': 'DISCOVERY_PATH', 'devices': 'DEVICES_PATH',
+                      'configuration': 'CONFIGURATION_PATH'}
+    USERNAME = 'SecurityAdmin'
+
+    def __init__(self, timings: Optional[StepTimings] = None, session: Optional[requests.Session] = None,
+                 pool_size: int = 4, timeout: float = 10, verify: bool = False,
+                 pool: Optional[SessionPool] = None, endpoints: Optional[Dict[str, str]] = None) -> None:
+        """
+        :param timings: Optional collection the durations of the waits are recorded in.
+        :param session: Optional session to use, a pooled session is created if not given.
+        :param pool_size: Number of connections kept open to the gateway.
+        :param timeout: Timeout of a single request in seconds.
+        :param verify: Whether to verify the TLS certificate of the gateway, which is self-signed by default.
+        :param pool: Optional pool keeping the session and its cookies warm between runs, it is then taken
+            from the pool when the gateway is opened.
+        :param endpoints: Optional paths of the web backend by name ('login', 'discovery', 'devices',
+            'configuration'), replacing the assumed ones.
+        :raises ValueError: If an endpoint name is unknown.
+        """
+        super().__init__(timings)
+        for name, path in (endpoints or {}).items():
+            if name not in self.ENDPOINT_NAMES:
+                raise ValueError(f"Unknown endpoint '{name}', expected one of {', '.join(self.ENDPOINT_NAMES)}.")
+            setattr(self, self.ENDPOINT_NAMES[name], path)
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.verify = verify
+        self.pool = pool
+        self.base_url = ''
+        self.password: Optional[str] = None
+        self.session = session or (None if pool else self._new_session())
+
+    def _new_session(self) -> requests.Session:
+        """
+        Creates a session keeping a pool of connections open to the gateway.
+
+        :return: The session.
+        """
+        import requests
+        import urllib3
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=2)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.verify = self.verify
+        if not self.verify:
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        return session
+
+    def _request(self, method: str, path: str, relogin: bool = True, **kwargs) -> requests.Response:
+        """
+        Sends a request to the gateway. When the session has expired, which the gateway answers with 401 or
+        a redirect to the login page, it logs in again and repeats the request once.
+
+        :param method: HTTP method.
+        :param path: Path of the endpoint.
+        :param relogin: Whether to log in again if the session has expired.
+        :return: The response.
+        :raises BackendError: If the request failed.
+        """
+        import requests
+        if self.timings:
+            self.timings.count('round_trips')
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=self.timeout,
+                                            allow_redirects=False, **kwargs)
+            if (response.status_code == 401 or response.is_redirect) and relogin and self.password is not None:
+                logger.info(f"The session of {self.base_url} has expired, logging in again.")
+                self.login()
+                return self._request(method, path, relogin=False, **kwargs)
+            if response.is_redirect:
+                raise BackendError(f"{method} {path} failed: redirected to {response.headers.get('Location')}")
+            response.raise_for_status()
+            return response
+        except requests.RequestException as e:
+            raise BackendError(f"{method} {path} failed: {e}") from e
+
+    def login(self) -> None:
+        """
+        Logs in to the gateway and stores the cookies of the new session in the pool.
+        """
+        with measure(self.timings, 'login'):
+            self._request('POST', self.LOGIN_PATH, relogin=False,
+                          json={'username': self.USERNAME, 'password': self.password})
+        logger.info(f"Logged in to {self.base_url}.")
+        if self.pool and self.pool.cookies:
+            self.pool.cookies.save(self.base_url, [{'name': cookie.name, 'value': cookie.value,
+                                                    'path': cookie.path, 'expiry': cookie.expires}
+                                                   for cookie in self.session.cookies])
+
+    def open(self, url: str, password: str) -> None:
+        self.base_url = url.rstrip('/')
+        self.password = password
+        if self.pool:
+            self.session = self.pool.http_session(self.base_url, self._new_session)
+            if not self.session.cookies and self.pool.cookies:
+                for cookie in self.pool.cookies.load(self.base_url):
+                    self.session.cookies.set(cookie['name'], cookie['value'], path=cookie.get('path') or '/',
+                                             expires=cookie.get('expiry'))
+            if self.session.cookies:
+                try:
+                    self._request('GET', self.DISCOVERY_PATH, relogin=False)
+                    logger.info(f"Reusing the session of {self.base_url}.")
+                    return
+                except BackendError:
+                    self.session.cookies.clear()
+                    logger.info(f"The stored session of {self.base_url} is no longer valid.")
+        self.login()
+
+    def search_for_new_powertags(self, timeout: float = 120, poll_interval: float = 1) -> None:
+        self.start_discovery()
+        start = time.perf_counter()
+        try:
+            while time.perf_counter() - start < timeout:
+                if not self.discovery_running():
+                    logger.info("Search completed.")
+                    return
+                time.sleep(poll_interval)
+            logger.error("Search for new PowerTags has not finished in time.")
+        finally:
+            if self.timings:
+                self.timings.record('search', time.perf_counter() - start)
+
+    def start_discovery(self) -> bool:
+        self._request('POST', self.DISCOVERY_PATH)
+        logger.info("Searching for new PowerTags...")
+        return True
+
+    def discovery_running(self) -> bool:
+        return self._request('GET', self.DISCOVERY_PATH).json().get(DISCOVERY_STATUS_FIELD_ID) == "Searching"
+
+    def stop_discovery(self) -> None:
+        self._request('DELETE', self.DISCOVERY_PATH)
+        logger.info("Search stopped.")
+
+    def devices(self) -> Iterable[str]:
+        for device in self._request('GET', self.DEVICES_PATH).json():
+            yield device['id']
+
+    def inventory(self, first: int = 0) -> Optional[List[DeviceInfo]]:
+        with measure(self.timings, 'inventory'):
+            devices = self._request('GET', self.DEVICES_PATH).json()
+        return [device_info(device['id'], device) for device in devices[first:]]
+
+    def import_configuration(self, configuration: Dict[str, object]) -> bool:
+        with measure(self.timings, 'import'):
+            self._request('POST', self.CONFIGURATION_PATH, json=configuration)
+        logger.info(f"Configuration of {len(configuration['devices'])} PowerTags imported.")
+        return True
+
+    def open_device(self, device: str) -> Optional[str]:
+        start = time.perf_counter()
+        fields = {}
+        try:
+            fields = self._request('GET', f'{self.DEVICES_PATH}/{device}').json()
+        finally:
+            if self.timings:
+                self.timings.record('device_form', time.perf_counter() - start,
+                                    rfid=(fields.get(SOURCE_ID_FIELD_ID) or '')[-4::])
+        return fields.get(SOURCE_ID_FIELD_ID)
+
+    def _write_fields(self, device: str, fields: Dict[str, str]) -> None:
+        """
+        Writes the given fields of a device.
+
+        :param device: Identifier of the device.
+        :param fields: Dictionary mapping the field ID to its new value.
+        """
+        start = time.perf_counter()
+        try:
+            self._request('PATCH', f'{self.DEVICES_PATH}/{device}', json=fields)
+        finally:
+            if self.timings:
+                self.timings.record('save', time.perf_counter() - start)
+
+    def write_device(self, device: str, name: str, label: str, unit_id: str) -> None:
+        self._write_fields(device, {NAME_FIELD_ID: name, LABEL_FIELD_ID: label, UNIT_ID_FIELD_ID: unit_id})
+
+    def read_values(self, device: str) -> Optional[Readings]:
+        start = time.perf_counter()
+        try:
+            values = self._request('GET', f'{self.DEVICES_PATH}/{device}/realtime').json()
+        finally:
+            if self.timings:
+                self.timings.record('readings', time.perf_counter() - start)
+        if not all(title in values for title in READING_TITLES):
+            logger.warning("Some of values not found.")
+            return None
+        return tuple(str(values[title]).strip() for title in READING_TITLES)
+
+    def reverse_current_flow(self, device: str) -> None:
+        self._write_fields(device, {CURRENT_FLOW_FIELD_ID: 'Reverse'})
+
+    def quit(self) -> None:
+        # A pooled session stays open for the next run against the gateway
+        if self.session and not self.pool:
+            self.session.close()
+
+
+def load_endpoints(endpoints_path: str) -> Dict[str, str]:
+    """
+    Reads the paths of the web backend of a gateway from a JSON file, e.g. {"devices": "/api/v2/devices"}.
+    The paths not given keep their assumed defaults.
+
+    :param endpoints_path: Path to the endpoints file.
+    :return: Dictionary mapping the endpoint name to its path.
+    :raises ValueError: If the file does not map known endpoint names to paths.
+    """
+    with open(endpoints_path, encoding='utf-8') as endpoints_file:
+        endpoints = json.load(endpoints_file)
+    if not isinstance(endpoints, dict) or not all(isinstance(path, str) for path in endpoints.values()):
+        raise ValueError(f"{endpoints_path} does not map endpoint names to paths.")
+    unknown = set(endpoints) - set(HttpBackend.ENDPOINT_NAMES)
+    if unknown:
+        raise ValueError(f"{endpoints_path} has unknown endpoints: {', '.join(sorted(unknown))}.")
+    return endpoints
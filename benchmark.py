@@ -0,0 +1,235 @@
+import csv
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List
+
+from file_operations import File
+from main import BACKENDS, configure_devices
+from pipeline import Sampling
+from simulator import GatewaySimulator
+from timing import StepTimings
+
+logger = logging.getLogger(__name__)
+
+PASSWORD = 'password'
+
+# Modules which must not be loaded before the GUI window is shown
+HEAVY_MODULES = ('selenium', 'pandas', 'numpy', 'requests')
+
+# Imports the GUI entry point in a fresh interpreter and prints the import time and the heavy modules loaded
+STARTUP_PROBE = (
+    "import sys, time\n"
+    "start = time.perf_counter()\n"
+    "import main, gui\n"
+    "elapsed = time.perf_counter() - start\n"
+    "print(elapsed)\n"
+    "print(','.join(name for name in {modules!r} if name in sys.modules))\n"
+)
+
+
+def _serve(queue: multiprocessing.Queue, options: Dict) -> None:
+    """
+    Runs a gateway simulator in a child process and sends its URL back through the queue.
+
+    :param queue: Queue the URL of the simulator is put into.
+    :param options: Keyword arguments of the GatewaySimulator.
+    """
+    simulator = GatewaySimulator(**options)
+    queue.put(simulator.start())
+    simulator.thread.join()
+
+
+def project_rfids(count: int) -> List[str]:
+    """
+    Returns the RFIDs of a simulated project, unique for up to 65536 PowerTags.
+
+    :param count: Number of PowerTags in the project.
+    :return: List of RFIDs as 4 hex digits.
+    """
+    return [f"{(0x1000 + index) % 0x10000:04X}" for index in range(count)]
+
+
+def write_project(file_path: str, rfids: List[str]) -> None:
+    """
+    Writes a project CSV file with one PowerTag per RFID.
+
+    :param file_path: Path of the CSV file.
+    :param rfids: RFIDs of the PowerTags.
+    """
+    with open(file_path, 'w', newline='', encoding='utf-8') as project:
+        writer = csv.writer(project, delimiter=';')
+        writer.writerow(['Name', 'RF ID', 'Fuse'])
+        for index, rfid in enumerate(rfids, start=1):
+            writer.writerow([f"PT{index:04d}", rfid, f"F{index}"])
+
+
+def run_benchmark(count: int, backend: str = 'http', latency: float = 0.0, jitter: float = 0.0,
+                  sample_interval: float = 0.0, bulk: bool = False) -> Dict:
+    """
+    Configures a simulated gateway with the given number of PowerTags and measures the run.
+
+    The simulator runs in a separate process, so the measured memory is the one of the configuration only.
+
+    :param count: Number of simulated PowerTags.
+    :param backend: Name of the backend to benchmark.
+    :param latency: Delay of every response of the simulator in seconds.
+    :param jitter: Maximum random delay in seconds added to the latency.
+    :param sample_interval: Time in seconds between two samples of the readings of a PowerTag.
+    :param bulk: Whether to import the settings of all PowerTags in a single operation.
+    :return: Dictionary with the throughput, the per-phase latencies, the number of round trips to the gateway and
+        the peak memory of the run.
+    """
+    rfids = project_rfids(count)
+    queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve, daemon=True,
+                                     args=(queue, {'rfids': rfids, 'password': PASSWORD, 'latency': latency,
+                                                   'jitter': jitter}))
+    server.start()
+    configured = []
+    try:
+        url = queue.get(timeout=30)
+        with tempfile.TemporaryDirectory() as directory:
+            project = os.path.join(directory, 'project.csv')
+            write_project(project, rfids)
+            timings = StepTimings(url)
+            gateway = BACKENDS[backend](timings)
+            # Loads pandas before measuring, so the first size does not count its import in the peak memory
+            File(project).load_data()
+
+            start = time.perf_counter()
+            gateway.open(url, PASSWORD)
+            # Traced from the login on, once the libraries of the backend have been imported
+            tracemalloc.start()
+            gateway.search_for_new_powertags()
+            configure_devices(gateway, project, os.path.join(directory, 'checked.csv'),
+                              lambda name, status: configured.append(name) if status == 'configured' else None,
+                              sampling=Sampling(interval=sample_interval), bulk=bulk)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            gateway.quit()
+    finally:
+        server.terminate()
+        server.join()
+
+    return {'count': count,
+            'backend': backend + (' (bulk)' if bulk else ''),
+            'configured': len(configured),
+            'seconds': elapsed,
+            'tags_per_minute': len(configured) / elapsed * 60 if elapsed else 0.0,
+            'peak_memory_mb': peak / 2 ** 20,
+            'round_trips': timings.counters.get('round_trips', 0),
+            'phases': timings.summary()}
+
+
+def benchmark_lookups(count: int, lookups: int = 10000) -> Dict:
+    """
+    Measures the mean time of File.get_information and File.mark_mounted in a project of the given size.
+
+    :param count: Number of PowerTags in the project.
+    :param lookups: Number of measured lookups and updates.
+    :return: Dictionary with the mean lookup and update time in microseconds.
+    """
+    rfids = project_rfids(count)
+    logging.disable(logging.WARNING)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            project = os.path.join(directory, 'project.csv')
+            write_project(project, rfids)
+            file_object = File(project)
+            file_object.load_data()
+        # Only the unique RFIDs are looked up, spread evenly over the file
+        unique = min(count, 0x10000)
+        probes = [rfids[(index * 7919) % unique] for index in range(lookups)]
+        start = time.perf_counter()
+        names = [file_object.get_information(rfid)[0] for rfid in probes]
+        lookup_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for name in names:
+            file_object.mark_mounted(name, 'OK')
+        update_time = time.perf_counter() - start
+    finally:
+        logging.disable(logging.NOTSET)
+    return {'count': count,
+            'lookup_us': lookup_time / lookups * 1e6,
+            'update_us': update_time / lookups * 1e6}
+
+
+def benchmark_startup(runs: int = 5) -> Dict:
+    """
+    Measures the time of importing the GUI entry point in a fresh interpreter, as done when the application starts.
+
+    :param runs: Number of measured starts, the fastest one is reported.
+    :return: Dictionary with the import time in seconds and the heavy modules loaded by the import.
+    """
+    probe = STARTUP_PROBE.format(modules=HEAVY_MODULES)
+    times = []
+    loaded: List[str] = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', probe], check=True, capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.splitlines()
+        times.append(float(output[0]))
+        loaded = [name for name in output[1].split(',') if name] if len(output) > 1 else []
+    return {'seconds': min(times), 'loaded': loaded}
+
+
+def print_report(result: Dict) -> None:
+    """
+    Prints the result of a benchmark run.
+
+    :param result: Result returned by run_benchmark.
+    """
+    print(f"{result['count']} PowerTags ({result['backend']}): {result['configured']} configured in "
+          f"{result['seconds']:.1f} s, {result['tags_per_minute']:.0f} tags/min, "
+          f"peak memory {result['peak_memory_mb']:.1f} MB")
+    print(f"    {result['round_trips']} round trips, "
+          f"{result['round_trips'] / max(result['configured'], 1):.1f} per configured PowerTag")
+    for phase, stats in result['phases'].items():
+        print(f"    {phase:<12} n={stats['count']:<6} p50={stats['p50'] * 1000:8.1f} ms  "
+              f"p95={stats['p95'] * 1000:8.1f} ms  max={stats['max'] * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmarks of the PowerTag configuration.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    throughput = commands.add_parser('throughput', help="Configuration throughput against a simulated PAS600.")
+    throughput.add_argument('--sizes', type=int, nargs='+', default=[20, 200, 2000], help="Numbers of PowerTags.")
+    throughput.add_argument('--backend', choices=sorted(BACKENDS), default='http', help="Backend to benchmark.")
+    throughput.add_argument('--latency', type=float, default=0.0, help="Delay of every simulator response in seconds.")
+    throughput.add_argument('--jitter', type=float, default=0.0, help="Maximum random delay added to the latency.")
+    throughput.add_argument('--sample-interval', type=float, default=0.0,
+                            help="Time in seconds between two samples of the readings of a PowerTag.")
+    throughput.add_argument('--bulk', action='store_true',
+                            help="Import the settings of all PowerTags in a single operation.")
+    lookup = commands.add_parser('lookup', help="Time of RFID lookups and updates in the project file.")
+    lookup.add_argument('--sizes', type=int, nargs='+', default=[20, 1000, 10000, 100000],
+                        help="Numbers of PowerTags.")
+    startup = commands.add_parser('startup', help="Import time of the GUI entry point.")
+    startup.add_argument('--runs', type=int, default=5, help="Number of measured starts.")
+    startup.add_argument('--budget', type=float, default=0.5, help="Maximum allowed import time in seconds.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    if args.command == 'startup':
+        result = benchmark_startup(args.runs)
+        print(f"GUI import {result['seconds'] * 1000:.0f} ms, heavy modules loaded: "
+              f"{', '.join(result['loaded']) or 'none'}")
+        if result['seconds'] > args.budget or result['loaded']:
+            sys.exit(1)
+    elif args.command == 'lookup':
+        for size in args.sizes:
+            result = benchmark_lookups(size)
+            print(f"{result['count']:>7} PowerTags: lookup {result['lookup_us']:6.1f} us, "
+                  f"update {result['update_us']:6.1f} us")
+    else:
+        for size in args.sizes:
+            print_report(run_benchmark(size, args.backend, args.latency, args.jitter, args.sample_interval,
+                                       args.bulk))
@@ -0,0 +1,170 @@
+import json
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from backends import CURRENT_FLOW_FIELD_ID, LABEL_FIELD_ID, NAME_FIELD_ID, UNIT_ID_FIELD_ID, DeviceInfo
+from file_operations import File, normalize_rfid
+
+logger = logging.getLogger(__name__)
+
+# Version of the configuration file, the gateway rejects files of other versions
+CONFIGURATION_VERSION = 1
+
+
+def configuration_entries(file_object: File, rfids: Optional[Iterable[str]] = None) -> List[Dict[str, object]]:
+    """
+    Lists the settings of every PowerTag of a loaded file as entries of the configuration file.
+
+    Rows without a name, fuse or valid RFID and rows repeating an RFID are left out, as a run would skip them.
+    The current flow is only set for the PowerTags found reversed by an earlier check, the others keep the current
+    flow of the gateway until their readings are checked.
+
+    :param file_object: File with the loaded PowerTags data.
+    :param rfids: Optional normalized RFIDs of the PowerTags to include, all PowerTags of the file if not given.
+    :return: The entries in the order of the file.
+    """
+    wanted = set(rfids) if rfids is not None else None
+    entries = []
+    data = file_object.all_data
+    for label, name, raw_rfid, fuse in zip(data.index, data['Name'], data['RF ID'], data['Fuse']):
+        rfid = normalize_rfid(raw_rfid)
+        if not rfid or not name or not fuse or file_object.rfid_index.get(rfid) != label:
+            continue
+        if wanted is not None and rfid not in wanted:
+            continue
+        fields = {NAME_FIELD_ID: name, LABEL_FIELD_ID: fuse, UNIT_ID_FIELD_ID: name[-2::]}
+        if file_object.get_result(name, 'Issues') == '-1':
+            fields[CURRENT_FLOW_FIELD_ID] = 'Reverse'
+        entries.append({'rfid': rfid, 'fields': fields})
+    return entries
+
+
+def generate_configuration(file_object: File, rfids: Optional[Iterable[str]] = None) -> Dict[str, object]:
+    """
+    Generates the configuration file of a gateway from a loaded project file, without connecting to the gateway.
+
+    :param file_object: File with the loaded PowerTags data.
+    :param rfids: Optional normalized RFIDs of the PowerTags to include, all PowerTags of the file if not given.
+    :return: The configuration, ready to be saved or imported.
+    """
+    return {'version': CONFIGURATION_VERSION, 'devices': configuration_entries(file_object, rfids)}
+
+
+def configuration_text(configuration: Dict[str, object]) -> str:
+    """
+    :param configuration: The configuration of a gateway.
+    :return: The configuration as saved, the same for the same project file so it can be compared to a golden file.
+    """
+    return json.dumps(configuration, indent=1, sort_keys=True, ensure_ascii=False) + '\n'
+
+
+def save_configuration(configuration: Dict[str, object], path: str) -> None:
+    """
+    Saves the configuration of a gateway as a JSON file.
+
+    :param configuration: The configuration of a gateway.
+    :param path: Path of the configuration file.
+    """
+    with open(path, 'w', encoding='utf-8', newline='\n') as configuration_file:
+        configuration_file.write(configuration_text(configuration))
+    logger.info(f"Configuration of {len(configuration['devices'])} PowerTags saved to {path}.")
+
+
+def load_configuration(path: str) -> Dict[str, object]:
+    """
+    Loads a configuration file saved by save_configuration.
+
+    :param path: Path of the configuration file.
+    :return: The configuration of a gateway.
+    :raises ValueError: If the file is not a configuration file of a supported version.
+    """
+    with open(path, encoding='utf-8') as configuration_file:
+        configuration = json.load(configuration_file)
+    if not isinstance(configuration, dict) or configuration.get('version') != CONFIGURATION_VERSION:
+        raise ValueError(f"{path} is not a configuration file of version {CONFIGURATION_VERSION}.")
+    return configuration
+
+
+def verify_configuration(configuration: Dict[str, object], inventory: List[DeviceInfo]
+                         ) -> Tuple[Dict[str, DeviceInfo], Dict[str, str]]:
+    """
+    Compares the settings read back from the gateway with the imported configuration.
+
+    :param configuration: The imported configuration.
+    :param inventory: The devices known to the gateway with their current settings.
+    :return: The devices carrying their configuration and the problems of the other ones, both by RFID.
+    """
+    devices = {normalize_rfid(info.rfid): info for info in inventory}
+    confirmed, problems = {}, {}
+    for entry in configuration['devices']:
+        rfid, fields = entry['rfid'], entry['fields']
+        info = devices.get(rfid)
+        if info is None:
+            problems[rfid] = "not found on the gateway"
+            continue
+        current = {NAME_FIELD_ID: info.name, LABEL_FIELD_ID: info.label, UNIT_ID_FIELD_ID: info.unit_id,
+                   CURRENT_FLOW_FIELD_ID: info.current_flow}
+        differences = [f"{field} is '{current[field]}' instead of '{value}'"
+                       for field, value in fields.items() if current.get(field) != value]
+        if differences:
+            problems[rfid] = ', '.join(differences)
+        else:
+            confirmed[rfid] = info
+    return confirmed, problems
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Generate the configuration file of a gateway from a project file "
+                                                 "and optionally import it in one operation.")
+    parser.add_argument('file', help="Semicolon separated project file with the columns Name, RF ID and Fuse, "
+                                     "or a configuration file saved before.")
+    parser.add_argument('-o', '--output', help="Path the configuration file is saved to.")
+    parser.add_argument('--check', help="Golden configuration file the generated one must be equal to.")
+    parser.add_argument('--upload', metavar='URL', help="URL of the gateway to import the configuration into.")
+    parser.add_argument('--password', help="Password of the gateway, asked for if not given.")
+    parser.add_argument('--endpoints', help="JSON file with the paths of the gateway's web backend, the assumed "
+                                            "paths are those of simulator.py.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.file.lower().endswith('.json'):
+        # A configuration generated earlier, e.g. offline before the site visit
+        generated = load_configuration(args.file)
+    else:
+        project = File(args.file)
+        if project.load_data() is None:
+            sys.exit(2)
+        generated = generate_configuration(project)
+    if args.output:
+        save_configuration(generated, args.output)
+    elif not args.check and not args.upload:
+        sys.stdout.write(configuration_text(generated))
+    if args.check:
+        with open(args.check, encoding='utf-8') as golden:
+            if golden.read() != configuration_text(generated):
+                logger.error(f"The generated configuration differs from {args.check}.")
+                sys.exit(1)
+        logger.info(f"The generated configuration matches {args.check}.")
+    if args.upload:
+        import getpass
+        from backends import BackendError, HttpBackend, load_endpoints
+
+        if not args.endpoints:
+            logger.warning("No --endpoints given, the assumed paths of the web backend have not been confirmed "
+                           "against a PAS600.")
+        gateway = HttpBackend(endpoints=load_endpoints(args.endpoints) if args.endpoints else None)
+        try:
+            gateway.open(args.upload, args.password if args.password is not None else getpass.getpass())
+            gateway.import_configuration(generated)
+            _, failed = verify_configuration(generated, gateway.inventory())
+        except BackendError as e:
+            logger.error(f"The configuration could not be imported: {e}")
+            sys.exit(1)
+        for failed_rfid, problem in failed.items():
+            logger.error(f"{failed_rfid}: {problem}")
+        logger.info(f"{len(generated['devices']) - len(failed)} of {len(generated['devices'])} PowerTags confirmed.")
+        gateway.quit()
+        sys.exit(1 if failed else 0)
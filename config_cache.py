@@ -0,0 +1,222 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, NamedTuple, Optional, Set
+
+from backends import DeviceInfo
+from file_operations import normalize_rfid
+from session_pool import gateway_key
+
+logger = logging.getLogger(__name__)
+
+# File the configurations confirmed on the gateways are kept in between runs
+CONFIG_CACHE_FILE = "PowerTags_config_cache.json"
+
+
+class CachedConfig(NamedTuple):
+    """
+    Configuration of a PowerTag as last read back and confirmed on its gateway, with the verdict of its readings.
+    """
+    name: str
+    label: str
+    unit_id: str
+    current_flow: str
+    verdict: str
+    confidence: str = ''
+    samples: str = ''
+
+    def matches(self, info: DeviceInfo) -> bool:
+        """
+        Checks whether the gateway still reports the confirmed settings of the device.
+
+        :param info: The device with its current settings.
+        :return: True if the name, label, virtual server ID and, when both are known, the current flow match.
+        """
+        return ((self.name, self.label, self.unit_id) == (info.name, info.label, info.unit_id)
+                and (not self.current_flow or not info.current_flow or self.current_flow == info.current_flow))
+
+
+class ConfigCache:
+    """
+    Keeps the confirmed configuration of every PowerTag on disk, keyed by gateway and RFID, so re-runs only visit
+    the PowerTags whose configuration differs from the CSV or from what the gateway reports.
+    """
+
+    def __init__(self, path: str = CONFIG_CACHE_FILE) -> None:
+        """
+        :param path: Path of the cache file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, Dict[str, Dict[str, str]]]:
+        try:
+            with open(self.path, encoding='utf-8') as cache_file:
+                return json.load(cache_file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unable to read the configuration cache {self.path}, ignoring it: {e}")
+            return {}
+
+    def _write(self, cache: Dict[str, Dict[str, Dict[str, str]]]) -> None:
+        temporary = f"{self.path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as cache_file:
+            json.dump(cache, cache_file, indent=1, sort_keys=True)
+        os.replace(temporary, self.path)
+
+    def load(self, url: str) -> Dict[str, CachedConfig]:
+        """
+        Returns the confirmed configurations of a gateway.
+
+        :param url: URL of the gateway.
+        :return: Dictionary mapping the RFID to its configuration.
+        """
+        with self._lock:
+            entries = self._read().get(gateway_key(url), {})
+        configs = {}
+        for rfid, entry in entries.items():
+            try:
+                configs[rfid] = CachedConfig(**{field: entry[field] for field in CachedConfig._fields
+                                                if field in entry})
+            except TypeError:
+                logger.warning(f"Ignoring the incomplete cache entry of {rfid} on {gateway_key(url)}.")
+        return configs
+
+    def save(self, url: str, configs: Dict[str, CachedConfig]) -> None:
+        """
+        Stores the confirmed configurations of a gateway, replacing the previous ones.
+
+        :param url: URL of the gateway.
+        :param configs: Dictionary mapping the RFID to its configuration.
+        """
+        now = round(time.time())
+        with self._lock:
+            cache = self._read()
+            cache[gateway_key(url)] = {rfid: dict(config._asdict(), time=now) for rfid, config in configs.items()}
+            try:
+                self._write(cache)
+            except OSError as e:
+                logger.warning(f"Unable to save the configuration cache {self.path}: {e}")
+
+    def forget(self, url: str, rfids: Optional[Iterable[str]] = None) -> None:
+        """
+        Removes cached configurations, e.g. after a gateway has been reset to its factory settings.
+
+        :param url: URL of the gateway.
+        :param rfids: RFIDs of the PowerTags to forget, all PowerTags of the gateway if not given.
+        """
+        with self._lock:
+            cache = self._read()
+            key = gateway_key(url)
+            if rfids is None:
+                cache.pop(key, None)
+            else:
+                for rfid in rfids:
+                    cache.get(key, {}).pop(rfid, None)
+            try:
+                self._write(cache)
+            except OSError as e:
+                logger.warning(f"Unable to save the configuration cache {self.path}: {e}")
+        logger.info(f"Configuration cache of {key} cleared.")
+
+    def snapshot(self, url: str) -> 'ConfigSnapshot':
+        """
+        :param url: URL of the gateway.
+        :return: The cached configurations of the gateway for a run.
+        """
+        return ConfigSnapshot(self, url)
+
+
+class ConfigSnapshot:
+    """
+    Cached configurations of a single gateway during a run, written back to the cache at its end.
+    """
+
+    def __init__(self, cache: ConfigCache, url: str) -> None:
+        """
+        :param cache: The cache the configurations are loaded from and saved to.
+        :param url: URL of the gateway.
+        """
+        self.cache = cache
+        self.url = url
+        self.configs = cache.load(url)
+        # Current flow of the devices as last reported by the gateway, by RFID
+        self.flows: Dict[str, str] = {}
+        # RFIDs whose cached configuration the gateway no longer reports, they are visited again
+        self.stale: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def confirmed(self, info: DeviceInfo) -> Optional[CachedConfig]:
+        """
+        Returns the cached configuration of a device if the gateway still reports it. A cached configuration
+        the gateway no longer reports, e.g. after a factory reset, is dropped.
+
+        :param info: The device with its current settings.
+        :return: The cached configuration, or None if there is none or it is out of date.
+        """
+        rfid = normalize_rfid(info.rfid)
+        with self._lock:
+            if info.current_flow:
+                self.flows[rfid] = info.current_flow
+            config = self.configs.get(rfid)
+            if config is None or config.matches(info):
+                return config
+            logger.info(f"The gateway no longer reports the cached configuration of {rfid}, dropping it.")
+            del self.configs[rfid]
+            self.stale.add(rfid)
+            return None
+
+    def prune(self, rfids: Iterable[str]) -> None:
+        """
+        Drops the cached configurations of the PowerTags no longer known to the gateway.
+
+        :param rfids: Normalized RFIDs of all devices known to the gateway.
+        """
+        present = set(rfids)
+        with self._lock:
+            gone = [rfid for rfid in self.configs if rfid not in present]
+            for rfid in gone:
+                del self.configs[rfid]
+        if gone:
+            logger.info(f"Dropped the cached configuration of {len(gone)} PowerTags no longer on the gateway.")
+
+    def confirm(self, rfid: str, name: str, label: str, reply: int, confidence: str = '', samples: str = '') -> None:
+        """
+        Caches the configuration of a PowerTag whose settings have been saved and whose readings have been checked.
+
+        :param rfid: Normalized RFID of the PowerTag.
+        :param name: Name of the PowerTag.
+        :param label: Label of the PowerTag.
+        :param reply: Verdict of the readings as returned by evaluate_readings.
+        :param confidence: Share of the samples agreeing with the verdict.
+        :param samples: Number of samples the verdict was reached from.
+        """
+        with self._lock:
+            # A reversed PowerTag has just had its current flow changed
+            current_flow = 'Reverse' if reply == -1 else self.flows.get(rfid, '')
+            self.configs[rfid] = CachedConfig(name, label, name[-2::], current_flow, str(reply), confidence, samples)
+
+    def save(self) -> None:
+        """
+        Writes the configurations back to the cache.
+        """
+        with self._lock:
+            configs = dict(self.configs)
+        self.cache.save(self.url, configs)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Clear the cached configuration of a gateway, e.g. after it has "
+                                                 "been reset to its factory settings.")
+    parser.add_argument('url', help="URL of the gateway.")
+    parser.add_argument('--rfid', nargs='+', help="RFIDs of the PowerTags to forget, all of the gateway if not given.")
+    parser.add_argument('--cache', default=CONFIG_CACHE_FILE, help="Path of the cache file.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    ConfigCache(args.cache).forget(args.url, [normalize_rfid(rfid) for rfid in args.rfid] if args.rfid else None)
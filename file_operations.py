@@ -1,23 +1,69 @@
-import pandas as pd
-from typing import Optional, Tuple, List
+import re
+from typing import TYPE_CHECKING, Dict, Optional, Tuple, List
 import logging
+from journal import Journal, JournalState
+
+# The cache needs the RFID normalization of this module
+if TYPE_CHECKING:
+    from config_cache import ConfigSnapshot
 
 logger = logging.getLogger(__name__)
 
+# RFID turned into a number in scientific notation by Excel, e.g. '5E37' saved as '5,00E+37'
+EXCEL_EXPONENT = re.compile(r'^(\d+)(?:[.,](\d*))?E\+?(\d+)$')
+HEX_DIGITS = re.compile(r'^[0-9A-F]+$')
+
+# Columns holding the results of a run: the mounting, the verdict of the readings, the share of the samples
+# of the readings agreeing with the verdict and the number of samples taken
+RESULT_COLUMNS = ('Mounted', 'Issues', 'Confidence', 'Samples')
+
+
+def normalize_rfid(value) -> str:
+    """
+    Normalizes an RFID to its canonical key of 4 uppercase hex digits.
+
+    Leading zeros dropped by spreadsheets are restored and IDs such as '5E37' mangled by Excel into
+    scientific notation ('5,00E+37') are recovered.
+
+    :param value: RFID as read from the file or from the gateway.
+    :return: The canonical RFID, or an empty string if the value is not a valid RFID.
+    """
+    if value is None or (isinstance(value, float) and value != value):
+        return ''
+    rfid = str(value).strip().upper()
+    if rfid.startswith('0X'):
+        rfid = rfid[2:]
+    mangled = EXCEL_EXPONENT.match(rfid)
+    if mangled:
+        mantissa, fraction, exponent = mangled.groups()
+        if fraction and fraction.strip('0'):
+            return ''
+        rfid = f"{mantissa}E{exponent}"
+    if not rfid or not HEX_DIGITS.match(rfid):
+        return ''
+    return rfid[-4:].zfill(4)
+
+
 class File:
     """
     Handles operations on a file containing data about PowerTags,
     including loading data, retrieving specific information, and updating the file.
     """
 
-    def __init__(self, file_path: str) -> None:
+    def __init__(self, file_path: str, sep: str = ';') -> None:
         """
         Initializes the File object with a path to the data file.
 
         :param file_path: The path to the CSV file.
+        :param sep: Separator of the columns in the CSV file.
         """
         self.file_path = file_path
+        self.sep = sep
         self.all_data = None  # This will hold the DataFrame after loading
+        self.rfid_index: Dict[str, int] = {}  # Normalized RFID -> row label
+        self.name_index: Dict[str, int] = {}  # Name -> row label
+        self.journal: Optional[Journal] = None  # Every change of a result is recorded here when set
+        self.snapshot: Optional['ConfigSnapshot'] = None  # Confirmed configurations are cached here when set
 
     def check_data_loaded(self) -> bool:
         """
@@ -36,12 +82,19 @@ class File:
 
         :return: List of tuples containing the data, or None if an error occurred.
         """
+        # pandas is imported here, so the GUI starts without loading it
+        import pandas as pd
         required_columns = ['Name', 'RF ID', 'Fuse']
         try:
-            self.all_data = pd.read_csv(self.file_path, usecols=required_columns)
+            # Everything is read as text, so RFIDs such as '0987' or '5E37' are not turned into numbers
+            self.all_data = pd.read_csv(self.file_path, sep=self.sep, usecols=required_columns, dtype=str,
+                                        keep_default_na=False)
             if len(self.all_data.columns) != len(required_columns):
                 logging.critical("Error: Required columns (Name, RF ID, Fuse) not found in the file.")
                 return None
+            for column in RESULT_COLUMNS:
+                self.all_data[column] = ''
+            self.build_indexes()
             data_tuples = [tuple(x) for x in self.all_data.to_numpy()]
             return data_tuples
         except FileNotFoundError:
@@ -53,6 +106,25 @@ class File:
         except Exception as e:
             logging.critical(f"An unexpected error occurred: {type(e).__name__}, {e}")
 
+    def build_indexes(self) -> None:
+        """
+        Builds the RFID -> row and Name -> row indexes used for constant time lookups.
+        When an RFID or a name occurs more than once, the first row is used.
+        """
+        self.rfid_index = {}
+        self.name_index = {}
+        for label, name, raw_rfid in zip(self.all_data.index, self.all_data['Name'], self.all_data['RF ID']):
+            rfid = normalize_rfid(raw_rfid)
+            if rfid:
+                if rfid in self.rfid_index:
+                    logging.warning(f"RFID {rfid} of PowerTag '{name}' is duplicated, it will be ignored.")
+                else:
+                    self.rfid_index[rfid] = label
+            elif raw_rfid:
+                logging.warning(f"RFID '{raw_rfid}' of PowerTag '{name}' is not valid.")
+            if name and name not in self.name_index:
+                self.name_index[name] = label
+
     def get_information(self, rfid: str) -> Tuple[str, str]:
         """
         Retrieves the Name and Fuse based on the provided RFID.
@@ -63,14 +135,26 @@ class File:
         if not self.check_data_loaded():
             return '', ''
 
-        row = self.all_data[self.all_data['RF ID'] == rfid]
-        if not row.empty:
+        label = self.rfid_index.get(normalize_rfid(rfid))
+        if label is not None:
             logging.info(f"Data for PowerTag with RFID: {rfid} found.")
-            return row.iloc[0]['Name'], row.iloc[0]['Fuse']
+            return self.all_data.at[label, 'Name'], self.all_data.at[label, 'Fuse']
 
         logging.warning(f"PowerTag with RFID: {rfid} not found.")
         return '', ''
 
+    def get_rfid(self, name: str) -> Tuple[str, str]:
+        """
+        Retrieves the normalized RFID and the Fuse of a PowerTag based on its name.
+
+        :param name: Name of the PowerTag.
+        :return: Tuple containing the RFID and Fuse, or empty strings if not found.
+        """
+        label = self.name_index.get(name)
+        if label is None or not self.check_data_loaded():
+            return '', ''
+        return normalize_rfid(self.all_data.at[label, 'RF ID']), self.all_data.at[label, 'Fuse']
+
     def save_data(self, filename: str = "PowerTags_checked.csv") -> None:
         """
         Saves the DataFrame to a CSV file.
@@ -78,7 +162,7 @@ class File:
         :param filename: Name of the file to save the data.
         """
         if self.check_data_loaded():
-            self.all_data.to_csv(filename, index=False)
+            self.all_data.to_csv(filename, sep=self.sep, index=False)
             logging.info(f"Data successfully saved to {filename}.")
 
     def mark_mounted(self, name: str, new_val: str) -> None:
@@ -89,7 +173,13 @@ class File:
         :param new_val: Value to update in the 'Mounted' column.
         """
         if self.check_data_loaded():
-            self.all_data.loc[self.all_data['Name'] == name, 'Mounted'] = new_val
+            label = self.name_index.get(name)
+            if label is None:
+                logging.warning(f"PowerTag '{name}' not found.")
+                return
+            self.all_data.at[label, 'Mounted'] = new_val
+            if self.journal:
+                self.journal.append(name, 'Mounted', new_val)
             logging.info(f"PowerTag '{name}' marked as {new_val}.")
 
     def mark_correct_values(self, name: str, new_val: str) -> None:
@@ -101,5 +191,57 @@ class File:
         :param new_val: Value to set in the 'Issues' column.
         """
         if self.check_data_loaded():
-            self.all_data.loc[self.all_data['Name'] == name, 'Issues'] = new_val
+            label = self.name_index.get(name)
+            if label is None:
+                logging.warning(f"PowerTag '{name}' not found.")
+                return
+            self.all_data.at[label, 'Issues'] = new_val
+            if self.journal:
+                self.journal.append(name, 'Issues', new_val)
             logging.info(f"PowerTag '{name}' readings marked as {new_val}.")
+
+    def mark_confidence(self, name: str, confidence: float, samples: int) -> None:
+        """
+        Records how sure the verdict in the 'Issues' column of a PowerTag is.
+
+        :param name: Name of the PowerTag.
+        :param confidence: Share of the samples of the readings agreeing with the verdict, between 0 and 1.
+        :param samples: Number of samples of the readings the verdict was reached from.
+        """
+        if self.check_data_loaded():
+            label = self.name_index.get(name)
+            if label is None:
+                logging.warning(f"PowerTag '{name}' not found.")
+                return
+            for column, value in (('Confidence', f"{confidence:.2f}"), ('Samples', str(samples))):
+                self.all_data.at[label, column] = value
+                if self.journal:
+                    self.journal.append(name, column, value)
+
+    def apply_results(self, state: JournalState) -> None:
+        """
+        Fills in the results recorded by a previous run without recording them again.
+
+        :param state: Dictionary mapping the PowerTag name to its recorded columns.
+        """
+        if not self.check_data_loaded():
+            return
+        for name, results in state.items():
+            label = self.name_index.get(name)
+            if label is None:
+                continue
+            for column, value in results.items():
+                self.all_data.at[label, column] = value
+
+    def get_result(self, name: str, column: str) -> str:
+        """
+        Returns the value of a result column of a PowerTag.
+
+        :param name: Name of the PowerTag.
+        :param column: Name of the column, e.g. 'Mounted' or 'Issues'.
+        :return: The value, or an empty string if the PowerTag or the column does not exist.
+        """
+        label = self.name_index.get(name)
+        if label is None or column not in self.all_data.columns:
+            return ''
+        return self.all_data.at[label, column]
@@ -0,0 +1,250 @@
+import csv
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+from multi_gateway import GatewayResult, GatewayTarget, configure_gateway, gateway_name, load_manifest, merge_results
+
+logger = logging.getLogger(__name__)
+
+# Environment variable holding the password of the gateways without a password of their own
+PASSWORD_ENV = 'POWERTAGS_PASSWORD'
+# File the results of all gateways are written to
+RESULTS_FILE = "PowerTags_fleet_results.json"
+# Site of the gateways given on the command line instead of in a manifest
+COMMAND_LINE_SITE = 'targets'
+
+# Exit codes: every PowerTag verified, some PowerTags need attention, a gateway could not be run
+# (2 is left to the usage errors reported by argparse)
+EXIT_OK, EXIT_ATTENTION, EXIT_FAILED = 0, 1, 3
+
+
+class SiteTarget(NamedTuple):
+    """
+    A gateway of the fleet with the site it belongs to.
+    """
+    site: str
+    target: GatewayTarget
+
+
+def load_targets(manifests: List[str], targets: Optional[List[Tuple[str, str]]] = None) -> List[SiteTarget]:
+    """
+    Collects the gateways of several sites, one manifest per site, and of the gateways given directly.
+
+    :param manifests: Paths to the site manifests, the site is named after the manifest file.
+    :param targets: Optional pairs of gateway URL and project file.
+    :return: The gateways in the order given.
+    """
+    fleet = []
+    for manifest in manifests:
+        site = os.path.splitext(os.path.basename(manifest))[0]
+        fleet.extend(SiteTarget(site, target) for target in load_manifest(manifest))
+    for url, file_path in targets or []:
+        fleet.append(SiteTarget(COMMAND_LINE_SITE, GatewayTarget(gateway_name(url), url, file_path)))
+    return fleet
+
+
+def load_credentials(credentials_path: str) -> Dict[str, str]:
+    """
+    Reads the passwords of the gateways from a semicolon separated file with the columns 'Password' and
+    'URL' or 'Gateway', kept apart from the manifests so they can be stored with restricted access.
+
+    :param credentials_path: Path to the credentials file.
+    :return: Dictionary mapping the gateway URL and name to its password.
+    """
+    credentials = {}
+    try:
+        with open(credentials_path, newline='', encoding='utf-8') as credentials_file:
+            for row in csv.DictReader(credentials_file, delimiter=';'):
+                password = (row.get('Password') or '').strip()
+                for key in ((row.get('URL') or '').strip(), (row.get('Gateway') or '').strip()):
+                    if key and password:
+                        credentials[key] = password
+    except FileNotFoundError:
+        logger.critical(f"Credentials not found at the specified path: {credentials_path}")
+    return credentials
+
+
+def with_passwords(fleet: List[SiteTarget], credentials: Dict[str, str],
+                   default: Optional[str] = None) -> List[SiteTarget]:
+    """
+    Completes the passwords of the gateways: the manifest first, then the credentials file, then the default.
+
+    :param fleet: The gateways of the fleet.
+    :param credentials: Passwords by gateway URL and name.
+    :param default: Password of the remaining gateways, e.g. from the environment.
+    :return: The gateways, without a password if none is known.
+    """
+    completed = []
+    for site, target in fleet:
+        password = target.password or credentials.get(target.url) or credentials.get(target.gateway) or default
+        completed.append(SiteTarget(site, target._replace(password=password)))
+    return completed
+
+
+def tag_counts(output_file: str, verify_only: bool = False) -> Dict[str, object]:
+    """
+    Counts the outcomes of the PowerTags in a result file.
+
+    :param output_file: Result file of a gateway.
+    :param verify_only: Whether the run only checked the readings, reversed PowerTags then still need attention.
+    :return: Dictionary with the number of PowerTags per outcome and the names of those needing attention.
+    """
+    data = pd.read_csv(output_file, sep=';', dtype=str, keep_default_na=False)
+    data = data[(data['Name'] != '') & (data['RF ID'] != '')]
+    issues = data['Issues'] if 'Issues' in data else pd.Series('', index=data.index)
+    attention = (issues == '0') | (issues == '') | ((issues == '-1') & verify_only)
+    return {'total': len(data),
+            'verified': int((issues == '1').sum()),
+            'reversed': int((issues == '-1').sum()),
+            'attention': int((issues == '0').sum()),
+            'unchecked': int((issues == '').sum()),
+            'needs_attention': data.loc[attention, 'Name'].tolist()}
+
+
+def gateway_record(site: str, target: GatewayTarget, result: GatewayResult, verify_only: bool = False
+                   ) -> Dict[str, object]:
+    """
+    :param site: Site of the gateway.
+    :param target: The gateway.
+    :param result: Result of the run of the gateway.
+    :param verify_only: Whether the run only checked the readings.
+    :return: The machine readable result of the gateway.
+    """
+    record = {'site': site, 'gateway': target.gateway, 'url': target.url, 'file': target.file_path,
+              'output_file': result.output_file, 'succeeded': result.succeeded,
+              'duration': round(result.duration, 1), 'error': result.error}
+    if result.succeeded:
+        record['powertags'] = tag_counts(result.output_file, verify_only)
+    return record
+
+
+def run_fleet(fleet: List[SiteTarget], max_workers: int = 4, output_dir: str = '.',
+              report_file: str = "PowerTags_site_report.csv", verify_only: bool = False,
+              **options) -> List[Dict[str, object]]:
+    """
+    Runs the gateways of all sites, at most max_workers at the same time, without any user interaction.
+    The results of every site are kept in a directory of their own with their merged site report.
+
+    :param fleet: The gateways of the fleet, with their passwords.
+    :param max_workers: Maximum number of gateways run at the same time.
+    :param output_dir: Directory the site directories are created in.
+    :param report_file: Name of the merged report in every site directory.
+    :param verify_only: Whether to only check the readings of the configured PowerTags without changing them.
+    :param options: Further keyword arguments of configure_start, e.g. backend, modbus_port, pipeline or pool.
+    :return: The machine readable results of all gateways in the order given.
+    """
+    results: Dict[int, GatewayResult] = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(fleet)))) as executor:
+        futures = {}
+        for index, (site, target) in enumerate(fleet):
+            if not target.password:
+                results[index] = GatewayResult(target.gateway, target.url, '', False, 0.0,
+                                               f"No password, set {PASSWORD_ENV} or add it to the credentials.")
+                continue
+            site_dir = os.path.join(output_dir, site)
+            os.makedirs(site_dir, exist_ok=True)
+            futures[executor.submit(configure_gateway, target, target.password, site_dir,
+                                    verify_only=verify_only, **options)] = index
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            logger.info(f"[{result.gateway}] {'Completed' if result.succeeded else 'Failed: ' + result.error}")
+
+    for site in dict.fromkeys(site for site, _ in fleet):
+        merge_results([results[index] for index, (other, _) in enumerate(fleet) if other == site],
+                      os.path.join(output_dir, site, report_file))
+    return [gateway_record(site, target, results[index], verify_only)
+            for index, (site, target) in enumerate(fleet)]
+
+
+def exit_code(records: List[Dict[str, object]]) -> int:
+    """
+    :param records: The machine readable results of all gateways.
+    :return: EXIT_FAILED if a gateway could not be run, EXIT_ATTENTION if a PowerTag is not verified, else EXIT_OK.
+    """
+    if any(not record['succeeded'] for record in records):
+        return EXIT_FAILED
+    if any(record['powertags']['needs_attention'] for record in records):
+        return EXIT_ATTENTION
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    from session_pool import SessionPool
+
+    parser = argparse.ArgumentParser(description="Configure or re-verify the PowerTags of many sites without the GUI, "
+                                                 "e.g. as a scheduled overnight job.",
+                                     epilog=f"Exit codes: {EXIT_OK} all PowerTags verified, {EXIT_ATTENTION} some "
+                                            f"PowerTags need attention, 2 usage error, {EXIT_FAILED} a gateway "
+                                            f"could not be run.")
+    parser.add_argument('manifests', nargs='*', help="Site manifests with the columns Gateway, URL, File, Password.")
+    parser.add_argument('--target', nargs=2, action='append', metavar=('URL', 'FILE'),
+                        help="A gateway and its project file, in addition to the manifests.")
+    parser.add_argument('--credentials', help="Semicolon separated file with the columns URL or Gateway and "
+                                              f"Password, the other gateways use ${PASSWORD_ENV}.")
+    parser.add_argument('--workers', type=int, default=4, help="Maximum number of gateways run at once.")
+    parser.add_argument('--output-dir', default='.', help="Directory the results of every site are saved to.")
+    parser.add_argument('--results', default=RESULTS_FILE, help="JSON file of the results, '-' for stdout.")
+    parser.add_argument('--report', default="PowerTags_site_report.csv", help="Name of the merged site reports.")
+    parser.add_argument('--backend', choices=['selenium', 'http'], default='selenium',
+                        help="Drive the web interface in headless Chrome or call the gateway's web backend directly.")
+    parser.add_argument('--endpoints', help="JSON file with the paths of the gateway's web backend used by the http "
+                                            "backend instead of the assumed ones.")
+    parser.add_argument('--modbus-port', type=int, help="Check the readings over Modbus TCP on this port.")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="Configure all PowerTags first and check their readings in batches afterwards.")
+    parser.add_argument('--bulk', action='store_true',
+                        help="Import the settings of all PowerTags of a gateway in a single operation.")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Configure and check all PowerTags, ignoring the configurations confirmed by earlier "
+                             "runs.")
+    parser.add_argument('--verify-only', action='store_true',
+                        help="Only check the readings of the configured PowerTags, without searching or changing "
+                             "any setting.")
+    args = parser.parse_args()
+    if args.endpoints and args.backend != 'http':
+        parser.error("--endpoints is only used by --backend http")
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s')
+
+    gateways = load_targets(args.manifests, args.target)
+    if not gateways:
+        parser.error("no gateways given, pass site manifests or --target URL FILE")
+    gateways = with_passwords(gateways, load_credentials(args.credentials) if args.credentials else {},
+                              os.environ.get(PASSWORD_ENV))
+
+    options = {'backend': args.backend, 'modbus_port': args.modbus_port, 'pipeline': args.pipeline,
+               'bulk': args.bulk}
+    if args.endpoints:
+        from backends import load_endpoints
+        options['endpoints'] = load_endpoints(args.endpoints)
+    if not args.verify_only and not args.no_cache:
+        from config_cache import ConfigCache
+        options['cache'] = ConfigCache()
+    sessions = SessionPool(headless=True)
+    start = time.monotonic()
+    try:
+        records = run_fleet(gateways, args.workers, args.output_dir, args.report, args.verify_only,
+                            pool=sessions, **options)
+    finally:
+        sessions.close()
+
+    code = exit_code(records)
+    summary = {'verify_only': args.verify_only, 'duration': round(time.monotonic() - start, 1),
+               'exit_code': code, 'gateways': records}
+    if args.results == '-':
+        json.dump(summary, sys.stdout, indent=1)
+        sys.stdout.write('\n')
+    else:
+        with open(args.results, 'w', encoding='utf-8') as results_file:
+            json.dump(summary, results_file, indent=1)
+        logger.info(f"Results of {len(records)} gateways saved to {args.results}.")
+    sys.exit(code)
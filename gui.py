@@ -1,15 +1,55 @@
 import tkinter as tk
-from tkinter import scrolledtext, messagebox
-import pandas as pd
-from main import configure_start
+from tkinter import scrolledtext, messagebox, ttk
+import importlib
+import queue
 import threading
 import logging
+from collections import Counter
+from typing import Dict, List, Tuple
+from urllib.parse import urlparse
 
 logger = logging.getLogger(__name__)
 
+# Heavy modules loaded in the background once the window is shown, the first click does not wait for them
+PRELOADED_MODULES = ('pandas', 'main', 'selenium.webdriver', 'requests')
+
+# Interval in milliseconds between two drains of the event queue
+EVENT_TICK_MS = 100
+# Maximum number of events applied in one tick, the rest waits for the next one so the window stays responsive
+EVENT_BATCH_SIZE = 5000
+# Number of log lines kept in the log area
+LOG_LINES = 5000
+
+# Statuses of a PowerTag in the order of the configuration, 'pending' until the worker reports on it
+STATUSES = ('pending', 'discovered', 'configured', 'verified', 'needs attention')
+STATUS_COLORS = {'verified': '#d4edda', 'needs attention': '#f8d7da', 'configured': '#fff3cd'}
+
+
+class QueueLogHandler(logging.Handler):
+    """
+    Logging handler passing the formatted records of any thread to the event queue of the GUI.
+    """
+
+    def __init__(self, events: queue.SimpleQueue) -> None:
+        """
+        :param events: Queue drained by the Tk main loop.
+        """
+        super().__init__()
+        self.events = events
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.events.put(('log', self.format(record)))
+        except Exception:
+            self.handleError(record)
+
+
 class Application(tk.Tk):
     """
     Application class for the CSV application GUI.
+
+    Configuration workers never touch the widgets: they put their progress, log records and results into a queue,
+    which the main loop drains on a fixed tick and applies in batches.
     """
     def __init__(self, file_path: str) -> None:
         """
@@ -21,9 +61,47 @@ class Application(tk.Tk):
         self.geometry('1000x1000')
         self.file_path = file_path
         self.driver = None
+        # Logged-in sessions kept warm between the runs of this window
+        self.sessions = None
+        # Configurations confirmed by earlier runs, only the differences are configured
+        self.cache = None
+        self.protocol('WM_DELETE_WINDOW', self.close)
+
+        # Events of the workers: ('status', (gateway, name, status)), ('log', line)
+        # or ('finished', (title, message, succeeded))
+        self.events: queue.SimpleQueue = queue.SimpleQueue()
+        # Rows of the status table by gateway and PowerTag name, their RFID and fuse, and their current status
+        self.rows: Dict[Tuple[str, str], str] = {}
+        self.row_details: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        self.row_status: Dict[Tuple[str, str], str] = {}
 
         # GUI elements
         self.create_widgets()
+        self.log_handler = QueueLogHandler(self.events)
+        self.log_handler.setFormatter(logging.Formatter('%(asctime)s - %(threadName)s - %(levelname)s - %(message)s'))
+        logging.getLogger().addHandler(self.log_handler)
+        logging.getLogger().setLevel(logging.INFO)
+        self.after(EVENT_TICK_MS, self.process_events)
+        self.after_idle(self.start_preload)
+
+    def start_preload(self) -> None:
+        """
+        Starts loading the heavy modules in a background thread after the window has been drawn.
+        :return: None
+        """
+        threading.Thread(target=self.preload, name='preload', daemon=True).start()
+
+    @staticmethod
+    def preload() -> None:
+        """
+        Imports the modules needed for loading and configuring, so they are ready when the user needs them.
+        :return: None
+        """
+        for module in PRELOADED_MODULES:
+            try:
+                importlib.import_module(module)
+            except ImportError as e:
+                logging.warning(f"Unable to preload {module}: {e}")
 
     def create_widgets(self) -> None:
         """
@@ -45,11 +123,44 @@ class Application(tk.Tk):
         self.password_entry = tk.Entry(self, show="*", width=50)
         self.password_entry.pack()
 
+        self.resume = tk.BooleanVar(self, value=False)
+        self.resume_check = tk.Checkbutton(self, text="Resume previous run", variable=self.resume)
+        self.resume_check.pack()
+
+        self.stream = tk.BooleanVar(self, value=False)
+        self.stream_check = tk.Checkbutton(self, text="Configure during search", variable=self.stream)
+        self.stream_check.pack()
+
+        self.show_browser = tk.BooleanVar(self, value=False)
+        self.show_browser_check = tk.Checkbutton(self, text="Show browser", variable=self.show_browser)
+        self.show_browser_check.pack()
+
         self.log_button = tk.Button(self, text='Configure CSV', command=self.configure)
         self.log_button.pack()
 
+        self.dry_run_button = tk.Button(self, text='Dry run', command=self.dry_run)
+        self.dry_run_button.pack()
+
+        # Live status of every PowerTag
+        self.summary_label = tk.Label(self, text="No PowerTags loaded.")
+        self.summary_label.pack()
+        table_frame = tk.Frame(self)
+        table_frame.pack(fill='both', expand=True)
+        self.status_table = ttk.Treeview(table_frame, columns=('gateway', 'name', 'rfid', 'fuse', 'status'),
+                                         show='headings', height=20)
+        for column, title, width in (('gateway', 'Gateway', 160), ('name', 'Name', 200), ('rfid', 'RF ID', 100),
+                                     ('fuse', 'Fuse', 200), ('status', 'Status', 160)):
+            self.status_table.heading(column, text=title)
+            self.status_table.column(column, width=width)
+        for status, color in STATUS_COLORS.items():
+            self.status_table.tag_configure(status.replace(' ', '_'), background=color)
+        scrollbar = ttk.Scrollbar(table_frame, orient='vertical', command=self.status_table.yview)
+        self.status_table.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side='right', fill='y')
+        self.status_table.pack(side='left', fill='both', expand=True)
+
         # Area for displaying logs
-        self.csv_area = scrolledtext.ScrolledText(self, state='disabled', height=30, width=120)
+        self.csv_area = scrolledtext.ScrolledText(self, state='disabled', height=15, width=120)
         self.csv_area.pack()
 
         # Other UI elements
@@ -58,49 +169,182 @@ class Application(tk.Tk):
 
     def load_csv(self) -> None:
         """
-        Load and display CSV data.
+        Load the CSV data into the status table.
         :return: None
         """
         try:
-            pd.set_option('display.max_columns', None)  # Display all columns
-            pd.set_option('display.width', 1000)  # Increase display width
-            df = pd.read_csv(self.file_path, sep=';')
+            import pandas as pd
+            df = pd.read_csv(self.file_path, sep=';', dtype=str, keep_default_na=False)
+            self.status_table.delete(*self.status_table.get_children())
+            self.rows.clear()
+            self.row_details.clear()
+            self.row_status.clear()
+            for name, rfid, fuse in zip(df['Name'], df['RF ID'], df['Fuse']):
+                if name and ('', name) not in self.rows:
+                    self.rows[('', name)] = self.status_table.insert('', tk.END,
+                                                                     values=('', name, rfid, fuse, 'pending'))
+                    self.row_details[('', name)] = (rfid, fuse)
+                    self.row_status[('', name)] = 'pending'
+            self.update_summary()
             messagebox.showinfo("Success", "CSV file has been loaded.")
-            self.csv_area.config(state='normal')
-            self.csv_area.delete(1.0, tk.END)  # Clear the area before inserting new data
-            self.csv_area.insert(tk.END, str(df) + '\n')
-            self.csv_area.config(state='disabled')
             logging.info("CSV file has been loaded.")
         except Exception as e:
             messagebox.showerror("Error", str(e))
             logging.error(f"Error loading CSV file: {e}")
 
+    def report_progress(self, gateway: str, name: str, status: str) -> None:
+        """
+        Queues a status change of a PowerTag, safe to call from any thread.
+        :param gateway: Name of the gateway.
+        :param name: Name of the PowerTag.
+        :param status: New status of the PowerTag.
+        :return: None
+        """
+        self.events.put(('status', (gateway, name, status)))
+
+    def process_events(self) -> None:
+        """
+        Drains the event queue and applies the events in batches, called by the main loop on every tick.
+        :return: None
+        """
+        statuses: Dict[Tuple[str, str], str] = {}
+        lines: List[str] = []
+        finished = []
+        for _ in range(EVENT_BATCH_SIZE):
+            try:
+                kind, payload = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'status':
+                gateway, name, status = payload
+                # Only the last status of a PowerTag within a batch is shown
+                statuses[(gateway, name)] = status
+            elif kind == 'log':
+                lines.append(payload)
+            elif kind == 'finished':
+                finished.append(payload)
+        if statuses:
+            self.update_statuses(statuses)
+        if lines:
+            self.append_log(lines)
+        self.after(EVENT_TICK_MS, self.process_events)
+        for title, message, succeeded in finished:
+            (messagebox.showinfo if succeeded else messagebox.showerror)(title, message)
+
+    def update_statuses(self, statuses: Dict[Tuple[str, str], str]) -> None:
+        """
+        Applies a batch of status changes to the status table.
+        :param statuses: Dictionary mapping the gateway and PowerTag name to its new status.
+        :return: None
+        """
+        for (gateway, name), status in statuses.items():
+            key = (gateway, name)
+            tags = (status.replace(' ', '_'),)
+            if key not in self.rows and ('', name) in self.rows:
+                # The first gateway reporting on a loaded PowerTag takes over its row
+                self.rows[key] = self.rows.pop(('', name))
+                self.row_details[key] = self.row_details.pop(('', name))
+                self.row_status.pop(('', name))
+            rfid, fuse = self.row_details.setdefault(key, ('', ''))
+            if key in self.rows:
+                self.status_table.item(self.rows[key], values=(gateway, name, rfid, fuse, status), tags=tags)
+            else:
+                self.rows[key] = self.status_table.insert('', tk.END, values=(gateway, name, rfid, fuse, status),
+                                                          tags=tags)
+            self.row_status[key] = status
+        self.update_summary()
+
+    def update_summary(self) -> None:
+        """
+        Shows the number of PowerTags in every status.
+        :return: None
+        """
+        counts = Counter(self.row_status.values())
+        self.summary_label.config(text=' | '.join(f"{status.capitalize()}: {counts[status]}" for status in STATUSES)
+                                  if counts else "No PowerTags loaded.")
+
+    def append_log(self, lines: List[str]) -> None:
+        """
+        Appends a batch of log lines to the log area, dropping the oldest lines beyond the limit.
+        :param lines: Formatted log records.
+        :return: None
+        """
+        self.csv_area.config(state='normal')
+        self.csv_area.insert(tk.END, '\n'.join(lines) + '\n')
+        excess = int(self.csv_area.index('end-1c').split('.')[0]) - LOG_LINES
+        if excess > 0:
+            self.csv_area.delete('1.0', f'{excess + 1}.0')
+        self.csv_area.config(state='disabled')
+        self.csv_area.see(tk.END)
+
     def configure(self, **kwargs) -> None:
         """
-        Configure the CSV application.
+        Configure the CSV application. Several gateways can be configured at the same time.
         :param kwargs: Additional parameters.
         :return: None
         """
         url = self.url_entry.get()
         password = self.password_entry.get()
         file_path = self.file_path
+        resume = self.resume.get()
+        stream = self.stream.get()
+        gateway = urlparse(url).netloc or url
+        if self.sessions is None:
+            from session_pool import SessionPool
+            self.sessions = SessionPool()
+        if self.cache is None:
+            from config_cache import ConfigCache
+            self.cache = ConfigCache()
+        # Applies to the browsers started from now on
+        self.sessions.headless = not self.show_browser.get()
 
         def run_configuration():
             try:
-                self.driver = configure_start(url, password, file_path)
+                from main import configure_start, gateway_output_file
+                # Every gateway has its own result file and journal, so runs at the same time do not overwrite them
+                self.driver = configure_start(url, password, file_path, gateway_output_file(gateway),
+                                              resume=resume, pool=self.sessions, stream=stream, cache=self.cache,
+                                              progress=lambda name, status: self.report_progress(gateway, name,
+                                                                                                 status))
                 if self.driver:
-                    messagebox.showinfo("Success", "Configuration successfully completed.")
+                    # Hands the logged-in session back to the pool, the browser stays open for the next run
+                    self.driver.quit()
+                    self.events.put(('finished', ("Success", f"{gateway}: Configuration successfully completed.",
+                                                  True)))
                     logging.info("Configuration successfully completed.")
                 else:
-                    messagebox.showerror("Error", "Configuration failed.")
+                    self.events.put(('finished', ("Error", f"{gateway}: Configuration failed.", False)))
                     logging.error("Configuration failed.")
             except Exception as e:
-                messagebox.showerror("Error", f"An error occurred during configuration: {e}")
+                self.events.put(('finished', ("Error", f"{gateway}: An error occurred during configuration: {e}",
+                                              False)))
                 logging.error(f"Error during configuration: {e}")
 
-        config_thread = threading.Thread(target=run_configuration)
+        config_thread = threading.Thread(target=run_configuration, name=gateway, daemon=True)
         config_thread.start()
 
+    def dry_run(self) -> None:
+        """
+        Checks the CSV file and estimates the run time without connecting to the gateway, the report is logged.
+        :return: None
+        """
+        url = self.url_entry.get()
+        file_path = self.file_path
+
+        def run_dry_run():
+            from planner import plan_project, report_lines
+            plan = plan_project(file_path, gateway=url or None)
+            if plan is None:
+                self.events.put(('finished', ("Error", "Unable to load the CSV file.", False)))
+                return
+            lines = report_lines(plan)
+            for line in lines:
+                logging.info(line)
+            # The last lines hold the totals and the estimated run time
+            self.events.put(('finished', ("Dry run", '\n'.join(lines[-2:]), not plan.problems)))
+
+        threading.Thread(target=run_dry_run, name='dry-run', daemon=True).start()
+
     def close_browser(self) -> None:
         """
         Close the browser window.
@@ -109,6 +353,17 @@ class Application(tk.Tk):
         if self.driver:
             self.driver.quit()
             self.driver = None
+        if self.sessions:
+            self.sessions.close()
+
+    def close(self) -> None:
+        """
+        Close the browsers kept for the next runs and the application window.
+        :return: None
+        """
+        logging.getLogger().removeHandler(self.log_handler)
+        self.close_browser()
+        self.destroy()
 
 if __name__ == "__main__":
     app = Application('data/PowerTags.csv')
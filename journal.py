@@ -0,0 +1,115 @@
+import csv
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+# Results of a run: PowerTag name -> column -> value
+JournalState = Dict[str, Dict[str, str]]
+
+
+class Journal:
+    """
+    Append-only journal of the results of a configuration run, synced to disk after every entry,
+    so a run that dies halfway can be resumed without losing what has already been done.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        :param path: Path of the journal file.
+        """
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    def start(self, resume: bool = False) -> JournalState:
+        """
+        Opens the journal for appending.
+
+        :param resume: Whether to keep the entries of the previous run, a new journal is started otherwise.
+        :return: Results recorded by the previous run, empty if not resuming.
+        """
+        state = self.replay() if resume else {}
+        self._file = open(self.path, 'a' if resume else 'w', encoding='utf-8')
+        if resume:
+            logger.info(f"Resuming from {self.path} with results of {len(state)} PowerTags.")
+        return state
+
+    def append(self, name: str, column: str, value: str) -> None:
+        """
+        Records a new value of a PowerTag's column and syncs it to disk.
+
+        :param name: Name of the PowerTag.
+        :param column: Column of the result, e.g. 'Mounted' or 'Issues'.
+        :param value: New value of the column.
+        """
+        if self._file is None:
+            return
+        entry = json.dumps({'time': time.time(), 'name': name, 'column': column, 'value': value})
+        with self._lock:
+            self._file.write(entry + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def replay(self) -> JournalState:
+        """
+        Reads the results recorded in the journal, later entries overriding earlier ones.
+        A last line cut off by a crash is ignored.
+
+        :return: Dictionary mapping the PowerTag name to its recorded columns.
+        """
+        state: JournalState = {}
+        try:
+            with open(self.path, encoding='utf-8') as journal:
+                for line in journal:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning(f"Skipping incomplete journal entry: {line.strip()}")
+                        continue
+                    state.setdefault(entry['name'], {})[entry['column']] = entry['value']
+        except FileNotFoundError:
+            logger.info(f"No journal found at {self.path}, starting from scratch.")
+        return state
+
+    def compact(self, source_path: str, filename: str, sep: str = ';') -> None:
+        """
+        Writes the project file with the results recorded in the journal filled in.
+        The file is written to a temporary file first and then moved into place.
+
+        :param source_path: Path to the project CSV file.
+        :param filename: Name of the file to save the data.
+        :param sep: Separator of the columns in the CSV files.
+        """
+        state = self.replay()
+        # Project files saved by Excel start with a byte order mark, which would otherwise end up in the first column
+        with open(source_path, newline='', encoding='utf-8-sig') as source:
+            reader = csv.DictReader(source, delimiter=sep)
+            columns = list(reader.fieldnames or [])
+            rows = list(reader)
+        # Result columns missing in the project file are added in the order they were first recorded
+        for column in dict.fromkeys(column for results in state.values() for column in results):
+            if column not in columns:
+                columns.append(column)
+        temporary = f"{filename}.tmp"
+        with open(temporary, 'w', newline='', encoding='utf-8') as target:
+            writer = csv.DictWriter(target, fieldnames=columns, delimiter=sep, extrasaction='ignore')
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(dict(row, **state.get(row.get('Name'), {})))
+            target.flush()
+            os.fsync(target.fileno())
+        os.replace(temporary, filename)
+        logger.info(f"Data successfully saved to {filename}.")
+
+    def close(self) -> None:
+        """
+        Closes the journal.
+        """
+        if self._file:
+            self._file.close()
+            self._file = None
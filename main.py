@@ -1,20 +1,32 @@
+from __future__ import annotations
 import getpass
 import logging
-from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
-from selenium.webdriver.chrome.webdriver import WebDriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import Select
-from file_operations import File
+from backends import (CURRENT_FLOW_FIELD_ID, LABEL_FIELD_ID, NAME_FIELD_ID, SOURCE_ID_FIELD_ID, UNIT_ID_FIELD_ID,
+                      Backend, BackendError, DeviceInfo, HttpBackend, READING_TITLES, Readings, device_info,
+                      evaluate_readings)
+from config_cache import ConfigCache, ConfigSnapshot
+from file_operations import File, normalize_rfid
+from journal import Journal
+from modbus import ModbusVerifier, unit_id
+from pipeline import (Pipeline, ProgressCallback, Sampling, Votes, already_verified, devices_to_visit,
+                      readings_verdict, record_verdict, sample_verdict, stream_devices)
+from session_pool import SessionPool
+from timing import EVENTS_FILE, StepTimings, measure, tagged
+import os
 import time
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+# Selenium is imported where it is used, so the GUI starts without loading the driver stack
+if TYPE_CHECKING:
+    from selenium import webdriver
+
 
 # Formatter configuration
-formatter = logging.Formatter('%%(name)s - %(levelname)s - %(message)s')
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
-# FileHandler configurationgi
-file_handler = logging.FileHandler('app.log')
+# FileHandler configuration
+file_handler = logging.FileHandler('app.log', delay=True)
 file_handler.setFormatter(formatter)
 
 # StreamHandler configuration
@@ -57,14 +69,260 @@ if (parentElement && parentElement.shadowRoot) {
 }
 """
 
+# Interval in seconds between two checks of a readiness condition
+POLL_INTERVAL = 0.1
+# Interval in seconds between two reads of the real-time values when waiting for them to settle
+READINGS_POLL_INTERVAL = 0.5
+
+DEVICE_TREE_PATH = ('/html/body/se-app/app-root/app-shell/se-container/app-tab/se-container/se-block/se-block-content'
+                    '/se-list/se-container/se-list/app-generic-treeview/app-generic-treeview-dumb/se-list-group')
+DEVICE_PATH = DEVICE_TREE_PATH + '/se-block[{}]'
+SOURCE_ID_FIELD = 'ZigBeeGreenPowerDevice.Identification_elements.source_id.value'
+NAME_FIELD = 'PhysicalIdentification.UserApplicationName_value'
+LABEL_FIELD = 'ElectricalTopology.Label'
+UNIT_ID_FIELD = 'Device.Component_virtual_device_elements.unit_id.value-number'
+DISCOVERY_STATUS_PATH = '//*[@id="ZigBeePermitJoin.Information_elements.disco_status"]'
+# Time in milliseconds the write script waits for the gateway to acknowledge the save
+WRITE_ACKNOWLEDGE_TIMEOUT = 10000
+# Time in milliseconds the device form may take to show a device while the device tree is listed
+INVENTORY_FORM_TIMEOUT = 20000
+# Inputs of the device form holding the device fields, by field ID
+FORM_INPUTS = {SOURCE_ID_FIELD_ID: SOURCE_ID_FIELD, NAME_FIELD_ID: NAME_FIELD, LABEL_FIELD_ID: LABEL_FIELD,
+               UNIT_ID_FIELD_ID: UNIT_ID_FIELD, CURRENT_FLOW_FIELD_ID: 'ElectricalCharacteristics.CurrentFlow'}
+
+# Returns the value of the RFID field once the device form and its Name field are rendered
+form_script = """
+var sourceId = document.getElementById(arguments[0]);
+var name = document.getElementById(arguments[1]);
+return sourceId && name ? sourceId.value : null;
+"""
+
+# Returns true once the save button of the form is gone or disabled, i.e. the form has been saved
+save_acknowledged_script = """
+var fab = document.querySelector('se-fab');
+var save = fab ? fab.querySelector('se-button[icon="action_save"]') : null;
+return !save || save.hasAttribute('disabled') || save.offsetParent === null;
+"""
+
+# Returns the texts of the table items following the items with the given titles, null if an item is missing
+readings_script = """
+return arguments[0].map(function (title) {
+    var item = document.querySelector('se-table-item[title="' + title + '"]');
+    var value = item ? item.nextElementSibling : null;
+    while (value && value.tagName.toLowerCase() !== 'se-table-item') {
+        value = value.nextElementSibling;
+    }
+    return value ? value.textContent.trim() : null;
+});
+"""
+
+
+# Sets the given form fields like typing would, saves the form through the se-fab button and waits in the page until
+# the gateway acknowledges it. Passes the status of every field ('ok', 'missing' or 'rejected') and of the save
+# ('ok', 'missing' or 'timeout') to the callback.
+write_script = """
+var values = arguments[0];
+var timeout = arguments[1];
+var callback = arguments[arguments.length - 1];
+var status = {};
+Object.keys(values).forEach(function (id) {
+    var input = document.getElementById(id);
+    if (!input) {
+        status[id] = 'missing';
+        return;
+    }
+    // The native setter bypasses the value tracking of the framework, which then sees the events as user input
+    var setter = Object.getOwnPropertyDescriptor(Object.getPrototypeOf(input), 'value').set;
+    setter.call(input, values[id]);
+    input.dispatchEvent(new Event('input', {bubbles: true}));
+    input.dispatchEvent(new Event('change', {bubbles: true}));
+    input.dispatchEvent(new Event('blur'));
+    status[id] = input.value === String(values[id]) ? 'ok' : 'rejected';
+});
+var fab = document.querySelector('se-fab');
+var menu = fab && fab.shadowRoot ? fab.shadowRoot.querySelector('se-button') : null;
+if (menu) menu.click();
+var save = fab ? fab.querySelector('se-button[icon="action_save"]') : null;
+if (!save) {
+    status.save = 'missing';
+    callback(status);
+    return;
+}
+save.click();
+var start = Date.now();
+(function acknowledged() {
+    if (save.hasAttribute('disabled') || save.offsetParent === null || !save.isConnected) {
+        status.save = 'ok';
+        callback(status);
+    } else if (Date.now() - start > timeout) {
+        status.save = 'timeout';
+        callback(status);
+    } else {
+        setTimeout(acknowledged, 50);
+    }
+})();
+"""
+
+# Returns the number of devices in the device tree
+device_count_script = """
+var tree = document.evaluate(arguments[0], document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+return tree ? tree.querySelectorAll(':scope > se-block').length : 0;
+"""
+
+# Opens every device of the tree in turn and passes the values of its form, in the order of the device tree, to the
+# callback; null if the tree is missing or a form has not been shown within the timeout. The first device is read
+# without waiting for the form to change if it is the one already shown.
+inventory_script = """
+var tree = document.evaluate(arguments[0], document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+var inputs = arguments[1];
+var sourceField = arguments[2];
+var firstShown = arguments[3];
+var timeout = arguments[4];
+var first = arguments[5];
+var callback = arguments[arguments.length - 1];
+var blocks = tree ? tree.querySelectorAll(':scope > se-block') : [];
+var devices = [];
+
+function read() {
+    var fields = {};
+    Object.keys(inputs).forEach(function (field) {
+        var input = document.getElementById(inputs[field]);
+        fields[field] = input ? input.value : null;
+    });
+    return fields;
+}
+
+function next(index) {
+    if (index >= blocks.length) {
+        callback(devices);
+        return;
+    }
+    var source = document.getElementById(inputs[sourceField]);
+    var previous = source ? source.value : '';
+    blocks[index].click();
+    var start = Date.now();
+    (function shown() {
+        source = document.getElementById(inputs[sourceField]);
+        if (source && source.value && (source.value !== previous || (index === first && firstShown))) {
+            devices.push(read());
+            next(index + 1);
+        } else if (Date.now() - start > timeout) {
+            callback(null);
+        } else {
+            setTimeout(shown, 50);
+        }
+    })();
+}
+
+if (tree) next(first); else callback(null);
+"""
+
+# Returns 'login' while the login form is shown and 'app' once the application of a logged-in session is shown
+session_state_script = """
+var login = document.getElementById('username');
+if (login && login.offsetParent !== null) return 'login';
+var app = document.querySelector('se-app');
+return app && !app.hidden ? 'app' : null;
+"""
 
-def initialize_driver() -> webdriver.Chrome:
+
+def wait_until(driver: webdriver.Chrome, condition, timeout: float, step: str,
+               timings: Optional[StepTimings] = None, poll_interval: float = POLL_INTERVAL):
+    """
+    Waits until the condition is met and records how long the wait actually took.
+
+    :param driver: The WebDriver instance used for webpage interactions.
+    :param condition: Callable receiving the driver and returning a truthy value once the condition is met.
+    :param timeout: Maximum time to wait in seconds.
+    :param step: Name under which the duration of the wait is recorded.
+    :param timings: Optional collection the duration of the wait is recorded in.
+    :param poll_interval: Interval in seconds between two checks of the condition.
+    :return: The value returned by the condition.
+    """
+    from selenium.webdriver.support.ui import WebDriverWait
+    start = time.perf_counter()
+    try:
+        return WebDriverWait(driver, timeout, poll_interval).until(condition)
+    finally:
+        if timings:
+            timings.record(step, time.perf_counter() - start)
+
+
+def count_round_trips(driver: webdriver.Chrome, timings: Optional[StepTimings]) -> None:
+    """
+    Counts every command the WebDriver sends to the browser as a round trip in the given timings.
+
+    :param driver: The WebDriver instance used for webpage interactions.
+    :param timings: Collection the round trips are counted in, None to stop counting.
+    """
+    if not hasattr(driver, 'round_trip_timings'):
+        execute = driver.execute
+
+        def counted(driver_command, params=None):
+            if driver.round_trip_timings:
+                driver.round_trip_timings.count('round_trips')
+            return execute(driver_command, params)
+        driver.execute = counted
+    driver.round_trip_timings = timings
+
+
+def form_populated(previous_rfid: str):
+    """
+    Condition met once the device form shows the RFID of a device other than the previous one.
+
+    :param previous_rfid: Value of the RFID field of the previously configured device.
+    :return: Condition returning the value of the RFID field.
+    """
+    def condition(driver: webdriver.Chrome):
+        value = driver.execute_script(form_script, SOURCE_ID_FIELD, NAME_FIELD)
+        return value if value and value != previous_rfid else False
+    return condition
+
+
+def save_acknowledged(driver: webdriver.Chrome) -> bool:
+    """
+    Condition met once the gateway has accepted the saved form.
+
+    :param driver: The WebDriver instance used for webpage interactions.
+    """
+    return bool(driver.execute_script(save_acknowledged_script))
+
+
+class ReadingsStable:
+    """
+    Condition met once all real-time readings are present and two consecutive reads return the same values.
+    """
+
+    def __init__(self) -> None:
+        self.previous = None
+
+    def __call__(self, driver: webdriver.Chrome):
+        values = driver.execute_script(readings_script, list(READING_TITLES))
+        if not values or any(value is None for value in values) or not values[0] or not values[1]:
+            self.previous = None
+            return False
+        values = tuple(values)
+        if values == self.previous:
+            return values
+        self.previous = values
+        return False
+
+
+def initialize_driver(headless: bool = False, accept_insecure_certs: bool = False) -> webdriver.Chrome:
     """
     Initializes and returns a Chrome WebDriver with implicit wait set.
 
+    :param headless: Whether to start Chrome without a window.
+    :param accept_insecure_certs: Whether to accept the self-signed certificate of the gateway without showing
+        the security warning.
     :return: An instance of Chrome WebDriver with implicit wait configured.
     """
-    driver = webdriver.Chrome()
+    from selenium import webdriver
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument('--headless=new')
+    options.accept_insecure_certs = accept_insecure_certs
+    driver = webdriver.Chrome(options=options)
     driver.implicitly_wait(10)
     return driver
 
@@ -86,6 +344,10 @@ def handle_security_warning(driver: webdriver.Chrome) -> None:
 
     :param driver: The WebDriver instance to use for navigating.
     """
+    from selenium.common.exceptions import NoSuchElementException, TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
     try:
         # Wait for the security details button to be clickable and click it
         WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.ID, 'details-button'))).click()
@@ -101,6 +363,10 @@ def login_to_site(driver: webdriver.Chrome, password: str) -> None:
     :param driver: The WebDriver instance to use for operations.
     :param password: The password for logging in.
     """
+    from selenium.common.exceptions import NoSuchElementException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
     try:
         login_input = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, 'username')))
         password_input = driver.find_element(By.ID, 'password')
@@ -113,186 +379,693 @@ def login_to_site(driver: webdriver.Chrome, password: str) -> None:
         logging.error("Login elements not found.")
 
 
-def search_for_new_powertags(driver: webdriver.Chrome) -> None:
+def session_state(driver: webdriver.Chrome) -> Optional[str]:
     """
-    Initiates a search for new PowerTags on the PAS600 site.
+    Condition met once the page shows either the login form or the logged-in application.
+
+    :param driver: The WebDriver instance used for webpage interactions.
+    :return: 'login' if the login form is shown, 'app' if the session is logged in, None while the page loads.
+    """
+    return driver.execute_script(session_state_script)
+
+
+def show_wireless_devices(driver: webdriver.Chrome) -> None:
+    """
+    Opens the wireless devices settings showing the device tree.
+
+    :param driver: The WebDriver instance used for interacting with the webpage.
+    """
+    from selenium.webdriver.common.by import By
+    driver.find_element(By.XPATH, '//a[@routerlink="/settings"]').click()
+    driver.find_element(By.XPATH, '//app-card-menu-dumb[@cardtitle="Wireless Devices"]').click()
+    driver.find_element(By.XPATH, '//se-list-item[2]').click()  # Simplified XPATH
+
+
+def start_discovery(driver: webdriver.Chrome) -> None:
+    """
+    Opens the wireless devices settings and starts the search for new PowerTags without waiting for it.
 
     :param driver: The WebDriver instance used for interacting with the webpage.
     """
+    from selenium.webdriver.common.by import By
     # Navigations and interactions for finding new PowerTags
+    show_wireless_devices(driver)
+    driver.find_element(By.XPATH, '//*[@id="switchbutton"]').click()
+    logger.info("Searching for new PowerTags...")
+
+
+def discovery_status(driver: webdriver.Chrome) -> str:
+    """
+    :param driver: The WebDriver instance used for interacting with the webpage.
+    :return: Status of the search for new PowerTags, "Searching" while it is running.
+    """
+    from selenium.webdriver.common.by import By
+    return driver.find_element(By.XPATH, DISCOVERY_STATUS_PATH).text
+
+
+def search_for_new_powertags(driver: webdriver.Chrome, timings: Optional[StepTimings] = None) -> None:
+    """
+    Initiates a search for new PowerTags on the PAS600 site.
+
+    :param driver: The WebDriver instance used for interacting with the webpage.
+    :param timings: Optional collection the duration of the search is recorded in.
+    """
+    from selenium.common.exceptions import NoSuchElementException, TimeoutException
     try:
-        driver.find_element(By.XPATH, '//a[@routerlink="/settings"]').click()
-        driver.find_element(By.XPATH, '//app-card-menu-dumb[@cardtitle="Wireless Devices"]').click()
-        driver.find_element(By.XPATH, '//se-list-item[2]').click()  # Simplified XPATH
-        driver.find_element(By.XPATH, '//*[@id="switchbutton"]').click()
-        logger.info("Searching for new PowerTags...")
-        WebDriverWait(driver, 120, 1).until_not(lambda d: d.find_element(By.XPATH,
-                                                                         '//*[@id="ZigBeePermitJoin.Information_elements.disco_status"]').text == "Searching")
+        start_discovery(driver)
+        wait_until(driver, lambda d: discovery_status(d) != "Searching", 120, 'search', timings, poll_interval=1)
         logger.info("Search completed.")
-    except NoSuchElementException:
+    except (NoSuchElementException, TimeoutException):
         logger.error("Error occurred while searching for new PowerTags.")
 
 
-def configure_powertags(driver: webdriver.Chrome, file_path: str) -> None:
+def read_values(driver: webdriver.Chrome, timings: Optional[StepTimings] = None) -> Optional[Readings]:
     """
-    Configures PowerTags using data from a file.
+    Reads the real-time values of the current PowerTag and returns to its settings.
 
     :param driver: The WebDriver instance used for webpage interactions.
+    :param timings: Optional collection the duration of the wait for the readings is recorded in.
+    :return: Total power factor and active power of phases A, B and C, or None if they are not available.
+    """
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+    WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.XPATH, '//*[@id="real-time-button"]'))).click()
+    WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.XPATH,
+                                                                '/html/body/se-app/app-root/app-shell/se-container/app-real-time/se-container/se-block/se-block-content/div/div[1]/div[2]'))).click()
+    readings = None
+    try:
+        # Wait until the values following the items titled "Total power factor", "Active power A" etc. have settled
+        readings = wait_until(driver, ReadingsStable(), 20, 'readings', timings, poll_interval=READINGS_POLL_INTERVAL)
+    except TimeoutException:
+        logging.warning("Some of values not found, unable to check values.")
+
+    driver.find_element(By.XPATH,
+                        '//*[@id="settings-button"]').click()
+    return readings
+
+
+def check_values(driver: webdriver.Chrome, timings: Optional[StepTimings] = None) -> int:
+    """
+        Checks if data from current PowerTag is correct.
+
+        :param driver: The WebDriver instance used for webpage interactions.
+        :param timings: Optional collection the duration of the wait for the readings is recorded in.
+    """
+    # -1 - Current flow needs to be change; 0 - Electrical or other problem to check by engineer, 1 - readings are OK
+    readings = read_values(driver, timings)
+    if readings is None:
+        return 0
+    pf, pa, pb, pc = readings
+    logging.info(f"Current readings for this PowerTag: PF={pf}, Pa={pa}, Pb={pb}, Pc={pc}")
+    return evaluate_readings(pf, pa, pb, pc)
+
+
+class SeleniumBackend(Backend):
+    """
+    Configures PowerTags by driving the web interface of the gateway in Chrome.
+    """
+
+    def __init__(self, timings: Optional[StepTimings] = None, driver: Optional[webdriver.Chrome] = None,
+                 pool: Optional[SessionPool] = None) -> None:
+        """
+        :param timings: Optional collection the durations of the waits are recorded in.
+        :param driver: Optional WebDriver that is already logged in, a new one is started by open otherwise.
+        :param pool: Optional pool keeping the logged-in browser warm between runs.
+        """
+        super().__init__(timings)
+        self.driver = driver
+        self.pool = pool
+        if driver:
+            count_round_trips(driver, timings)
+        self.url = ''
+        self.source_id = ''
+        self.current_device = None
+
+    def open(self, url: str, password: str) -> None:
+        self.url = url
+        if self.pool:
+            self.open_pooled(url, password)
+            return
+        with measure(self.timings, 'driver_init'):
+            self.driver = initialize_driver()
+        count_round_trips(self.driver, self.timings)
+        with measure(self.timings, 'navigate'):
+            navigate_to_url(self.driver, url)
+        with measure(self.timings, 'security_warning'):
+            handle_security_warning(self.driver)
+        with measure(self.timings, 'login'):
+            login_to_site(self.driver, password)
+
+    def open_pooled(self, url: str, password: str) -> None:
+        """
+        Opens the gateway in a browser of the pool. An idle browser of the gateway is reused, a new headless one
+        gets the stored cookies, and the login form is filled in only if the session has expired.
+
+        :param url: URL of the gateway.
+        :param password: Password to log in to the gateway.
+        """
+        from selenium.common.exceptions import TimeoutException
+        self.driver = self.pool.take_driver(url)
+        if self.driver:
+            count_round_trips(self.driver, self.timings)
+        else:
+            with measure(self.timings, 'driver_init'):
+                self.driver = initialize_driver(self.pool.headless, accept_insecure_certs=True)
+            count_round_trips(self.driver, self.timings)
+            cookies = self.pool.cookies.load(url) if self.pool.cookies else []
+            if cookies:
+                # Cookies can only be set for the site currently shown
+                navigate_to_url(self.driver, url)
+                for cookie in cookies:
+                    self.driver.add_cookie(cookie)
+        self.source_id = ''
+        self.current_device = None
+        with measure(self.timings, 'navigate'):
+            navigate_to_url(self.driver, url)
+        try:
+            state = wait_until(self.driver, session_state, 10, 'session', poll_interval=0.05)
+        except TimeoutException as e:
+            raise BackendError("Neither the login form nor the application has been shown.") from e
+        if state == 'app':
+            logging.info(f"Reusing the session of {url}.")
+            return
+        with measure(self.timings, 'login'):
+            login_to_site(self.driver, password)
+            try:
+                wait_until(self.driver, lambda driver: session_state(driver) == 'app', 10, 'session')
+            except TimeoutException as e:
+                raise BackendError("The login has not been accepted.") from e
+        if self.pool.cookies:
+            self.pool.cookies.save(url, self.driver.get_cookies())
+
+    def search_for_new_powertags(self) -> None:
+        search_for_new_powertags(self.driver, self.timings)
+
+    def show_devices(self) -> None:
+        from selenium.common.exceptions import NoSuchElementException
+        try:
+            show_wireless_devices(self.driver)
+        except NoSuchElementException as e:
+            raise BackendError(f"Unable to open the wireless devices: {e}") from e
+        # No device form is open yet
+        self.source_id = ''
+        self.current_device = None
+
+    def start_discovery(self) -> bool:
+        from selenium.common.exceptions import NoSuchElementException
+        try:
+            start_discovery(self.driver)
+        except NoSuchElementException as e:
+            raise BackendError(f"Unable to start the search for new PowerTags: {e}") from e
+        return True
+
+    def discovery_running(self) -> bool:
+        from selenium.common.exceptions import NoSuchElementException
+        try:
+            return discovery_status(self.driver) == "Searching"
+        except NoSuchElementException:
+            return False
+
+    def stop_discovery(self) -> None:
+        from selenium.webdriver.common.by import By
+        # The switch button toggles the search
+        if self.discovery_running():
+            self.driver.find_element(By.XPATH, '//*[@id="switchbutton"]').click()
+            logger.info("Search stopped.")
+
+    def devices(self) -> Iterable[int]:
+        # Devices are addressed by their position in the device tree, counted in one call instead of probing
+        # positions until the implicit wait of the first missing one runs out
+        return range(1, self.driver.execute_script(device_count_script, DEVICE_TREE_PATH) + 1)
+
+    def inventory(self, first: int = 0) -> Optional[List[DeviceInfo]]:
+        from selenium.common.exceptions import WebDriverException
+        start = time.perf_counter()
+        script_timeout = self.driver.timeouts.script
+        try:
+            # Counting the blocks is cheap, only the forms of the devices not listed yet are opened
+            count = self.driver.execute_script(device_count_script, DEVICE_TREE_PATH)
+            if count <= first:
+                return []
+            # The tree is walked in the page, the script may take the form timeout of every walked device
+            self.driver.set_script_timeout(max(script_timeout, (count - first) * INVENTORY_FORM_TIMEOUT / 1000 + 5))
+            devices = self.driver.execute_async_script(inventory_script, DEVICE_TREE_PATH, FORM_INPUTS,
+                                                       SOURCE_ID_FIELD_ID, self.current_device == first + 1,
+                                                       INVENTORY_FORM_TIMEOUT, first)
+        except WebDriverException as e:
+            logging.info(f"Unable to list the devices in one query, opening them one by one: {e}")
+            self.current_device = None
+            return None
+        finally:
+            self.driver.set_script_timeout(script_timeout)
+            if self.timings:
+                self.timings.record('inventory', time.perf_counter() - start)
+        if devices is None:
+            logging.info("The forms of the device tree could not be read, opening the devices one by one.")
+            self.current_device = None
+            return None
+        if devices:
+            # The form of the last device of the tree is left open
+            self.current_device = first + len(devices)
+            self.source_id = devices[-1][SOURCE_ID_FIELD_ID]
+        return [device_info(position, fields) for position, fields in enumerate(devices, start=first + 1)]
+
+    def open_device(self, device: int) -> Optional[str]:
+        from selenium.common.exceptions import NoSuchElementException, TimeoutException
+        from selenium.webdriver.common.by import By
+        if device == self.current_device:
+            return self.source_id
+        start = time.perf_counter()
+        try:
+            self.driver.find_element(By.XPATH, DEVICE_PATH.format(device)).click()
+        except NoSuchElementException:
+            return None
+        clicked = time.perf_counter()
+        rfid = ''
+        try:
+            # Finding QR code once the form of the clicked device is shown
+            self.source_id = wait_until(self.driver, form_populated(self.source_id), 20, 'device_form')
+            rfid = self.source_id[-4::]
+        except TimeoutException as e:
+            self.current_device = None
+            raise BackendError("The form of the device has not been loaded.") from e
+        finally:
+            if self.timings:
+                # The RFID is known only once the form is shown, both steps are attributed to it afterwards
+                self.timings.record('click', clicked - start, rfid=rfid)
+                self.timings.record('device_form', time.perf_counter() - clicked, rfid=rfid)
+        self.current_device = device
+        return self.source_id
+
+    def select_device(self, device: int) -> None:
+        # The real-time values and the current flow belong to the device opened in the tree
+        self.open_device(device)
+
+    def save(self) -> None:
+        """
+        Saves the form of the current device and waits until the gateway acknowledges it.
+        """
+        from selenium.common.exceptions import TimeoutException
+        self.driver.execute_script(script)
+        try:
+            wait_until(self.driver, save_acknowledged, 10, 'save', self.timings)
+        except TimeoutException:
+            logging.warning("Saving has not been acknowledged by the gateway.")
+
+    def write_device(self, device: int, name: str, label: str, unit_id: str) -> None:
+        from selenium.common.exceptions import WebDriverException
+        # Filling the fields and saving them is a single round trip to the browser
+        try:
+            with measure(self.timings, 'save'):
+                status = self.driver.execute_async_script(write_script, {NAME_FIELD: name, LABEL_FIELD: label,
+                                                                         UNIT_ID_FIELD: unit_id},
+                                                          WRITE_ACKNOWLEDGE_TIMEOUT)
+        except WebDriverException as e:
+            raise BackendError(f"Writing the device failed: {e.msg or e}") from e
+        if not isinstance(status, dict):
+            raise BackendError(f"Writing the device failed: unexpected status {status!r}")
+        failed = {field: result for field, result in status.items() if result != 'ok'}
+        if status.get('save') == 'timeout':
+            logging.warning("Saving has not been acknowledged by the gateway.")
+            failed.pop('save')
+        if failed:
+            raise BackendError(f"Writing the device failed: {failed}")
+
+    def read_values(self, device: int) -> Optional[Readings]:
+        return read_values(self.driver, self.timings)
+
+    def reverse_current_flow(self, device: int) -> None:
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import Select, WebDriverWait
+        select_element = WebDriverWait(self.driver, 10).until(
+            EC.presence_of_element_located((By.ID, "ElectricalCharacteristics.CurrentFlow"))
+        )
+        # Now that we have the <select> element, we initialize a Select object
+        select_obj = Select(select_element)
+        # And then select the "Reverse" option by visible text
+        select_obj.select_by_visible_text("Reverse")
+        self.save()
+
+    def quit(self) -> None:
+        if self.driver:
+            if self.pool:
+                # The browser stays logged in for the next run against the gateway
+                self.pool.keep_driver(self.url, self.driver)
+            else:
+                self.driver.quit()
+            self.driver = None
+
+
+# Available backends by name
+BACKENDS = {'selenium': SeleniumBackend, 'http': HttpBackend}
+
+
+def gateway_output_file(gateway: str, output_dir: str = '.') -> str:
+    """
+    Returns the path of the result file of a gateway, so gateways run at the same time do not share a file.
+
+    :param gateway: Name of the gateway, its host name and port.
+    :param output_dir: Directory the result file is saved to.
+    :return: Path of the result file.
+    """
+    return os.path.join(output_dir, f"PowerTags_checked_{gateway.replace(':', '_')}.csv")
+
+
+def journal_path(output_file: str, verification: bool = False) -> str:
+    """
+    Returns the path of the journal kept next to the output file.
+
+    :param output_file: Name of the file the checked data is saved to.
+    :param verification: Whether it is the journal of a run only checking the readings, kept apart from the
+        journal a configuration run is resumed from.
+    :return: Path of the journal file.
+    """
+    return os.path.splitext(output_file)[0] + ('.verify.journal' if verification else '.journal')
+
+
+def configure_devices(backend: Backend, file_path: str, output_file: str = "PowerTags_checked.csv",
+                      progress: Optional[ProgressCallback] = None, resume: bool = False,
+                      verifier: Optional[ModbusVerifier] = None, pipeline: bool = False,
+                      sampling: Sampling = Sampling(), stream: bool = False,
+                      snapshot: Optional[ConfigSnapshot] = None, bulk: bool = False) -> Optional[File]:
+    """
+    Configures PowerTags using data from a file through the given backend.
+
+    Every result is recorded in a journal next to the output file as soon as it is known. When resuming,
+    PowerTags with a verdict recorded by the previous run are skipped.
+
+    :param backend: The backend connected to the gateway.
     :param file_path: The path to the CSV file containing PowerTags data.
+    :param output_file: Name of the file the checked data is saved to.
+    :param progress: Optional callback receiving the PowerTag name and its status.
+    :param resume: Whether to continue the previous run recorded in the journal.
+    :param verifier: Optional Modbus verifier used to read the readings instead of the backend.
+    :param pipeline: Whether to configure all PowerTags first and check their readings in batches afterwards.
+    :param sampling: How the readings are sampled before a verdict is reached.
+    :param stream: Whether to start the search for new PowerTags and configure them as soon as they appear,
+        the search must not have been run before.
+    :param snapshot: Optional cached configurations of the gateway. PowerTags whose configuration and readings
+        have been confirmed by an earlier run are skipped, the newly confirmed ones are added to the cache.
+    :param bulk: Whether to import the settings of all PowerTags in a single operation and check their readings
+        in batches afterwards, the search must have finished. Backends unable to import them configure the
+        PowerTags one by one.
+    :return: The File object holding the results, or None if the data could not be loaded.
     """
     file_object = File(file_path)
     pt_data = file_object.load_data()
     if pt_data is None:
         logging.error("Failed to load PowerTag data from file.")
-        return
+        return None
+
+    journal = Journal(journal_path(output_file))
+    file_object.apply_results(journal.start(resume))
+    file_object.journal = journal
+    file_object.snapshot = snapshot
+    try:
+        if pipeline or bulk:
+            Pipeline(backend, file_object, progress, verifier, sampling=sampling, stream=stream, bulk=bulk).run()
+        else:
+            configure_loaded_devices(backend, file_object, progress, verifier, sampling, stream)
+    finally:
+        journal.close()
+        if snapshot:
+            snapshot.save()
+
+    journal.compact(file_path, output_file, file_object.sep)
+    return file_object
+
 
+def configure_loaded_devices(backend: Backend, file_object: File, progress: Optional[ProgressCallback] = None,
+                             verifier: Optional[ModbusVerifier] = None, sampling: Sampling = Sampling(),
+                             stream: bool = False) -> None:
+    """
+    Configures the PowerTags of a loaded file through the given backend.
+
+    :param backend: The backend connected to the gateway.
+    :param file_object: File with the loaded PowerTags data.
+    :param progress: Optional callback receiving the PowerTag name and its status.
+    :param verifier: Optional Modbus verifier used to read the readings instead of the backend.
+    :param sampling: How the readings are sampled before a verdict is reached.
+    :param stream: Whether to configure the PowerTags as soon as the search for new PowerTags finds them.
+    """
+    if stream:
+        devices = stream_devices(backend, file_object, progress)
+    else:
+        devices = devices_to_visit(backend, file_object, progress)
     n = 0
-    while True:
-        n += 1
-        path = (f'/html/body/se-app/app-root/app-shell/se-container/app-tab/se-container/se-block/se-block-content/se'
-                f'-list/se-container/se-list/app-generic-treeview/app-generic-treeview-dumb/se-list-group/se-block[{str(n)}]')
+    for n, (device, write) in enumerate(devices, start=1):
         try:
-            driver.find_element(By.XPATH, path).click()
-            # Finding QR code
-            time.sleep(5)
-            rfid = WebDriverWait(driver, 20).until(EC.presence_of_element_located(
-                (By.XPATH, '//*[@id="ZigBeeGreenPowerDevice.Identification_elements.source_id.value"]'))).get_attribute(
-                "value")[-4::]
-            logging.info(f'A PowerTag with RFID: {rfid} is currently being configured.')
-
-            name, label = file_object.get_information(rfid)
-            if name != '' and label != '':
-                # Filling the field Name
-                fname = driver.find_element(By.XPATH, '//*[@id="PhysicalIdentification.UserApplicationName_value"]')
-                fname.clear()
-                fname.send_keys(name)
-                # Filling the field Label
-                flabel = driver.find_element(By.XPATH, '//*[@id="ElectricalTopology.Label"]')
-                flabel.clear()
-                flabel.send_keys(label)
-                # Filling the field Virtual server ID
-                fserver_id = driver.find_element(By.XPATH,
-                                                 '//*[@id="Device.Component_virtual_device_elements.unit_id.value-number"]')
-                fserver_id.clear()
-                fserver_id.send_keys(name[-2::])
-
-                driver.execute_script(script)
-
-                logging.info(f"Powertag {name} : {label} has been configured correctly.")
-                file_object.mark_mounted(name, "OK")
-                time.sleep(3)
-
-                # Checking if the values are correct
-                reply = check_values(driver)
-                if reply == 0:
-                    file_object.mark_mounted(name, 'Attention, check the readings!')
-                    logging.warning(f"{name}: Attention, check the readings!")
-                else:
-                    if reply == -1:
-                        # Changing the orientation of the current flow
-                        select_element = WebDriverWait(driver, 10).until(
-                            EC.presence_of_element_located((By.ID, "ElectricalCharacteristics.CurrentFlow"))
-                        )
-                        # Now that we have the <select> element, we initialize a Select object
-                        select_obj = Select(select_element)
-                        # And then select the "Reverse" option by visible text
-                        select_obj.select_by_visible_text("Reverse")
-                        logging.warning(f"{name}: The direction of current flow has been changed")
-                    else:
-                        logging.info(f"{name}: Correct readings")
-                    file_object.mark_mounted(name, 'OK')
-        except NoSuchElementException:
-            logging.info(f"Adding {n} PowerTags has been completed")
+            source_id = backend.open_device(device)
+        except BackendError as e:
+            logging.error(f"The PowerTag number {n} could not be opened, skipping it: {e}")
+            continue
+        if source_id is None:
             break
+        rfid = source_id[-4::]
+        logging.info(f'A PowerTag with RFID: {rfid} is currently being configured.')
 
-    file_object.save_data()
+        name, label = file_object.get_information(rfid)
+        if name != '' and label != '':
+            if already_verified(file_object, name, progress):
+                continue
+            if progress:
+                progress(name, "discovered")
+            with tagged(backend.timings, name, rfid):
+                configure_device(backend, file_object, device, name, label, progress, verifier, sampling, write)
+    logging.info(f"Adding {n} PowerTags has been completed")
 
 
-def check_values(driver: webdriver.Chrome) -> int:
+def configure_device(backend: Backend, file_object: File, device, name: str, label: str,
+                     progress: Optional[ProgressCallback] = None, verifier: Optional[ModbusVerifier] = None,
+                     sampling: Sampling = Sampling(), write: bool = True) -> None:
     """
-        Checks if data from current PowerTag is correct.
+    Writes the settings of an opened PowerTag, checks its readings and records the verdict.
 
-        :param driver: The WebDriver instance used for webpage interactions.
+    :param backend: The backend connected to the gateway.
+    :param file_object: File with the loaded PowerTags data.
+    :param device: Handle of the opened device.
+    :param name: Name of the PowerTag.
+    :param label: Label of the PowerTag.
+    :param progress: Optional callback receiving the PowerTag name and its status.
+    :param verifier: Optional Modbus verifier used to read the readings instead of the backend.
+    :param sampling: How the readings are sampled before a verdict is reached.
+    :param write: Whether to write the settings, False if the device already carries them.
     """
-    WebDriverWait(driver, 10).until(EC.presence_of_element_located(By.XPATH, '//*[@id="real-time-button"]')).click()
-    WebDriverWait(driver, 10).until(EC.presence_of_element_located(By.XPATH,
-                                                                   '/html/body/se-app/app-root/app-shell/se-container/app-real-time/se-container/se-block/se-block-content/div/div[1]/div[2]')).click()
-    time.sleep(5)
-    # -1 - Current flow needs to be change; 0 - Electrical or other problem to check by engineer, 1 - readings are OK
-    is_correct = 0
+    if write:
+        try:
+            backend.write_device(device, name, label, name[-2::])
+        except BackendError as e:
+            logging.error(f"{name}: Configuration failed: {e}")
+            return
+        logging.info(f"Powertag {name} : {label} has been configured correctly.")
+
+    file_object.mark_mounted(name, "OK")
+    if progress:
+        progress(name, "configured")
 
+    # Checking if the values are correct, until several samples agree
     try:
-        # Locate the element containing "Total power factor" text
-        # This assumes that the title attribute's presence is a reliable indicator
-        pf_element = driver.find_element(By.XPATH, "//se-table-item[@title='Total power factor']")
-        pa_element = driver.find_element(By.XPATH, "//se-table-item[@title='Active power A']")
-        pb_element = driver.find_element(By.XPATH, "//se-table-item[@title='Active power B']")
-        pc_element = driver.find_element(By.XPATH, "//se-table-item[@title='Active power C']")
-        if pf_element and pa_element and pb_element and pc_element:
-            # This XPATH finds the `se-table-item` following the one with "Total power factor"
-            pf = pf_element.find_element(By.XPATH, "./following-sibling::se-table-item").text.strip()
-            pa = pa_element.find_element(By.XPATH, "./following-sibling::se-table-item").text.strip()
-            pb = pb_element.find_element(By.XPATH, "./following-sibling::se-table-item").text.strip()
-            pc = pc_element.find_element(By.XPATH, "./following-sibling::se-table-item").text.strip()
-
-            logging.info(f"Current readings for this PowerTag: PF={pf}, Pa={pa}, Pb={pb}, Pc={pc}")
-
-            if is_float(pa) and is_float(pf):
-                if is_float(pb) and is_float(pc):
-                    if float(pa) > 0 and float(pb) > 0 and float(pc) > 0 and float(pf) > 0.5:
-                        is_correct = 1
-                    elif float(pa) < 0 and float(pb) < 0 and float(pc) < 0 and float(pf) < 0.5:
-                        is_correct = -1
-                else:
-                    if float(pa) > 0 and float(pf) > 0.5:
-                        is_correct = 1
-                    elif float(pa) < 0 and float(pf) < 0.5:
-                        is_correct = -1
+        with measure(backend.timings, 'check_values'):
+            server_id = unit_id(name)
+            if verifier and server_id is not None:
+                verdict = sample_verdict(name, lambda: verifier.read_values([server_id])[server_id], sampling)
             else:
-                is_correct = 0
+                verdict = sample_verdict(name, lambda: backend.read_values(device), sampling)
+    except BackendError as e:
+        logging.error(f"{name}: Unable to read the readings: {e}")
+        record_verdict(file_object, name, 0, progress)
+        return
+    if verdict.reply == -1:
+        # Changing the orientation of the current flow
+        try:
+            backend.reverse_current_flow(device)
+        except BackendError as e:
+            logging.error(f"{name}: Unable to change the direction of current flow: {e}")
+            record_verdict(file_object, name, 0, progress, verdict)
+            return
+    record_verdict(file_object, name, verdict.reply, progress, verdict)
 
-        else:
-            logging.warning("Some of values not found.")
 
-    except NoSuchElementException:
-        logging.warning("Element containing 'Total power factor' not found, unable to check values.")
+def verify_devices(verifier: Optional[ModbusVerifier], file_path: str, output_file: str = "PowerTags_checked.csv",
+                   progress: Optional[ProgressCallback] = None, sampling: Sampling = Sampling(),
+                   backend: Optional[Backend] = None) -> Optional[Dict[str, int]]:
+    """
+    Checks the readings of all PowerTags of a file in one batch, without changing their settings.
+    PowerTags whose readings do not agree yet are read again until they do or the cap is reached.
+    The verdicts are recorded in a journal of their own, so the journal of an interrupted configuration run can
+    still be resumed, and are filled into the existing output file, keeping the results of the configuration.
 
-    driver.find_element(By.XPATH,
-                        '//*[@id="settings-button"]').click()
-    return is_correct
+    :param verifier: Modbus verifier connected to the gateway, the readings are read through the backend if None.
+    :param file_path: The path to the CSV file containing PowerTags data.
+    :param output_file: Name of the file the checked data is saved to.
+    :param progress: Optional callback receiving the PowerTag name and its status.
+    :param sampling: How the readings are sampled before a verdict is reached.
+    :param backend: The backend connected to the gateway, used when no verifier is given. Only the devices
+        already carrying the settings of their PowerTag in the file are checked.
+    :return: Dictionary mapping the PowerTag name to its verdict, or None if the data could not be loaded.
+    """
+    file_object = File(file_path)
+    if file_object.load_data() is None:
+        logging.error("Failed to load PowerTag data from file.")
+        return None
+
+    if verifier:
+        servers = {}
+        for name in file_object.name_index:
+            server_id = unit_id(name)
+            if server_id is None:
+                logging.warning(f"{name}: No valid virtual server ID, unable to check values.")
+            elif file_object.all_data.at[file_object.name_index[name], 'RF ID']:
+                servers[name] = server_id
+
+        def read(names: Iterable[str]) -> Dict[str, int]:
+            replies = verifier.verify({servers[name] for name in names})
+            return {name: replies[servers[name]] for name in names}
+    else:
+        inventory = backend.inventory()
+        if inventory is None:
+            logging.error("The devices cannot be listed, unable to check the readings without opening them.")
+            return None
+        servers = {}
+        for info in inventory:
+            if file_object.rfid_index.get(normalize_rfid(info.rfid)) is None:
+                continue
+            name, label = file_object.get_information(info.rfid)
+            if name and (info.name, info.label, info.unit_id) == (name, label, name[-2::]):
+                servers[name] = info.device
+            elif name:
+                logging.warning(f"{name}: Not configured on the gateway, unable to check values.")
+
+        def read(names: Iterable[str]) -> Dict[str, int]:
+            replies = {}
+            for name in names:
+                try:
+                    backend.select_device(servers[name])
+                    replies[name] = readings_verdict(name, backend.read_values(servers[name]))
+                except BackendError as e:
+                    logging.error(f"{name}: Unable to read the readings: {e}")
+                    replies[name] = 0
+            return replies
+
+    journal = Journal(journal_path(output_file, verification=True))
+    journal.start()
+    file_object.journal = journal
+    verdicts = {}
+    try:
+        votes = {name: Votes(sampling) for name in servers}
+        pending = set(votes)
+        while pending:
+            # Only the PowerTags whose samples do not agree yet are read again
+            for name, reply in read(pending).items():
+                votes[name].add(reply)
+            pending = {name for name in pending if not votes[name].decided}
+            if pending:
+                time.sleep(sampling.interval)
+        for name in servers:
+            verdict = votes[name].verdict()
+            verdicts[name] = verdict.reply
+            file_object.mark_correct_values(name, str(verdict.reply))
+            file_object.mark_confidence(name, verdict.confidence, verdict.samples)
+            if verdict.reply == 1:
+                logging.info(f"{name}: Correct readings")
+            elif verdict.reply == -1:
+                logging.warning(f"{name}: The direction of current flow needs to be changed")
+            else:
+                logging.warning(f"{name}: Attention, check the readings!")
+            if progress:
+                progress(name, "verified" if verdict.reply == 1 else "needs attention")
+    finally:
+        journal.close()
+
+    journal.compact(output_file if os.path.exists(output_file) else file_path, output_file, file_object.sep)
+    return verdicts
 
 
-def is_float(string: str) -> bool:
+def configure_powertags(driver: webdriver.Chrome, file_path: str, output_file: str = "PowerTags_checked.csv",
+                        progress: Optional[ProgressCallback] = None,
+                        timings: Optional[StepTimings] = None) -> Optional[File]:
     """
-    Check if the given string can be converted to float.
+    Configures PowerTags using data from a file.
 
-    :param string: String to check.
-    :return: Boolean information whether the string is a floating point number.
+    :param driver: The WebDriver instance used for webpage interactions.
+    :param file_path: The path to the CSV file containing PowerTags data.
+    :param output_file: Name of the file the checked data is saved to.
+    :param progress: Optional callback receiving the PowerTag name and its status.
+    :param timings: Optional collection the durations of the waits are recorded in.
+    :return: The File object holding the results, or None if the data could not be loaded.
     """
-    try:
-        float(string)
-        return True
-    except ValueError:
-        return False
+    return configure_devices(SeleniumBackend(timings, driver), file_path, output_file, progress)
 
 
-def configure_start(url: str, password: str, file_path: str) -> WebDriver:
+def configure_start(url: str, password: str, file_path: str, output_file: str = "PowerTags_checked.csv",
+                    progress: Optional[ProgressCallback] = None, backend: str = 'selenium',
+                    resume: bool = False, modbus_port: Optional[int] = None, pipeline: bool = False,
+                    pool: Optional[SessionPool] = None, stream: bool = False,
+                    cache: Optional[ConfigCache] = None, bulk: bool = False, verify_only: bool = False,
+                    endpoints: Optional[Dict[str, str]] = None) -> Backend:
     """
-    Starts webdriver and runs functions to write and read data on the web page.
+    Connects to the gateway and runs functions to write and read data of the PowerTags.
 
     :param url: URL of the page to open.
     :param password: Password to log in to the site.
     :param file_path: Path to the CSV file.
+    :param output_file: Name of the file the checked data is saved to.
+    :param progress: Optional callback receiving the PowerTag name and its status.
+    :param backend: Name of the backend to use, 'selenium' (web interface in Chrome) or 'http' (direct HTTP calls).
+    :param resume: Whether to skip the PowerTags already configured and verified by the previous run.
+    :param modbus_port: Modbus TCP port of the gateway, the readings are read over Modbus instead of the backend
+        when given.
+    :param pipeline: Whether to configure all PowerTags first and check their readings in batches afterwards.
+    :param pool: Optional pool keeping the logged-in sessions warm between runs, quitting the returned backend
+        hands its session back to the pool.
+    :param stream: Whether to configure the PowerTags while the search for new PowerTags is still running
+        instead of waiting for it to finish.
+    :param cache: Optional cache of the configurations confirmed by earlier runs, only the PowerTags whose
+        configuration differs from it, from the CSV or from the gateway are configured and checked.
+    :param bulk: Whether to import the settings of all PowerTags in a single operation instead of writing them
+        one by one, after waiting for the search to finish.
+    :param verify_only: Whether to only check the readings of the PowerTags already configured, without
+        searching for new PowerTags or changing any setting.
+    :param endpoints: Optional paths of the gateway's web backend used by the 'http' backend instead of the
+        assumed ones, see backends.load_endpoints.
+    :return: The backend, still connected to the gateway. It is quit before an exception is raised.
     """
-    driver = None
-    driver = initialize_driver()
-    navigate_to_url(driver, url)
-    handle_security_warning(driver)
-    login_to_site(driver, password)
-    search_for_new_powertags(driver)
-    configure_powertags(driver, file_path)
+    if stream and bulk:
+        # The import only reaches the PowerTags that have joined, so it waits for the whole search
+        logging.warning("The settings are imported after the search, the PowerTags are not configured during it.")
+        stream = False
+    timings = StepTimings(url, EVENTS_FILE)
+    # Only the http backend calls the web backend of the gateway directly
+    options = {'endpoints': endpoints} if endpoints and issubclass(BACKENDS[backend], HttpBackend) else {}
+    gateway = BACKENDS[backend](timings, pool=pool, **options)
+    verifier = None
+    try:
+        gateway.open(url, password)
+        if not stream and not verify_only:
+            gateway.search_for_new_powertags()
+        verifier = ModbusVerifier(urlparse(url).hostname, modbus_port) if modbus_port else None
+        if verify_only:
+            if not verifier:
+                # Without a search nothing else opens the device tree the devices are listed from
+                gateway.show_devices()
+            verify_devices(verifier, file_path, output_file, progress, backend=gateway)
+        else:
+            configure_devices(gateway, file_path, output_file, progress, resume, verifier, pipeline, stream=stream,
+                              snapshot=cache.snapshot(url) if cache else None, bulk=bulk)
+    except Exception:
+        # The caller never gets the backend, so the browser is quit or handed back to the pool here
+        gateway.quit()
+        raise
+    finally:
+        if verifier:
+            verifier.close()
+    timings.log_summary()
+    timings.save()
 
-    return driver
+    return gateway
 
 
 def main():
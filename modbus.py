@@ -0,0 +1,205 @@
+import logging
+import math
+import socket
+import struct
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from backends import Readings, evaluate_readings
+
+logger = logging.getLogger(__name__)
+
+MODBUS_PORT = 502
+READ_HOLDING_REGISTERS = 0x03
+
+# Registers of a PowerTag behind the gateway (protocol addresses, the PowerTag Modbus table counts from 1).
+# Active power of phases A, B and C and the total power factor are Float32 values, one block covers all of them.
+FIRST_REGISTER = 3053
+ACTIVE_POWER_A_OFFSET = 0
+ACTIVE_POWER_B_OFFSET = 2
+ACTIVE_POWER_C_OFFSET = 4
+POWER_FACTOR_OFFSET = 30
+REGISTER_COUNT = 32
+
+# A read request: unit ID, first register address and number of registers
+ReadRequest = Tuple[int, int, int]
+
+
+class ModbusError(Exception):
+    """
+    Raised when the communication with the Modbus server fails.
+    """
+
+
+class ModbusClient:
+    """
+    Minimal Modbus TCP client keeping one connection open and pipelining several requests over it.
+    """
+
+    def __init__(self, host: str, port: int = MODBUS_PORT, timeout: float = 5, window: int = 16) -> None:
+        """
+        :param host: Host name or address of the Modbus server.
+        :param port: TCP port of the Modbus server.
+        :param timeout: Timeout of a single response in seconds.
+        :param window: Maximum number of requests sent before waiting for their responses.
+        """
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.window = window
+        self.sock: Optional[socket.socket] = None
+        self._transaction = 0
+        self._lock = threading.Lock()
+
+    def connect(self) -> None:
+        """
+        Opens the connection if it is not open yet.
+        """
+        if self.sock is None:
+            try:
+                self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            except OSError as e:
+                raise ModbusError(f"Unable to connect to {self.host}:{self.port}: {e}") from e
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def close(self) -> None:
+        """
+        Closes the connection.
+        """
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def _receive(self, size: int) -> bytes:
+        data = b''
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ModbusError("Connection closed by the Modbus server.")
+            data += chunk
+        return data
+
+    def _receive_response(self) -> Tuple[int, Optional[List[int]]]:
+        """
+        Receives a single response.
+
+        :return: Transaction ID and the read registers, or None if the server replied with an exception.
+        """
+        transaction, _, length, unit = struct.unpack('>HHHB', self._receive(7))
+        pdu = self._receive(length - 1)
+        if pdu[0] & 0x80:
+            logger.debug(f"Unit {unit} replied with Modbus exception {pdu[1]}.")
+            return transaction, None
+        count = pdu[1] // 2
+        return transaction, list(struct.unpack(f'>{count}H', pdu[2:2 + 2 * count]))
+
+    def read_holding_registers(self, requests: List[ReadRequest]) -> List[Optional[List[int]]]:
+        """
+        Reads blocks of holding registers, pipelining the requests over the open connection.
+
+        :param requests: List of unit ID, first register address and number of registers.
+        :return: Registers of every request in the same order, None for requests answered with an exception.
+        :raises ModbusError: If the communication fails.
+        """
+        results: List[Optional[List[int]]] = [None] * len(requests)
+        with self._lock:
+            self.connect()
+            pending: Dict[int, int] = {}
+            try:
+                for index, (unit, address, count) in enumerate(requests):
+                    self._transaction = (self._transaction + 1) % 0x10000
+                    pending[self._transaction] = index
+                    self.sock.sendall(struct.pack('>HHHBBHH', self._transaction, 0, 6, unit,
+                                                  READ_HOLDING_REGISTERS, address, count))
+                    while len(pending) >= self.window:
+                        transaction, registers = self._receive_response()
+                        results[pending.pop(transaction)] = registers
+                while pending:
+                    transaction, registers = self._receive_response()
+                    results[pending.pop(transaction)] = registers
+            except (OSError, KeyError) as e:
+                # The state of the connection is unknown, a new one is opened by the next read
+                self.close()
+                raise ModbusError(f"Reading registers failed: {e}") from e
+        return results
+
+
+def decode_float(registers: List[int], offset: int) -> str:
+    """
+    Decodes a Float32 value stored in two registers.
+
+    :param registers: Read registers.
+    :param offset: Offset of the first of the two registers.
+    :return: The value as text, '-' if it is not available.
+    """
+    value = struct.unpack('>f', struct.pack('>HH', registers[offset], registers[offset + 1]))[0]
+    return '-' if math.isnan(value) else f"{value:.3f}"
+
+
+class ModbusVerifier:
+    """
+    Reads the readings of all configured PowerTags over Modbus TCP through their virtual server IDs.
+    """
+
+    def __init__(self, host: str, port: int = MODBUS_PORT, timeout: float = 5, window: int = 16) -> None:
+        """
+        :param host: Host name or address of the gateway.
+        :param port: Modbus TCP port of the gateway.
+        :param timeout: Timeout of a single response in seconds.
+        :param window: Maximum number of requests sent before waiting for their responses.
+        """
+        self.client = ModbusClient(host, port, timeout, window)
+
+    def read_values(self, unit_ids: Iterable[int]) -> Dict[int, Optional[Readings]]:
+        """
+        Reads the readings of several PowerTags in one batch.
+
+        :param unit_ids: Virtual server IDs of the PowerTags.
+        :return: Dictionary mapping the server ID to the total power factor and active power of phases A, B and C,
+            or None if they are not available.
+        """
+        unit_ids = list(unit_ids)
+        try:
+            blocks = self.client.read_holding_registers([(unit, FIRST_REGISTER, REGISTER_COUNT) for unit in unit_ids])
+        except ModbusError as e:
+            logger.error(f"Unable to read the readings over Modbus: {e}")
+            return {unit: None for unit in unit_ids}
+        readings = {}
+        for unit, registers in zip(unit_ids, blocks):
+            if registers is None or len(registers) < REGISTER_COUNT:
+                logger.warning(f"Readings of the PowerTag with server ID {unit} not available.")
+                readings[unit] = None
+                continue
+            readings[unit] = (decode_float(registers, POWER_FACTOR_OFFSET),
+                              decode_float(registers, ACTIVE_POWER_A_OFFSET),
+                              decode_float(registers, ACTIVE_POWER_B_OFFSET),
+                              decode_float(registers, ACTIVE_POWER_C_OFFSET))
+        return readings
+
+    def verify(self, unit_ids: Iterable[int]) -> Dict[int, int]:
+        """
+        Checks the readings of several PowerTags in one batch.
+
+        :param unit_ids: Virtual server IDs of the PowerTags.
+        :return: Dictionary mapping the server ID to -1 - Current flow needs to be change;
+            0 - Electrical or other problem to check by engineer, 1 - readings are OK
+        """
+        return {unit: evaluate_readings(*readings) if readings else 0
+                for unit, readings in self.read_values(unit_ids).items()}
+
+    def close(self) -> None:
+        """
+        Closes the connection to the gateway.
+        """
+        self.client.close()
+
+
+def unit_id(name: str) -> Optional[int]:
+    """
+    Returns the virtual Modbus server ID assigned to a PowerTag from the last two characters of its name.
+
+    :param name: Name of the PowerTag.
+    :return: The server ID, or None if the name does not end with a valid one.
+    """
+    suffix = name[-2::]
+    return int(suffix) if suffix.isdigit() and 1 <= int(suffix) <= 247 else None
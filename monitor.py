@@ -0,0 +1,293 @@
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from modbus import (ACTIVE_POWER_A_OFFSET, ACTIVE_POWER_B_OFFSET, ACTIVE_POWER_C_OFFSET, FIRST_REGISTER,
+                    POWER_FACTOR_OFFSET, REGISTER_COUNT, ModbusError, ModbusVerifier, unit_id)
+
+logger = logging.getLogger(__name__)
+
+# Columns of a sample: total power factor and active power of phases A, B and C
+PF, PA, PB, PC = range(4)
+READING_COLUMNS = ('PF', 'Pa', 'Pb', 'Pc')
+# Float32 values of a register block in the order of the sample columns, every value takes two registers
+VALUE_INDEXES = [offset // 2 for offset in (POWER_FACTOR_OFFSET, ACTIVE_POWER_A_OFFSET, ACTIVE_POWER_B_OFFSET,
+                                            ACTIVE_POWER_C_OFFSET)]
+
+# States of a PowerTag, the same values as returned by evaluate_readings
+REVERSED, CHECK, OK = -1, 0, 1
+STATE_NAMES = {REVERSED: 'reversed', CHECK: 'check', OK: 'ok'}
+
+# Callback receiving the name of a PowerTag whose state has changed, its previous and its new state
+StateChangeCallback = Callable[[str, int, int], None]
+
+
+def classify(values: np.ndarray) -> np.ndarray:
+    """
+    Evaluates the readings of many PowerTags at once with the rules of evaluate_readings.
+    Readings which are not available are NaN, PowerTags without phases B and C are treated as single-phase.
+
+    :param values: Array of shape (..., 4) with the total power factor and the active power of phases A, B and C.
+    :return: Array of the states: -1 - Current flow needs to be change; 0 - Electrical or other problem to check
+        by engineer, 1 - readings are OK
+    """
+    pf, pa, pb, pc = (values[..., column] for column in (PF, PA, PB, PC))
+    with np.errstate(invalid='ignore'):
+        three_phase = ~np.isnan(pb) & ~np.isnan(pc)
+        forward = (pa > 0) & (pf > 0.5) & (~three_phase | ((pb > 0) & (pc > 0)))
+        reverse = (pa < 0) & (pf < 0.5) & (~three_phase | ((pb < 0) & (pc < 0)))
+    # Comparisons with NaN are false, so PowerTags without power factor or phase A are left to check
+    return np.where(forward, OK, np.where(reverse, REVERSED, CHECK)).astype(np.int8)
+
+
+class ReadingsBuffer:
+    """
+    Fixed-size ring buffer of the readings of all PowerTags of a gateway, allocated once.
+    """
+
+    def __init__(self, tags: List[str], capacity: int = 3600) -> None:
+        """
+        :param tags: Names of the PowerTags, in the order of the readings of a sample.
+        :param capacity: Number of samples kept, older samples are overwritten.
+        """
+        self.tags = list(tags)
+        self.capacity = capacity
+        self.times = np.full(capacity, np.nan)
+        self.values = np.full((capacity, len(self.tags), len(READING_COLUMNS)), np.nan, dtype=np.float32)
+        self.states = np.zeros((capacity, len(self.tags)), dtype=np.int8)
+        self.next = 0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def append(self, timestamp: float, values: np.ndarray, states: np.ndarray) -> None:
+        """
+        Stores a sample, overwriting the oldest one when the buffer is full.
+
+        :param timestamp: Time of the sample in seconds since the epoch.
+        :param values: Readings of all PowerTags, shape (number of PowerTags, 4).
+        :param states: States of all PowerTags.
+        """
+        with self._lock:
+            self.times[self.next] = timestamp
+            self.values[self.next] = values
+            self.states[self.next] = states
+            self.next = (self.next + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+
+    def window(self, start: Optional[float] = None, end: Optional[float] = None
+               ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns a copy of the stored samples taken within the given time window, oldest first.
+
+        :param start: Optional earliest time of the samples in seconds since the epoch.
+        :param end: Optional latest time of the samples in seconds since the epoch.
+        :return: Times, readings and states of the samples.
+        """
+        with self._lock:
+            order = (np.arange(self.count) + self.next - self.count) % self.capacity
+            times, values, states = self.times[order], self.values[order], self.states[order]
+        selected = np.ones(len(times), dtype=bool)
+        if start is not None:
+            selected &= times >= start
+        if end is not None:
+            selected &= times <= end
+        return times[selected], values[selected], states[selected]
+
+
+class ReadingsMonitor:
+    """
+    Polls the readings of the configured PowerTags of a gateway over Modbus on a fixed interval,
+    classifies all of them at once and reports the PowerTags whose state changes.
+    """
+
+    def __init__(self, verifier: ModbusVerifier, tags: Dict[str, int], interval: float = 1.0,
+                 capacity: int = 3600, on_change: Optional[StateChangeCallback] = None, gateway: str = '') -> None:
+        """
+        :param verifier: Modbus verifier connected to the gateway.
+        :param tags: Dictionary mapping the PowerTag name to its virtual server ID.
+        :param interval: Time in seconds between two polls.
+        :param capacity: Number of samples kept in memory.
+        :param on_change: Optional callback receiving the PowerTags whose state has changed.
+        :param gateway: Name of the gateway used in the log.
+        """
+        self.verifier = verifier
+        self.names = list(tags)
+        self.unit_ids = [tags[name] for name in self.names]
+        self.interval = interval
+        self.on_change = on_change
+        self.gateway = gateway
+        self.buffer = ReadingsBuffer(self.names, capacity)
+        self.state: Optional[np.ndarray] = None
+        # Number of state changes of every PowerTag since the monitor started
+        self.changes = np.zeros(len(self.names), dtype=np.int32)
+        self._stop = threading.Event()
+
+    def read(self) -> np.ndarray:
+        """
+        Reads the readings of all PowerTags in one pipelined sweep.
+
+        :return: Array of shape (number of PowerTags, 4), NaN where a reading is not available.
+        """
+        values = np.full((len(self.unit_ids), len(READING_COLUMNS)), np.nan, dtype=np.float32)
+        try:
+            blocks = self.verifier.client.read_holding_registers(
+                [(unit, FIRST_REGISTER, REGISTER_COUNT) for unit in self.unit_ids])
+        except ModbusError as e:
+            logger.error(f"[{self.gateway}] Unable to read the readings over Modbus: {e}")
+            return values
+        available = [index for index, block in enumerate(blocks) if block is not None and len(block) == REGISTER_COUNT]
+        if available:
+            # Two big-endian registers hold one big-endian Float32 value
+            registers = np.array([blocks[index] for index in available], dtype='>u2')
+            values[available] = registers.view('>f4')[:, VALUE_INDEXES]
+        return values
+
+    def poll(self) -> np.ndarray:
+        """
+        Takes one sample of all PowerTags, stores it and reports the state changes.
+
+        :return: States of all PowerTags.
+        """
+        timestamp = time.time()
+        values = self.read()
+        state = classify(values)
+        self.buffer.append(timestamp, values, state)
+        if self.state is not None:
+            changed = np.flatnonzero(state != self.state)
+            self.changes[changed] += 1
+            for index in changed:
+                name, old, new = self.names[index], int(self.state[index]), int(state[index])
+                logger.warning(f"[{self.gateway}] {name}: State changed from {STATE_NAMES[old]} to {STATE_NAMES[new]}.")
+                if self.on_change:
+                    self.on_change(name, old, new)
+        self.state = state
+        return state
+
+    def run(self, duration: Optional[float] = None) -> None:
+        """
+        Polls on the fixed interval until stopped or the duration has passed. Polls which would start late
+        because the previous one took too long are skipped.
+
+        :param duration: Optional time in seconds to monitor, until stop is called if not given.
+        """
+        start = time.monotonic()
+        polls = 0
+        while not self._stop.is_set():
+            if duration is not None and time.monotonic() - start >= duration:
+                break
+            self.poll()
+            polls += 1
+            elapsed = time.monotonic() - start
+            next_poll = (int(elapsed / self.interval) + 1) * self.interval
+            if duration is not None:
+                next_poll = min(next_poll, duration)
+            self._stop.wait(max(0.0, next_poll - elapsed))
+        logger.info(f"[{self.gateway}] Monitoring stopped after {polls} polls.")
+
+    def stop(self) -> None:
+        """
+        Stops the polling started by run.
+        """
+        self._stop.set()
+
+    def summary(self) -> Dict[str, int]:
+        """
+        Counts the PowerTags in every state of the last sample.
+
+        :return: Dictionary mapping the state name to the number of PowerTags.
+        """
+        if self.state is None:
+            return {}
+        return {STATE_NAMES[state]: int(np.count_nonzero(self.state == state)) for state in STATE_NAMES}
+
+    def export(self, filename: str, start: Optional[float] = None, end: Optional[float] = None) -> int:
+        """
+        Exports a window of the history, one row per sample and PowerTag. Files ending with '.parquet' are
+        written as Parquet (requires pyarrow), other files as semicolon separated CSV.
+
+        :param filename: Name of the export file.
+        :param start: Optional earliest time of the exported samples in seconds since the epoch.
+        :param end: Optional latest time of the exported samples in seconds since the epoch.
+        :return: Number of exported rows.
+        """
+        import pandas as pd
+        times, values, states = self.buffer.window(start, end)
+        count = len(self.names)
+        frame = pd.DataFrame({'Time': pd.to_datetime(np.repeat(times, count), unit='s'),
+                              'Name': np.tile(np.array(self.names, dtype=object), len(times))})
+        for column, title in enumerate(READING_COLUMNS):
+            frame[title] = values[:, :, column].reshape(-1)
+        frame['State'] = states.reshape(-1)
+        if filename.endswith('.parquet'):
+            frame.to_parquet(filename, index=False)
+        else:
+            frame.to_csv(filename, sep=';', index=False)
+        logger.info(f"[{self.gateway}] {len(frame)} readings exported to {filename}.")
+        return len(frame)
+
+
+def monitored_tags(file_path: str) -> Dict[str, int]:
+    """
+    Returns the PowerTags of a project file which can be monitored, those with an RFID and a valid server ID.
+
+    :param file_path: The path to the CSV file containing PowerTags data.
+    :return: Dictionary mapping the PowerTag name to its virtual server ID.
+    """
+    from file_operations import File
+    file_object = File(file_path)
+    if file_object.load_data() is None:
+        return {}
+    tags = {}
+    for name, row in file_object.name_index.items():
+        server_id = unit_id(name)
+        if server_id is None:
+            logger.warning(f"{name}: No valid virtual server ID, unable to monitor it.")
+        elif file_object.all_data.at[row, 'RF ID']:
+            tags[name] = server_id
+    return tags
+
+
+if __name__ == "__main__":
+    import argparse
+    from urllib.parse import urlparse
+
+    from multi_gateway import load_manifest
+
+    parser = argparse.ArgumentParser(description="Monitor the readings of commissioned PowerTags over Modbus TCP.")
+    parser.add_argument('manifest', help="Semicolon separated manifest with the columns Gateway, URL, File, Password.")
+    parser.add_argument('--modbus-port', type=int, default=502, help="Modbus TCP port of the gateways.")
+    parser.add_argument('--interval', type=float, default=1.0, help="Time in seconds between two polls.")
+    parser.add_argument('--duration', type=float, help="Time in seconds to monitor, until interrupted if not given.")
+    parser.add_argument('--capacity', type=int, default=3600, help="Number of samples kept per gateway.")
+    parser.add_argument('--export-dir', default='.', help="Directory the history of every gateway is exported to.")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv', help="Format of the exported history.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s')
+
+    monitors = []
+    for target in load_manifest(args.manifest):
+        verifier = ModbusVerifier(urlparse(target.url).hostname, args.modbus_port)
+        monitors.append(ReadingsMonitor(verifier, monitored_tags(target.file_path), args.interval, args.capacity,
+                                        gateway=target.gateway))
+    threads = [threading.Thread(target=monitor.run, args=(args.duration,), name=monitor.gateway, daemon=True)
+               for monitor in monitors]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.5)
+    except KeyboardInterrupt:
+        for monitor in monitors:
+            monitor.stop()
+        for thread in threads:
+            thread.join()
+    for monitor in monitors:
+        logger.info(f"[{monitor.gateway}] {monitor.summary()}")
+        monitor.export(os.path.join(args.export_dir, f"PowerTags_monitor_{monitor.gateway.replace(':', '_')}"
+                                                     f".{args.format}"))
+        monitor.verifier.close()
@@ -0,0 +1,244 @@
+import csv
+import getpass
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, List, NamedTuple, Optional
+from urllib.parse import urlparse
+
+import pandas as pd
+
+from backends import load_endpoints
+from config_cache import ConfigCache
+from main import configure_start, gateway_output_file
+from session_pool import SessionPool
+
+logger = logging.getLogger(__name__)
+
+# Progress callback for a whole site: receives the gateway name, the PowerTag name and its status
+SiteProgressCallback = Callable[[str, str, str], None]
+
+
+class GatewayTarget(NamedTuple):
+    """
+    A single gateway entry of the site manifest.
+    """
+    gateway: str
+    url: str
+    file_path: str
+    password: Optional[str] = None
+
+
+class GatewayResult(NamedTuple):
+    """
+    Outcome of configuring a single gateway.
+    """
+    gateway: str
+    url: str
+    output_file: str
+    succeeded: bool
+    duration: float
+    error: str = ''
+
+
+def gateway_name(url: str) -> str:
+    """
+    Derives a short gateway name from its URL.
+
+    :param url: URL of the gateway.
+    :return: Host name (and port) of the URL, or the URL itself if it cannot be parsed.
+    """
+    return urlparse(url).netloc or url
+
+
+def load_manifest(manifest_path: str) -> List[GatewayTarget]:
+    """
+    Reads the site manifest mapping every gateway URL to its CSV partition.
+
+    The manifest is a semicolon separated file with the columns 'URL' and 'File' and the optional
+    columns 'Gateway' and 'Password'. Relative partition paths are resolved against the manifest location.
+
+    :param manifest_path: Path to the manifest file.
+    :return: List of gateway targets, empty if the manifest could not be read.
+    """
+    targets = []
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    try:
+        with open(manifest_path, newline='', encoding='utf-8') as manifest:
+            for row in csv.DictReader(manifest, delimiter=';'):
+                url = (row.get('URL') or '').strip()
+                file_path = (row.get('File') or '').strip()
+                if not url or not file_path:
+                    logger.warning(f"Skipping incomplete manifest row: {row}")
+                    continue
+                if not os.path.isabs(file_path):
+                    file_path = os.path.join(base_dir, file_path)
+                targets.append(GatewayTarget(gateway=(row.get('Gateway') or '').strip() or gateway_name(url),
+                                             url=url,
+                                             file_path=file_path,
+                                             password=(row.get('Password') or '').strip() or None))
+    except FileNotFoundError:
+        logger.critical(f"Manifest not found at the specified path: {manifest_path}")
+    return targets
+
+
+def configure_gateway(target: GatewayTarget, password: str, output_dir: str = '.',
+                      progress: Optional[SiteProgressCallback] = None, **options) -> GatewayResult:
+    """
+    Configures all PowerTags of a single gateway in its own session.
+
+    :param target: The gateway to configure.
+    :param password: Password used when the manifest does not define one for the gateway.
+    :param output_dir: Directory the per-gateway result file is saved to.
+    :param progress: Optional callback receiving the gateway name, the PowerTag name and its status.
+    :param options: Further keyword arguments of configure_start, e.g. backend, resume, modbus_port or pipeline.
+    :return: Result of the configuration.
+    """
+    threading.current_thread().name = target.gateway
+    output_file = gateway_output_file(target.gateway, output_dir)
+
+    def report(name: str, status: str) -> None:
+        logger.info(f"[{target.gateway}] {name}: {status}")
+        if progress:
+            progress(target.gateway, name, status)
+
+    # Verify-only and resumed runs fill their results into the results of the previous run
+    if os.path.exists(output_file) and not options.get('verify_only') and not options.get('resume'):
+        os.remove(output_file)
+    previous = os.stat(output_file).st_mtime_ns if os.path.exists(output_file) else None
+
+    start = time.monotonic()
+    gateway = None
+    try:
+        gateway = configure_start(target.url, target.password or password, target.file_path, output_file, report,
+                                  **options)
+        succeeded = os.path.exists(output_file) and os.stat(output_file).st_mtime_ns != previous
+        error = '' if succeeded else 'No results were saved.'
+    except Exception as e:
+        logger.error(f"[{target.gateway}] Error during configuration: {e}")
+        succeeded, error = False, str(e)
+    finally:
+        if gateway:
+            gateway.quit()
+    duration = time.monotonic() - start
+    logger.info(f"[{target.gateway}] Finished in {duration:.1f} s.")
+    return GatewayResult(target.gateway, target.url, output_file, succeeded, duration, error)
+
+
+def merge_results(results: List[GatewayResult], report_file: str) -> None:
+    """
+    Merges the per-gateway result files into one site report with an additional 'Gateway' column.
+
+    :param results: Results of the configured gateways.
+    :param report_file: Name of the site report file.
+    """
+    frames = []
+    for result in results:
+        if not result.succeeded:
+            continue
+        frame = pd.read_csv(result.output_file, sep=';', dtype=str, keep_default_na=False)
+        frame.insert(0, 'Gateway', result.gateway)
+        frames.append(frame)
+    if not frames:
+        logger.warning("No gateway results to merge.")
+        return
+    pd.concat(frames, ignore_index=True).to_csv(report_file, sep=';', index=False)
+    logger.info(f"Site report successfully saved to {report_file}.")
+
+
+def configure_site(targets: List[GatewayTarget], password: str, max_workers: int = 4, output_dir: str = '.',
+                   report_file: str = "PowerTags_site_report.csv",
+                   progress: Optional[SiteProgressCallback] = None, **options) -> List[GatewayResult]:
+    """
+    Configures several gateways in parallel, one session per gateway.
+
+    :param targets: Gateways to configure.
+    :param password: Password used for gateways without their own password in the manifest.
+    :param max_workers: Maximum number of gateways configured at the same time.
+    :param output_dir: Directory the per-gateway result files are saved to.
+    :param report_file: Name of the merged site report file.
+    :param progress: Optional callback receiving the gateway name, the PowerTag name and its status.
+    :param options: Further keyword arguments of configure_start, e.g. backend, resume, modbus_port or pipeline.
+    :return: Results of all gateways in manifest order.
+    """
+    if not targets:
+        logger.warning("No gateways to configure.")
+        return []
+
+    start = time.monotonic()
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(targets)))) as executor:
+        futures = {executor.submit(configure_gateway, target, password, output_dir, progress, **options): index
+                   for index, target in enumerate(targets)}
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            logger.info(f"[{result.gateway}] {'Completed' if result.succeeded else 'Failed: ' + result.error}")
+
+    ordered = [results[index] for index in range(len(targets))]
+    merge_results(ordered, report_file)
+    logger.info(f"Configured {sum(r.succeeded for r in ordered)}/{len(ordered)} gateways "
+                f"in {time.monotonic() - start:.1f} s.")
+    return ordered
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Configure PowerTags on several PAS600 gateways in parallel.")
+    parser.add_argument('manifest', help="Semicolon separated manifest with the columns Gateway, URL, File, Password.")
+    parser.add_argument('--workers', type=int, default=4, help="Maximum number of gateways configured at once.")
+    parser.add_argument('--backend', choices=['selenium', 'http'], default='selenium',
+                        help="Drive the web interface in Chrome or call the gateway's web backend directly.")
+    parser.add_argument('--modbus-port', type=int, help="Check the readings over Modbus TCP on this port.")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="Configure all PowerTags first and check their readings in batches afterwards.")
+    parser.add_argument('--resume', action='store_true', help="Continue the previous run of every gateway.")
+    # The import only reaches the PowerTags that have joined, so it cannot start during the search
+    discovery = parser.add_mutually_exclusive_group()
+    discovery.add_argument('--stream', action='store_true',
+                           help="Configure the PowerTags as soon as the search finds them and end the search once "
+                                "all PowerTags of the file have been found.")
+    discovery.add_argument('--bulk', action='store_true',
+                           help="Import the settings of all PowerTags of a gateway in a single operation and check "
+                                "their readings afterwards (http backend only).")
+    parser.add_argument('--endpoints', help="JSON file with the paths of the gateway's web backend used by the http "
+                                            "backend instead of the assumed ones.")
+    parser.add_argument('--report', default="PowerTags_site_report.csv", help="Name of the merged site report.")
+    parser.add_argument('--show-browser', action='store_true', help="Show the Chrome windows instead of running "
+                                                                    "them headless.")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Configure and check all PowerTags, ignoring the configurations confirmed by earlier "
+                             "runs.")
+    parser.add_argument('--forget-cache', action='store_true',
+                        help="Clear the cached configurations of the gateways first, e.g. after a factory reset.")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Only check the CSV files and estimate the run time, without connecting to the gateways.")
+    args = parser.parse_args()
+    if args.endpoints and args.backend != 'http':
+        parser.error("--endpoints is only used by --backend http")
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s')
+
+    site = load_manifest(args.manifest)
+    if args.dry_run:
+        from planner import plan_project, report_lines
+        for target in site:
+            plan = plan_project(target.file_path, gateway=target.url)
+            print(f"{target.gateway} ({target.file_path}):")
+            print('\n'.join(f"    {line}" for line in report_lines(plan)) if plan else "    Unable to load the file.")
+    else:
+        default_password = '' if all(t.password for t in site) else getpass.getpass("Gateway password: ")
+        sessions = SessionPool(headless=not args.show_browser)
+        cache = None if args.no_cache else ConfigCache()
+        if cache and args.forget_cache:
+            for target in site:
+                cache.forget(target.url)
+        try:
+            configure_site(site, default_password, args.workers, report_file=args.report, backend=args.backend,
+                           resume=args.resume, modbus_port=args.modbus_port, pipeline=args.pipeline, pool=sessions,
+                           stream=args.stream, cache=cache, bulk=args.bulk,
+                           endpoints=load_endpoints(args.endpoints) if args.endpoints else None)
+        finally:
+            sessions.close()
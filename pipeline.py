@@ -0,0 +1,663 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from backends import Backend, BackendError, DeviceInfo, Readings, evaluate_readings
+from bulk_config import generate_configuration, verify_configuration
+from file_operations import File, normalize_rfid
+from modbus import ModbusVerifier, unit_id
+from timing import tagged
+
+logger = logging.getLogger(__name__)
+
+# Progress callback: receives the PowerTag name and its current status
+ProgressCallback = Callable[[str, str], None]
+
+# Maximum duration of the ZigBee discovery in seconds, as waited for by search_for_new_powertags
+DISCOVERY_TIMEOUT = 120
+# Time in seconds between two listings of the devices while the discovery is running
+DISCOVERY_POLL_INTERVAL = 1.0
+
+# A verdict is reached once one outcome leads all others by this many samples of the readings
+AGREEING_SAMPLES = 3
+# Maximum number of samples taken of the readings of a PowerTag that keep disagreeing, e.g. under a cycling load
+MAX_SAMPLES = 12
+# Time in seconds between two samples of the readings
+SAMPLE_INTERVAL = 1.0
+
+
+class Sampling(NamedTuple):
+    """
+    How the readings of a PowerTag are sampled before a verdict is reached.
+    """
+    agreeing: int = AGREEING_SAMPLES
+    max_samples: int = MAX_SAMPLES
+    interval: float = SAMPLE_INTERVAL
+
+
+class ConfiguredTag(NamedTuple):
+    """
+    A PowerTag whose settings have been written and whose readings still have to be checked.
+    """
+    name: str
+    device: object
+    server_id: Optional[int]
+    rfid: str = ''
+
+
+class Visit(NamedTuple):
+    """
+    A device to open, with whether its settings have to be written or only its readings have to be checked.
+    """
+    device: object
+    write: bool = True
+
+
+def already_verified(file_object: File, name: str, progress: Optional[ProgressCallback] = None) -> bool:
+    """
+    Checks whether a verdict of the PowerTag has been recorded by a previous run.
+
+    :param file_object: File holding the results.
+    :param name: Name of the PowerTag.
+    :param progress: Optional callback receiving the PowerTag name and its status.
+    :return: True if the PowerTag can be skipped.
+    """
+    verdict = file_object.get_result(name, 'Issues')
+    if verdict == '':
+        return False
+    logging.info(f"{name}: Already configured and verified, skipping it.")
+    if progress:
+        progress(name, "verified" if verdict != '0' else "needs attention")
+    return True
+
+
+def already_configured(file_object: File, info: DeviceInfo, progress: Optional[ProgressCallback] = None) -> bool:
+    """
+    Checks whether a device already carries the name, label and virtual server ID of its PowerTag in the file
+    and a verdict of its readings is known, recorded by the resumed run or confirmed by an earlier run in the cache.
+    A verdict taken over from the cache is recorded as well.
+
+    :param file_object: File holding the PowerTags data.
+    :param info: The device with its current settings.
+    :param progress: Optional callback receiving the PowerTag name and its status.
+    :return: True if the device does not have to be visited.
+    """
+    name, label = file_object.get_information(info.rfid)
+    cached = file_object.snapshot.confirmed(info) if file_object.snapshot else None
+    if name == '' or (info.name, info.label, info.unit_id) != (name, label, name[-2::]):
+        return False
+    if file_object.get_result(name, 'Issues') != '':
+        return already_verified(file_object, name, progress)
+    if file_object.snapshot and normalize_rfid(info.rfid) in file_object.snapshot.stale:
+        # Changed on the gateway since it was confirmed, e.g. its current flow, so it is checked again
+        return False
+    if cached and cached.verdict in ('1', '-1'):
+        logging.info(f"{name}: Configuration and readings confirmed by an earlier run, skipping it.")
+        file_object.mark_mounted(name, 'OK')
+        file_object.mark_correct_values(name, cached.verdict)
+        if cached.confidence and cached.samples:
+            file_object.mark_confidence(name, float(cached.confidence), int(cached.samples))
+        if progress:
+            progress(name, "verified")
+        return True
+    return False
+
+
+def visit_for(file_object: File, info: DeviceInfo, progress: Optional[ProgressCallback] = None) -> Optional[Visit]:
+    """
+    Decides whether a device of the file has to be visited and whether its settings have to be written.
+    A device already carrying its settings without a known verdict, e.g. written just before a run was
+    interrupted or left to check by an engineer, only has its readings checked.
+
+    :param file_object: File holding the PowerTags data.
+    :param info: The device with its current settings.
+    :param progress: Optional callback receiving the PowerTag name and its status.
+    :return: The visit of the device, or None if it does not have to be visited.
+    """
+    if already_configured(file_object, info, progress):
+        return None
+    name, label = file_object.get_information(info.rfid)
+    if name != '' and (info.name, info.label, info.unit_id) == (name, label, name[-2::]):
+        logging.info(f"{name}: Already configured, checking its readings.")
+        return Visit(info.device, write=False)
+    return Visit(info.device)
+
+
+def devices_to_visit(backend: Backend, file_object: File, progress: Optional[ProgressCallback] = None
+                     ) -> Iterable[Visit]:
+    """
+    Lists the devices known to the gateway in one query and returns only those whose settings differ from the file
+    or whose readings have not been checked yet. Devices not listed in the file are left out as well.
+
+    :param backend: The backend connected to the gateway.
+    :param file_object: File holding the PowerTags data.
+    :param progress: Optional callback receiving the PowerTag name and its status.
+    :return: Visits of the devices to open, all devices if the backend cannot list them in one query.
+    """
+    inventory = backend.inventory()
+    if inventory is None:
+        return (Visit(device) for device in backend.devices())
+    if file_object.snapshot:
+        file_object.snapshot.prune(normalize_rfid(info.rfid) for info in inventory)
+    visits = [visit_for(file_object, info, progress) for info in inventory
+              if file_object.rfid_index.get(normalize_rfid(info.rfid)) is not None]
+    pending = [visit for visit in visits if visit is not None]
+    logging.info(f"{sum(visit.write for visit in pending)} of {len(inventory)} PowerTags on the gateway need to be "
+                 f"configured, {sum(not visit.write for visit in pending)} only to be checked.")
+    return pending
+
+
+def stream_devices(backend: Backend, file_object: File, progress: Optional[ProgressCallback] = None,
+                   timeout: float = DISCOVERY_TIMEOUT, poll_interval: float = DISCOVERY_POLL_INTERVAL
+                   ) -> Iterator[Visit]:
+    """
+    Starts the ZigBee discovery and yields the devices of the file as soon as they appear on the gateway,
+    so they are configured while the search is still running. The search is stopped early once every RFID
+    of the file has been seen. Devices that already match the file and have a known verdict are not yielded.
+    Every poll only lists the devices added to the end of the list since the previous one, all devices are
+    listed once more when the search has ended without finding every RFID.
+
+    If the backend cannot start the search without waiting or cannot list the devices in one query,
+    the whole search is waited out and the devices are listed afterwards.
+
+    :param backend: The backend connected to the gateway.
+    :param file_object: File holding the PowerTags data.
+    :param progress: Optional callback receiving the PowerTag name and its status.
+    :param timeout: Maximum duration of the search in seconds.
+    :param poll_interval: Time in seconds between two listings of the devices.
+    :return: Visits of the devices to open.
+    """
+    if not backend.start_discovery():
+        backend.search_for_new_powertags()
+        yield from devices_to_visit(backend, file_object, progress)
+        return
+    expected = set(file_object.rfid_index)
+    seen = set()
+    # Number of devices listed so far, every poll only lists the devices which joined since
+    listed = 0
+    start = time.perf_counter()
+    while True:
+        polled = time.perf_counter()
+        # The status is read before the listing, so devices joining at the very end are still listed
+        running = backend.discovery_running() and polled - start < timeout
+        # Once the search has ended all devices are listed again, in case one was not added at the end
+        inventory = backend.inventory(listed if running else 0)
+        if inventory is None:
+            logging.info("The devices cannot be listed during the search, waiting for it to finish.")
+            while backend.discovery_running() and time.perf_counter() - start < timeout:
+                time.sleep(poll_interval)
+            record_search(backend, start)
+            yield from devices_to_visit(backend, file_object, progress)
+            return
+        listed += len(inventory)
+        found = []
+        for info in inventory:
+            rfid = normalize_rfid(info.rfid)
+            if rfid in expected and rfid not in seen:
+                seen.add(rfid)
+                visit = visit_for(file_object, info, progress)
+                if visit is not None:
+                    found.append(visit)
+        if seen >= expected or not running:
+            if seen >= expected:
+                logging.info(f"All {len(expected)} PowerTags of the file have been found, ending the search.")
+                if running:
+                    backend.stop_discovery()
+            else:
+                logging.info(f"Search completed, {len(seen)} of {len(expected)} PowerTags of the file found.")
+            record_search(backend, start)
+            yield from found
+            return
+        yield from found
+        time.sleep(max(0.0, poll_interval - (time.perf_counter() - polled)))
+
+
+def upload_devices(backend: Backend, file_object: File, progress: Optional[ProgressCallback] = None
+                   ) -> Optional[List[ConfiguredTag]]:
+    """
+    Imports the settings of all PowerTags of the file that differ from the gateway in a single operation, then
+    reads the devices back and returns the ones confirmed to carry their settings. The search for new PowerTags
+    must have finished, only the devices known to the gateway are imported.
+
+    :param backend: The backend connected to the gateway.
+    :param file_object: File holding the PowerTags data.
+    :param progress: Optional callback receiving the PowerTag name and its status.
+    :return: The confirmed PowerTags whose readings still have to be checked, or None if the backend cannot
+        import a configuration or list the devices, they are then configured one by one.
+    """
+    inventory = backend.inventory()
+    if inventory is None:
+        return None
+    if file_object.snapshot:
+        file_object.snapshot.prune(normalize_rfid(info.rfid) for info in inventory)
+    pending = set()
+    # Devices already carrying their settings only have their readings checked
+    unchecked = []
+    for info in inventory:
+        rfid = normalize_rfid(info.rfid)
+        if file_object.rfid_index.get(rfid) is None:
+            continue
+        visit = visit_for(file_object, info, progress)
+        if visit is None:
+            continue
+        name, label = file_object.get_information(rfid)
+        if name == '' or label == '':
+            continue
+        if not visit.write:
+            unchecked.append(ConfiguredTag(name, info.device, unit_id(name), rfid))
+        elif not already_verified(file_object, name, progress):
+            pending.add(rfid)
+    configuration = generate_configuration(file_object, pending)
+    if not configuration['devices']:
+        logging.info(f"All {len(inventory)} PowerTags on the gateway already match the file.")
+        return unchecked
+    if not backend.import_configuration(configuration):
+        return None
+    confirmed, problems = verify_configuration(configuration, backend.inventory())
+    for rfid, problem in problems.items():
+        logging.error(f"{file_object.get_information(rfid)[0]}: Configuration not confirmed, {problem}.")
+    logging.info(f"{len(confirmed)} of {len(configuration['devices'])} imported PowerTags confirmed.")
+    return unchecked + [ConfiguredTag(file_object.get_information(rfid)[0], info.device, unit_id(info.name), rfid)
+                        for rfid, info in confirmed.items()]
+
+
+def record_search(backend: Backend, start: float) -> None:
+    """
+    Records the duration of the search for new PowerTags.
+
+    :param backend: The backend connected to the gateway.
+    :param start: Value of time.perf_counter when the search was started.
+    """
+    if backend.timings:
+        backend.timings.record('search', time.perf_counter() - start)
+
+
+def readings_verdict(name: str, readings: Optional[Readings]) -> int:
+    """
+    Logs the readings of a PowerTag and evaluates them.
+
+    :param name: Name of the PowerTag.
+    :param readings: Total power factor and active power of phases A, B and C, or None if not available.
+    :return: -1 - Current flow needs to be change; 0 - Electrical or other problem to check by engineer,
+        1 - readings are OK
+    """
+    if readings is None:
+        return 0
+    logging.info(f"Current readings for {name}: PF={readings[0]}, Pa={readings[1]}, "
+                 f"Pb={readings[2]}, Pc={readings[3]}")
+    return evaluate_readings(*readings)
+
+
+class Verdict(NamedTuple):
+    """
+    Verdict of the readings of a PowerTag reached from several samples.
+    """
+    reply: int
+    confidence: float
+    samples: int
+
+
+class Votes:
+    """
+    Collects the verdicts of successive samples of the readings of a PowerTag until they agree.
+
+    Sampling stops as soon as one outcome leads all others by the given number of samples, so stable readings
+    are decided after a few samples and only fluctuating ones are sampled longer, up to the cap.
+    """
+
+    def __init__(self, sampling: Sampling = Sampling()) -> None:
+        """
+        :param sampling: Lead over all other outcomes needed for a verdict and maximum number of samples.
+        """
+        self.agreeing = sampling.agreeing
+        self.max_samples = sampling.max_samples
+        self.counts: Counter = Counter()
+        self.samples = 0
+
+    def add(self, reply: int) -> None:
+        """
+        Adds the verdict of a sample.
+
+        :param reply: Verdict of the sample as returned by evaluate_readings.
+        """
+        self.counts[reply] += 1
+        self.samples += 1
+
+    def lead(self) -> int:
+        """
+        :return: Number of samples the most frequent outcome leads the second one by.
+        """
+        ranked = [count for _, count in self.counts.most_common(2)] + [0, 0]
+        return ranked[0] - ranked[1]
+
+    @property
+    def decided(self) -> bool:
+        """
+        :return: True if no more samples are needed: the outcomes agree, the remaining samples cannot change
+            the leading outcome anymore or the cap has been reached.
+        """
+        lead = self.lead()
+        return (self.samples >= self.max_samples or lead >= min(self.agreeing, self.max_samples)
+                or lead > self.max_samples - self.samples)
+
+    def verdict(self) -> Verdict:
+        """
+        Returns the outcome of the majority of the samples. Without a majority, the readings are left to
+        be checked by an engineer.
+
+        :return: The verdict with the share of the samples agreeing with it and the number of samples.
+        """
+        if not self.samples:
+            return Verdict(0, 0.0, 0)
+        reply, count = self.counts.most_common(1)[0]
+        if 2 * count <= self.samples:
+            reply = 0
+        return Verdict(reply, self.counts[reply] / self.samples, self.samples)
+
+
+def sample_verdict(name: str, read: Callable[[], Optional[Readings]], sampling: Sampling = Sampling()) -> Verdict:
+    """
+    Samples the readings of a PowerTag until they agree on forward, reversed or faulty.
+
+    :param name: Name of the PowerTag.
+    :param read: Reads the current readings of the PowerTag.
+    :param sampling: How the readings are sampled.
+    :return: The verdict of the readings.
+    """
+    votes = Votes(sampling)
+    while True:
+        votes.add(readings_verdict(name, read()))
+        if votes.decided:
+            break
+        time.sleep(sampling.interval)
+    verdict = votes.verdict()
+    if verdict.samples > sampling.agreeing:
+        logging.info(f"{name}: Readings fluctuated, verdict {verdict.reply} from {verdict.samples} samples "
+                     f"with confidence {verdict.confidence:.2f}.")
+    return verdict
+
+
+def record_verdict(file_object: File, name: str, reply: int, progress: Optional[ProgressCallback] = None,
+                   verdict: Optional[Verdict] = None) -> None:
+    """
+    Records the verdict of the readings of a PowerTag. A reversed current flow must already be changed.
+
+    :param file_object: File holding the results.
+    :param name: Name of the PowerTag.
+    :param reply: Verdict of the readings as returned by evaluate_readings.
+    :param progress: Optional callback receiving the PowerTag name and its status.
+    :param verdict: Optional sampled verdict whose confidence and number of samples are recorded as well.
+    """
+    if reply == 0:
+        file_object.mark_mounted(name, 'Attention, check the readings!')
+        file_object.mark_correct_values(name, str(reply))
+        logging.warning(f"{name}: Attention, check the readings!")
+    else:
+        if reply == -1:
+            logging.warning(f"{name}: The direction of current flow has been changed")
+        else:
+            logging.info(f"{name}: Correct readings")
+        file_object.mark_mounted(name, 'OK')
+        file_object.mark_correct_values(name, str(reply))
+    if verdict:
+        file_object.mark_confidence(name, verdict.confidence, verdict.samples)
+    if file_object.snapshot:
+        rfid, label = file_object.get_rfid(name)
+        if rfid:
+            confidence, samples = (f"{verdict.confidence:.2f}", str(verdict.samples)) if verdict else ('', '')
+            file_object.snapshot.confirm(rfid, name, label, reply, confidence, samples)
+    if progress:
+        progress(name, "verified" if reply != 0 else "needs attention")
+
+
+class Pipeline:
+    """
+    Configures all PowerTags first and checks their readings in batches afterwards.
+
+    The configured PowerTags are passed to the verification through a queue. When the readings are read over
+    Modbus or the backend can be used from several threads, the verification of the first PowerTags runs while
+    the later ones are still being configured. PowerTags without a virtual server ID are then checked through a
+    backend that can only be used from one thread once the configuration has ended. The current flow is reversed
+    only for the PowerTags that need it.
+    """
+
+    def __init__(self, backend: Backend, file_object: File, progress: Optional[ProgressCallback] = None,
+                 verifier: Optional[ModbusVerifier] = None, batch_size: int = 32, batch_wait: float = 0.5,
+                 sampling: Sampling = Sampling(), stream: bool = False, bulk: bool = False) -> None:
+        """
+        :param backend: The backend connected to the gateway.
+        :param file_object: File with the loaded PowerTags data.
+        :param progress: Optional callback receiving the PowerTag name and its status.
+        :param verifier: Optional Modbus verifier used to read the readings instead of the backend.
+        :param batch_size: Maximum number of PowerTags checked in one batch.
+        :param batch_wait: Time in seconds to wait for more configured PowerTags before checking a batch.
+        :param sampling: How the readings are sampled before a verdict is reached.
+        :param stream: Whether to configure the PowerTags as soon as the search for new PowerTags finds them.
+        :param bulk: Whether to import the settings of all PowerTags in a single operation when the backend can.
+        """
+        self.backend = backend
+        self.file_object = file_object
+        self.progress = progress
+        self.verifier = verifier
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.sampling = sampling
+        self.stream = stream
+        self.bulk = bulk
+        self.configured: queue.Queue = queue.Queue()
+        self.reversals: queue.Queue = queue.Queue()
+        self.overlap = verifier is not None or backend.thread_safe
+        # PowerTags the verification thread cannot read over Modbus, checked once the configuration has ended
+        self.deferred: List[ConfiguredTag] = []
+        # Exception ending the verification thread, raised again by run
+        self.error: Optional[Exception] = None
+        # Serializes the updates of the results coming from both phases
+        self.lock = threading.Lock()
+
+    def run(self) -> None:
+        """
+        Runs both phases and waits until all PowerTags are checked.
+        """
+        worker = None
+        if self.overlap:
+            worker = threading.Thread(target=self.verify_in_background, name='verification', daemon=True)
+            worker.start()
+        try:
+            self.configure_all()
+        finally:
+            # Marks the end of the configuration phase
+            self.configured.put(None)
+        if worker:
+            worker.join()
+            if self.error:
+                raise self.error
+            for start in range(0, len(self.deferred), self.batch_size):
+                self.verify_batch(self.deferred[start:start + self.batch_size])
+        else:
+            self.verify_configured()
+        self.apply_reversals()
+
+    def configure_all(self) -> None:
+        """
+        Phase one: writes the names, labels and virtual server IDs of all discovered PowerTags.
+        """
+        if self.bulk and self.upload_all():
+            return
+        if self.stream:
+            devices = stream_devices(self.backend, self.file_object, self.progress)
+        else:
+            devices = devices_to_visit(self.backend, self.file_object, self.progress)
+        n = 0
+        for n, (device, write) in enumerate(devices, start=1):
+            self.apply_reversals()
+            try:
+                source_id = self.backend.open_device(device)
+            except BackendError as e:
+                logging.error(f"The PowerTag number {n} could not be opened, skipping it: {e}")
+                continue
+            if source_id is None:
+                break
+            rfid = source_id[-4::]
+            name, label = self.file_object.get_information(rfid)
+            if name == '' or label == '' or already_verified(self.file_object, name, self.progress):
+                continue
+            if self.progress:
+                self.progress(name, "discovered")
+            if write:
+                try:
+                    with tagged(self.backend.timings, name, rfid):
+                        self.backend.write_device(device, name, label, name[-2::])
+                except BackendError as e:
+                    logging.error(f"{name}: Configuration failed: {e}")
+                    continue
+                logging.info(f"Powertag {name} : {label} has been configured correctly.")
+            with self.lock:
+                self.file_object.mark_mounted(name, "OK")
+            if self.progress:
+                self.progress(name, "configured")
+            self.configured.put(ConfiguredTag(name, device, unit_id(name), rfid))
+        logging.info(f"Adding {n} PowerTags has been completed")
+
+    def upload_all(self) -> bool:
+        """
+        Phase one in a single import of the settings of all PowerTags, when the backend can import them.
+
+        :return: True if the configuration has been imported, False if the PowerTags have to be configured one by one.
+        """
+        try:
+            uploaded = upload_devices(self.backend, self.file_object, self.progress)
+        except BackendError as e:
+            logging.error(f"The configuration could not be imported, configuring the PowerTags one by one: {e}")
+            return False
+        if uploaded is None:
+            logging.info("The backend cannot import a configuration, configuring the PowerTags one by one.")
+            return False
+        for tag in uploaded:
+            with self.lock:
+                self.file_object.mark_mounted(tag.name, "OK")
+            if self.progress:
+                self.progress(tag.name, "configured")
+            self.configured.put(tag)
+        return True
+
+    def next_batch(self) -> Optional[List[ConfiguredTag]]:
+        """
+        Collects the next batch of configured PowerTags.
+
+        :return: The batch, or None once the configuration phase has ended and all PowerTags are taken.
+        """
+        first = self.configured.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            try:
+                tag = self.configured.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if tag is None:
+                # Leaves the end mark for the next call
+                self.configured.put(None)
+                break
+            batch.append(tag)
+        return batch
+
+    def read_batch(self, batch: List[ConfiguredTag]) -> Dict[str, Optional[Readings]]:
+        """
+        Reads the readings of a batch of PowerTags, over Modbus in one sweep when possible.
+
+        :param batch: The configured PowerTags.
+        :return: Dictionary mapping the PowerTag name to its readings.
+        """
+        readings = {}
+        servers = [tag.server_id for tag in batch if tag.server_id is not None]
+        values = self.verifier.read_values(servers) if self.verifier and servers else {}
+        for tag in batch:
+            if tag.server_id in values:
+                readings[tag.name] = values[tag.server_id]
+                continue
+            try:
+                with tagged(self.backend.timings, tag.name, tag.rfid):
+                    self.backend.select_device(tag.device)
+                    readings[tag.name] = self.backend.read_values(tag.device)
+            except BackendError as e:
+                logging.error(f"{tag.name}: Unable to read the readings: {e}")
+                readings[tag.name] = None
+        return readings
+
+    def verify_in_background(self) -> None:
+        """
+        Phase two in the verification thread, while the main thread is still configuring.
+        """
+        try:
+            self.verify_configured(background=True)
+        except Exception as e:
+            logging.error(f"The verification of the readings failed: {e}")
+            self.error = e
+
+    def verify_configured(self, background: bool = False) -> None:
+        """
+        Phase two: checks the readings of the configured PowerTags batch by batch.
+
+        :param background: Whether it runs in the verification thread, PowerTags which cannot be read over Modbus
+            are then left to the main thread unless the backend can be used from several threads.
+        """
+        while True:
+            batch = self.next_batch()
+            if batch is None:
+                return
+            if background and not self.backend.thread_safe:
+                self.deferred.extend(tag for tag in batch if tag.server_id is None)
+                batch = [tag for tag in batch if tag.server_id is not None]
+            self.verify_batch(batch)
+            if not self.overlap:
+                self.apply_reversals()
+
+    def verify_batch(self, batch: List[ConfiguredTag]) -> None:
+        """
+        Samples the readings of a batch of PowerTags until a verdict is reached for each of them.
+
+        :param batch: The configured PowerTags.
+        """
+        votes = {tag.name: Votes(self.sampling) for tag in batch}
+        pending = batch
+        while pending:
+            # Only the PowerTags whose samples do not agree yet are read again
+            readings = self.read_batch(pending)
+            for tag in pending:
+                votes[tag.name].add(readings_verdict(tag.name, readings[tag.name]))
+            pending = [tag for tag in pending if not votes[tag.name].decided]
+            if pending:
+                time.sleep(self.sampling.interval)
+        for tag in batch:
+            verdict = votes[tag.name].verdict()
+            if verdict.reply == -1:
+                self.reversals.put((tag, verdict))
+            else:
+                with self.lock:
+                    record_verdict(self.file_object, tag.name, verdict.reply, self.progress, verdict)
+
+    def apply_reversals(self) -> None:
+        """
+        Reverses the current flow of the PowerTags found with reversed readings so far.
+        """
+        while True:
+            try:
+                tag, verdict = self.reversals.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                with tagged(self.backend.timings, tag.name, tag.rfid):
+                    self.backend.select_device(tag.device)
+                    self.backend.reverse_current_flow(tag.device)
+            except BackendError as e:
+                logging.error(f"{tag.name}: Unable to change the direction of current flow: {e}")
+                with self.lock:
+                    record_verdict(self.file_object, tag.name, 0, self.progress, verdict)
+                continue
+            with self.lock:
+                record_verdict(self.file_object, tag.name, -1, self.progress, verdict)
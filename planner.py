@@ -0,0 +1,224 @@
+import csv
+import logging
+import statistics
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional
+
+from file_operations import EXCEL_EXPONENT, File, normalize_rfid
+from modbus import unit_id
+
+logger = logging.getLogger(__name__)
+
+# File the step timings of earlier runs are appended to
+TIMINGS_FILE = "PowerTags_timings.csv"
+
+# Steps taken once per run, their median duration is added to the estimate once
+RUN_STEPS = ('driver_init', 'navigate', 'security_warning', 'session', 'login', 'search', 'inventory')
+# Steps taken for every configured PowerTag, 'readings' is measured within 'check_values' and left out
+TAG_STEPS = ('click', 'device_form', 'save', 'check_values')
+
+# Planned actions of a PowerTag
+CONFIGURE, SKIP = 'configure', 'skip'
+
+
+class PlannedTag(NamedTuple):
+    """
+    A row of the project file with the action a run would take on it and the problems found.
+    """
+    row: int
+    name: str
+    rfid: str
+    server_id: Optional[int]
+    action: str
+    problems: List[str]
+
+
+class Plan(NamedTuple):
+    """
+    Outcome of the dry run of a project file.
+    """
+    tags: List[PlannedTag]
+    estimate: Optional[float]
+    history: int
+
+    @property
+    def to_configure(self) -> int:
+        """
+        :return: Number of PowerTags a run would configure.
+        """
+        return sum(tag.action == CONFIGURE for tag in self.tags)
+
+    @property
+    def problems(self) -> int:
+        """
+        :return: Number of rows with at least one problem.
+        """
+        return sum(bool(tag.problems) for tag in self.tags)
+
+
+def plan_tags(file_object: File) -> List[PlannedTag]:
+    """
+    Checks every row of a loaded project file for the conflicts a run would only find on the gateway.
+
+    :param file_object: File with the loaded PowerTags data.
+    :return: The planned action and the problems of every row, in the order of the file.
+    """
+    data = file_object.all_data
+    names: Dict[str, List[int]] = defaultdict(list)
+    servers: Dict[int, List[str]] = defaultdict(list)
+    for label, name, raw_rfid in zip(data.index, data['Name'], data['RF ID']):
+        names[name].append(label)
+        server_id = unit_id(name)
+        # Only the rows a run would configure take a server ID on the gateway
+        rfid = normalize_rfid(raw_rfid)
+        if rfid and file_object.rfid_index.get(rfid) == label and server_id is not None:
+            if name not in servers[server_id]:
+                servers[server_id].append(name)
+
+    tags = []
+    for label, name, raw_rfid, fuse in zip(data.index, data['Name'], data['RF ID'], data['Fuse']):
+        # Row numbers as shown in a spreadsheet, the header being row 1
+        row = int(label) + 2
+        rfid = normalize_rfid(raw_rfid)
+        server_id = unit_id(name)
+        problems = []
+        action = CONFIGURE
+        if not name:
+            problems.append("no name")
+            action = SKIP
+        elif names[name][0] != label:
+            problems.append(f"name also used in row {int(names[name][0]) + 2}, results of both rows are mixed")
+        if not raw_rfid.strip():
+            problems.append("no RFID")
+            action = SKIP
+        elif not rfid:
+            problems.append(f"RFID '{raw_rfid}' is not valid, e.g. mangled by Excel")
+            action = SKIP
+        else:
+            if EXCEL_EXPONENT.match(raw_rfid.strip().upper()):
+                problems.append(f"RFID '{raw_rfid}' was turned into a number by Excel, read as {rfid}")
+            first = file_object.rfid_index.get(rfid)
+            if first != label:
+                problems.append(f"RFID {rfid} also used in row {int(first) + 2}, this row is ignored")
+                action = SKIP
+        if not fuse:
+            problems.append("no fuse, the PowerTag would not be configured")
+            action = SKIP
+        if name and server_id is None:
+            problems.append("name does not end with a virtual server ID between 01 and 247")
+        elif action == CONFIGURE and len(servers[server_id]) > 1:
+            others = ', '.join(other for other in servers[server_id] if other != name)
+            problems.append(f"virtual server ID {server_id} also used by {others}")
+        tags.append(PlannedTag(row, name, rfid, server_id, action, problems))
+    return tags
+
+
+def step_history(timings_file: str = TIMINGS_FILE, gateway: Optional[str] = None) -> Dict[str, List[float]]:
+    """
+    Reads the step durations recorded by earlier runs.
+
+    :param timings_file: File the step timings are appended to.
+    :param gateway: Optional URL of the gateway, only its timings are used if it has any.
+    :return: Dictionary mapping the step name to its recorded durations in seconds.
+    """
+    steps: Dict[str, List[float]] = defaultdict(list)
+    gateway_steps: Dict[str, List[float]] = defaultdict(list)
+    try:
+        with open(timings_file, newline='', encoding='utf-8') as timings:
+            for row in csv.DictReader(timings, delimiter=';'):
+                try:
+                    seconds = float(row['Seconds'])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                steps[row['Step']].append(seconds)
+                if gateway and row.get('Gateway') == gateway:
+                    gateway_steps[row['Step']].append(seconds)
+    except FileNotFoundError:
+        logger.info(f"No timings recorded in {timings_file} yet.")
+    return gateway_steps or steps
+
+
+def estimate_duration(steps: Dict[str, List[float]], tag_count: int) -> Optional[float]:
+    """
+    Estimates how long a run configuring the given number of PowerTags takes.
+
+    :param steps: Recorded durations of every step.
+    :param tag_count: Number of PowerTags to configure.
+    :return: The estimated duration in seconds, or None if no PowerTag has been configured in the recorded runs.
+    """
+    opened = len(steps.get('device_form', []))
+    if not opened:
+        return None
+    run = sum(statistics.median(steps[step]) for step in RUN_STEPS if steps.get(step))
+    # Total time of the steps per opened device, so repeated steps such as the save after a reversal count too
+    per_tag = sum(sum(steps.get(step, [])) for step in TAG_STEPS) / opened
+    return run + per_tag * tag_count
+
+
+def plan_project(file_path: str, timings_file: str = TIMINGS_FILE, gateway: Optional[str] = None) -> Optional[Plan]:
+    """
+    Parses a project file once, as a run would, without connecting to the gateway.
+
+    :param file_path: The path to the CSV file containing PowerTags data.
+    :param timings_file: File the step timings of earlier runs are appended to.
+    :param gateway: Optional URL of the gateway whose timings are preferred for the estimate.
+    :return: The plan, or None if the data could not be loaded.
+    """
+    file_object = File(file_path)
+    if file_object.load_data() is None:
+        return None
+    tags = plan_tags(file_object)
+    steps = step_history(timings_file, gateway)
+    estimate = estimate_duration(steps, sum(tag.action == CONFIGURE for tag in tags))
+    return Plan(tags, estimate, sum(len(values) for values in steps.values()))
+
+
+def format_duration(seconds: float) -> str:
+    """
+    :param seconds: Duration in seconds.
+    :return: The duration as hours, minutes and seconds.
+    """
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours} h {minutes:02d} min" if hours else f"{minutes} min {seconds:02d} s"
+
+
+def report_lines(plan: Plan) -> List[str]:
+    """
+    Describes the planned action of every PowerTag, the problems found and the estimated run time.
+
+    :param plan: The plan of a project file.
+    :return: Lines of the report.
+    """
+    lines = []
+    for tag in plan.tags:
+        server = f"{tag.server_id:>3}" if tag.server_id is not None else '  -'
+        lines.append(f"row {tag.row:>4}  {tag.name or '-':<12} {tag.rfid or '-':<5} server {server}  "
+                     f"{tag.action:<9} {'; '.join(tag.problems)}")
+    lines.append(f"{plan.to_configure} of {len(plan.tags)} PowerTags would be configured, "
+                 f"{plan.problems} rows have problems.")
+    if plan.estimate is None:
+        lines.append("No PowerTags configured in earlier runs, unable to estimate the run time.")
+    else:
+        lines.append(f"Estimated run time: {format_duration(plan.estimate)} "
+                     f"(from {plan.history} recorded step timings).")
+    return lines
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Check a PowerTags project file and estimate the run time "
+                                                 "without connecting to the gateway.")
+    parser.add_argument('file', help="Semicolon separated project file with the columns Name, RF ID and Fuse.")
+    parser.add_argument('--timings', default=TIMINGS_FILE, help="Step timings recorded by earlier runs.")
+    parser.add_argument('--gateway', help="URL of the gateway whose recorded timings are preferred.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    project_plan = plan_project(args.file, args.timings, args.gateway)
+    if project_plan is None:
+        sys.exit(2)
+    print('\n'.join(report_lines(project_plan)))
+    sys.exit(1 if project_plan.problems else 0)
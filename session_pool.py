@@ -0,0 +1,181 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# File the authenticated cookies of the gateways are kept in between runs
+COOKIES_FILE = "PowerTags_cookies.json"
+
+# A cookie in the format used by Selenium: name, value, path, domain, secure, httpOnly and optional expiry
+Cookie = Dict[str, object]
+
+
+def gateway_key(url: str) -> str:
+    """
+    Returns the key the sessions of a gateway are kept under.
+
+    :param url: URL of the gateway.
+    :return: Scheme, host name and port of the URL.
+    """
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}" if parsed.netloc else url
+
+
+class CookieStore:
+    """
+    Keeps the authenticated cookies of every gateway on disk, so later runs can skip the login.
+    """
+
+    def __init__(self, path: str = COOKIES_FILE) -> None:
+        """
+        :param path: Path of the cookies file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, List[Cookie]]:
+        try:
+            with open(self.path, encoding='utf-8') as cookies_file:
+                return json.load(cookies_file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unable to read the cookies from {self.path}, logging in again: {e}")
+            return {}
+
+    def _write(self, cookies: Dict[str, List[Cookie]]) -> None:
+        temporary = f"{self.path}.tmp"
+        # The cookies grant access to the gateways, only the current user may read them
+        descriptor = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(descriptor, 'w', encoding='utf-8') as cookies_file:
+            json.dump(cookies, cookies_file)
+        os.replace(temporary, self.path)
+
+    def load(self, url: str) -> List[Cookie]:
+        """
+        Returns the stored cookies of a gateway which have not expired yet.
+
+        :param url: URL of the gateway.
+        :return: List of cookies, empty if there are none.
+        """
+        now = time.time()
+        with self._lock:
+            cookies = self._read().get(gateway_key(url), [])
+        return [cookie for cookie in cookies if cookie.get('expiry') is None or cookie['expiry'] > now]
+
+    def save(self, url: str, cookies: List[Cookie]) -> None:
+        """
+        Stores the cookies of a gateway, replacing the previous ones.
+
+        :param url: URL of the gateway.
+        :param cookies: Cookies of the authenticated session.
+        """
+        with self._lock:
+            stored = self._read()
+            stored[gateway_key(url)] = cookies
+            try:
+                self._write(stored)
+            except OSError as e:
+                logger.warning(f"Unable to save the cookies to {self.path}: {e}")
+
+    def forget(self, url: str) -> None:
+        """
+        Removes the stored cookies of a gateway, e.g. after they have been rejected.
+
+        :param url: URL of the gateway.
+        """
+        with self._lock:
+            stored = self._read()
+            if stored.pop(gateway_key(url), None) is not None:
+                try:
+                    self._write(stored)
+                except OSError as e:
+                    logger.warning(f"Unable to save the cookies to {self.path}: {e}")
+
+
+class SessionPool:
+    """
+    Keeps the logged-in browsers and HTTP sessions of the gateways warm between runs.
+
+    A run borrows the session of its gateway and hands it back when it quits, so the next run against the same
+    gateway, e.g. a re-check after a fix, starts without starting Chrome or logging in again.
+    """
+
+    def __init__(self, headless: bool = True, cookies_file: Optional[str] = COOKIES_FILE) -> None:
+        """
+        :param headless: Whether the browsers are started without a window.
+        :param cookies_file: File the authenticated cookies are kept in between runs, None to keep them in memory only.
+        """
+        self.headless = headless
+        self.cookies = CookieStore(cookies_file) if cookies_file else None
+        self._drivers: Dict[str, List] = defaultdict(list)
+        self._sessions: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def take_driver(self, url: str):
+        """
+        Borrows an idle browser of a gateway.
+
+        :param url: URL of the gateway.
+        :return: The WebDriver, or None if there is no idle browser still alive.
+        """
+        from selenium.common.exceptions import WebDriverException
+        while True:
+            with self._lock:
+                idle = self._drivers.get(gateway_key(url))
+                if not idle:
+                    return None
+                driver = idle.pop()
+            try:
+                # Fails if the browser has been closed or crashed in the meantime
+                driver.current_url
+                return driver
+            except WebDriverException:
+                logger.info(f"Discarding a closed browser of {gateway_key(url)}.")
+
+    def keep_driver(self, url: str, driver) -> None:
+        """
+        Hands a browser back to the pool, it stays logged in for the next run.
+
+        :param url: URL of the gateway.
+        :param driver: The WebDriver.
+        """
+        with self._lock:
+            self._drivers[gateway_key(url)].append(driver)
+
+    def http_session(self, url: str, factory: Callable[[], object]):
+        """
+        Returns the HTTP session of a gateway, keeping its connections and cookies between runs.
+
+        :param url: URL of the gateway.
+        :param factory: Creates a new session if the gateway has none yet.
+        :return: The session.
+        """
+        with self._lock:
+            key = gateway_key(url)
+            if key not in self._sessions:
+                self._sessions[key] = factory()
+            return self._sessions[key]
+
+    def close(self) -> None:
+        """
+        Quits all browsers and closes all HTTP sessions. The stored cookies are kept.
+        """
+        with self._lock:
+            drivers = [driver for idle in self._drivers.values() for driver in idle]
+            sessions = list(self._sessions.values())
+            self._drivers.clear()
+            self._sessions.clear()
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception as e:
+                logger.warning(f"Unable to quit a browser: {e}")
+        for session in sessions:
+            session.close()
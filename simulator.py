@@ -0,0 +1,648 @@
+import json
+import logging
+import random
+import secrets
+import socketserver
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from backends import (CURRENT_FLOW_FIELD_ID, DISCOVERY_STATUS_FIELD_ID, HttpBackend, LABEL_FIELD_ID, NAME_FIELD_ID,
+                      READING_TITLES, SOURCE_ID_FIELD_ID, UNIT_ID_FIELD_ID, is_float)
+from bulk_config import CONFIGURATION_VERSION
+from modbus import (ACTIVE_POWER_A_OFFSET, ACTIVE_POWER_B_OFFSET, ACTIVE_POWER_C_OFFSET, FIRST_REGISTER,
+                    POWER_FACTOR_OFFSET, READ_HOLDING_REGISTERS, REGISTER_COUNT)
+
+logger = logging.getLogger(__name__)
+
+# Ways a simulated PowerTag can be mounted, selecting its readings
+FORWARD, REVERSED, FAULTY = 'forward', 'reversed', 'faulty'
+
+# Device form inputs of the web interface and the device fields they show
+FORM_FIELDS = {'ZigBeeGreenPowerDevice.Identification_elements.source_id.value': SOURCE_ID_FIELD_ID,
+               'PhysicalIdentification.UserApplicationName_value': NAME_FIELD_ID,
+               'ElectricalTopology.Label': LABEL_FIELD_ID,
+               'Device.Component_virtual_device_elements.unit_id.value-number': UNIT_ID_FIELD_ID,
+               'ElectricalCharacteristics.CurrentFlow': CURRENT_FLOW_FIELD_ID}
+
+# Single page imitating the DOM structure of the PAS600 web interface the Selenium backend relies on
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<title>PAS600 simulator</title>
+<style>
+se-app, app-root, app-shell, se-container, app-tab, app-real-time, se-block, se-block-content, se-list,
+app-generic-treeview, app-generic-treeview-dumb, se-list-group, se-table, se-table-item, app-card-menu-dumb,
+se-list-item, se-fab, se-button { display: block; }
+[hidden] { display: none !important; }
+</style>
+</head>
+<body>
+<div id="login">
+    <input id="username" autocomplete="off">
+    <input id="password" type="password">
+    <button class="login-btn">Log in</button>
+</div>
+<se-app hidden>
+    <app-root>
+        <app-shell>
+            <nav>
+                <a routerlink="/settings" href="#">Settings</a>
+                <app-card-menu-dumb cardtitle="Wireless Devices" hidden>Wireless Devices</app-card-menu-dumb>
+                <se-list-item hidden>Discovery</se-list-item>
+                <se-list-item hidden>Devices</se-list-item>
+                <button id="switchbutton">Search for new devices</button>
+                <span id="ZigBeePermitJoin.Information_elements.disco_status">Idle</span>
+                <button id="real-time-button">Real time</button>
+                <button id="settings-button">Settings</button>
+            </nav>
+            <se-container>
+                <app-tab>
+                    <se-container><se-block><se-block-content><se-list><se-container><se-list>
+                        <app-generic-treeview><app-generic-treeview-dumb>
+                            <se-list-group id="device-tree"></se-list-group>
+                        </app-generic-treeview-dumb></app-generic-treeview>
+                    </se-list></se-container></se-list></se-block-content></se-block></se-container>
+                    <form id="device-form" hidden onsubmit="return false">
+                        <input id="ZigBeeGreenPowerDevice.Identification_elements.source_id.value" readonly>
+                        <input id="PhysicalIdentification.UserApplicationName_value">
+                        <input id="ElectricalTopology.Label">
+                        <input id="Device.Component_virtual_device_elements.unit_id.value-number">
+                        <select id="ElectricalCharacteristics.CurrentFlow">
+                            <option>Forward</option>
+                            <option>Reverse</option>
+                        </select>
+                        <se-fab><se-button icon="action_save" hidden>Save</se-button></se-fab>
+                    </form>
+                </app-tab>
+                <app-real-time hidden>
+                    <se-container><se-block><se-block-content>
+                        <div><div><div>Device</div><div id="real-time-device">Show readings</div></div></div>
+                        <se-table id="real-time-table"></se-table>
+                    </se-block-content></se-block></se-container>
+                </app-real-time>
+            </se-container>
+        </app-shell>
+    </app-root>
+</se-app>
+<script>
+var FIELDS = __FIELDS__;
+var TITLES = __TITLES__;
+var current = null;
+var refresh = null;
+var save = document.querySelector('se-button[icon="action_save"]');
+var fab = document.querySelector('se-fab');
+fab.attachShadow({mode: 'open'}).innerHTML = '<se-button>Menu</se-button><slot></slot>';
+
+function api(method, path, body) {
+    var options = {method: method, headers: {'Content-Type': 'application/json'}};
+    if (body !== undefined) options.body = JSON.stringify(body);
+    return fetch(path, options).then(function (response) { return response.json(); });
+}
+
+function loadTree() {
+    return api('GET', '/api/devices').then(function (devices) {
+        var tree = document.getElementById('device-tree');
+        tree.innerHTML = '';
+        devices.forEach(function (device) {
+            var block = document.createElement('se-block');
+            block.textContent = device[FIELDS['PhysicalIdentification.UserApplicationName_value']] || 'PowerTag';
+            block.addEventListener('click', function () { openDevice(device.id); });
+            tree.appendChild(block);
+        });
+    });
+}
+
+function openDevice(id) {
+    api('GET', '/api/devices/' + id).then(function (fields) {
+        current = id;
+        Object.keys(FIELDS).forEach(function (input) {
+            document.getElementById(input).value = fields[FIELDS[input]];
+        });
+        save.hidden = true;
+        document.getElementById('device-form').hidden = false;
+    });
+}
+
+function showTab(realTime) {
+    document.querySelector('app-tab').hidden = realTime;
+    document.querySelector('app-real-time').hidden = !realTime;
+    document.getElementById('real-time-table').innerHTML = '';
+    clearInterval(refresh);
+}
+
+function showReadings() {
+    api('GET', '/api/devices/' + current + '/realtime').then(function (values) {
+        var table = document.getElementById('real-time-table');
+        table.innerHTML = '';
+        TITLES.forEach(function (title) {
+            var item = document.createElement('se-table-item');
+            item.setAttribute('title', title);
+            item.textContent = title;
+            var value = document.createElement('se-table-item');
+            value.textContent = values[title];
+            table.appendChild(item);
+            table.appendChild(value);
+        });
+    });
+}
+
+function showApp() {
+    document.getElementById('login').hidden = true;
+    document.querySelector('se-app').hidden = false;
+}
+
+// Like on the gateway, the device tree is only shown once Settings, Wireless Devices and the device list are opened
+document.querySelector('a[routerlink="/settings"]').addEventListener('click', function (event) {
+    event.preventDefault();
+    document.querySelector('app-card-menu-dumb').hidden = false;
+});
+document.querySelector('app-card-menu-dumb').addEventListener('click', function () {
+    document.querySelectorAll('se-list-item').forEach(function (item) { item.hidden = false; });
+});
+document.querySelectorAll('se-list-item')[1].addEventListener('click', function () { loadTree(); });
+
+document.querySelector('.login-btn').addEventListener('click', function () {
+    api('POST', '/api/login', {username: document.getElementById('username').value,
+                               password: document.getElementById('password').value}).then(function (reply) {
+        if (!reply.error) showApp();
+    });
+});
+// A still valid session cookie skips the login form
+api('GET', '/api/discovery').then(function (reply) {
+    if (!reply.error) showApp();
+});
+document.getElementById('switchbutton').addEventListener('click', function () {
+    var status = document.getElementById('ZigBeePermitJoin.Information_elements.disco_status');
+    // The switch button ends a running search
+    if (status.textContent === 'Searching') {
+        api('DELETE', '/api/discovery');
+        return;
+    }
+    status.textContent = 'Searching';
+    api('POST', '/api/discovery').then(function () {
+        var poll = setInterval(function () {
+            api('GET', '/api/discovery').then(function (reply) {
+                var text = reply['__STATUS__'];
+                if (text !== 'Searching') {
+                    clearInterval(poll);
+                    loadTree().then(function () { status.textContent = text; });
+                    return;
+                }
+                // PowerTags joining during the search are added to the tree
+                api('GET', '/api/devices').then(function (devices) {
+                    if (devices.length !== document.getElementById('device-tree').children.length) loadTree();
+                });
+            });
+        }, 500);
+    });
+});
+document.getElementById('device-form').addEventListener('input', function () { save.hidden = false; });
+document.getElementById('device-form').addEventListener('change', function () { save.hidden = false; });
+save.addEventListener('click', function () {
+    var fields = {};
+    Object.keys(FIELDS).forEach(function (input) {
+        if (!document.getElementById(input).readOnly) fields[FIELDS[input]] = document.getElementById(input).value;
+    });
+    api('PATCH', '/api/devices/' + current, fields).then(function (reply) {
+        if (!reply.error) save.hidden = true;
+    });
+});
+document.getElementById('real-time-button').addEventListener('click', function () { showTab(true); });
+document.getElementById('settings-button').addEventListener('click', function () { showTab(false); });
+document.getElementById('real-time-device').addEventListener('click', function () {
+    showReadings();
+    clearInterval(refresh);
+    refresh = setInterval(showReadings, 1000);
+});
+</script>
+</body>
+</html>
+"""
+
+
+class SimulatedDevice:
+    """
+    A PowerTag known to the simulated gateway.
+    """
+
+    def __init__(self, device_id: str, source_id: str, mounting: str = FORWARD, phases: int = 3) -> None:
+        """
+        :param device_id: Identifier of the device in the gateway.
+        :param source_id: Full RFID of the device.
+        :param mounting: How the PowerTag is mounted: forward, reversed or faulty.
+        :param phases: Number of phases measured by the PowerTag, 1 or 3.
+        """
+        self.id = device_id
+        self.mounting = mounting
+        self.phases = phases
+        self.fields = {SOURCE_ID_FIELD_ID: source_id,
+                       NAME_FIELD_ID: '',
+                       LABEL_FIELD_ID: '',
+                       UNIT_ID_FIELD_ID: '',
+                       CURRENT_FLOW_FIELD_ID: 'Forward'}
+
+    def readings(self) -> Dict[str, str]:
+        """
+        Returns the current real-time values of the device.
+
+        :return: Dictionary mapping the title of the value to its text.
+        """
+        if self.mounting == FAULTY:
+            pf, power = 0.2, 15.0
+        else:
+            pf, power = 0.92, 230.0 + random.uniform(-5, 5)
+            # A reversed PowerTag measures negative values until its current flow is reversed
+            if (self.mounting == REVERSED) != (self.fields[CURRENT_FLOW_FIELD_ID] == 'Reverse'):
+                pf, power = -pf, -power
+        other = f"{power:.1f}" if self.phases == 3 else '-'
+        return {'Total power factor': f"{pf:.2f}",
+                'Active power A': f"{power:.1f}",
+                'Active power B': other,
+                'Active power C': other}
+
+    def registers(self) -> List[int]:
+        """
+        Returns the Modbus registers of the device holding its current readings.
+
+        :return: Registers starting at FIRST_REGISTER, unavailable values are NaN.
+        """
+        registers = [0xFFFF] * REGISTER_COUNT
+        values = self.readings()
+        for offset, title in ((POWER_FACTOR_OFFSET, 'Total power factor'), (ACTIVE_POWER_A_OFFSET, 'Active power A'),
+                              (ACTIVE_POWER_B_OFFSET, 'Active power B'), (ACTIVE_POWER_C_OFFSET, 'Active power C')):
+            value = float(values[title]) if is_float(values[title]) else float('nan')
+            registers[offset:offset + 2] = struct.unpack('>HH', struct.pack('>f', value))
+        return registers
+
+
+class GatewaySimulator:
+    """
+    Local stand-in for a PAS600 gateway serving its web interface and web backend on localhost.
+    """
+
+    def __init__(self, device_count: int = 20, password: str = 'password', rfids: Optional[List[str]] = None,
+                 reversed_ratio: float = 0.2, faulty_ratio: float = 0.1, discovery_time: float = 0.0,
+                 latency: float = 0.0, jitter: float = 0.0, seed: int = 0,
+                 session_lifetime: Optional[float] = None, join_time: float = 0.0) -> None:
+        """
+        :param device_count: Number of simulated PowerTags, ignored if rfids are given.
+        :param password: Password accepted by the login.
+        :param rfids: Optional RFIDs (last 4 hex digits) of the simulated PowerTags.
+        :param reversed_ratio: Share of PowerTags mounted in reverse.
+        :param faulty_ratio: Share of PowerTags with readings to check by an engineer.
+        :param discovery_time: Duration of the simulated search for new PowerTags in seconds.
+        :param latency: Delay of every response of the web backend in seconds.
+        :param jitter: Maximum random delay in seconds added to the latency.
+        :param seed: Seed of the random mounting of the PowerTags.
+        :param session_lifetime: Time in seconds a login session stays valid, unlimited if not given.
+        :param join_time: Time in seconds after the start of the first search within which the PowerTags join
+            the gateway one by one, all of them are known from the start if 0.
+        """
+        self.password = password
+        self.discovery_time = discovery_time
+        self.latency = latency
+        self.jitter = jitter
+        self.session_lifetime = session_lifetime
+        self.discovery_end = 0.0
+        self.join_time = join_time
+        self.discovery_start: Optional[float] = None
+        # Session tokens and the time they expire at
+        self.tokens: Dict[str, float] = {}
+        self.lock = threading.Lock()
+        generator = random.Random(seed)
+        if rfids is None:
+            rfids = [f"{index:04X}" for index in range(0x1000, 0x1000 + device_count)]
+        self.devices: List[SimulatedDevice] = []
+        for index, rfid in enumerate(rfids, start=1):
+            draw = generator.random()
+            mounting = REVERSED if draw < reversed_ratio else FAULTY if draw < reversed_ratio + faulty_ratio else FORWARD
+            self.devices.append(SimulatedDevice(str(index), f"0000{generator.getrandbits(16):04X}{rfid}", mounting,
+                                                generator.choice((1, 3))))
+        # Drawn separately, so the PowerTags of a seed are the same with and without joining
+        joins = random.Random(seed + 1)
+        self.join_offsets = {device.id: joins.uniform(0, join_time) for device in self.devices}
+        self.server: Optional[ThreadingHTTPServer] = None
+        self.modbus_server: Optional[socketserver.ThreadingTCPServer] = None
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """
+        URL of the running simulator.
+        """
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def modbus_port(self) -> int:
+        """
+        TCP port of the running Modbus server.
+        """
+        return self.modbus_server.server_address[1]
+
+    def joined(self) -> List[SimulatedDevice]:
+        """
+        Returns the devices which have joined the gateway so far.
+
+        :return: The devices known to the gateway, the ones joined last at the end like in the device tree.
+        """
+        if not self.join_time:
+            return self.devices
+        if self.discovery_start is None:
+            return []
+        elapsed = time.monotonic() - self.discovery_start
+        return sorted((device for device in self.devices if self.join_offsets[device.id] <= elapsed),
+                      key=lambda device: self.join_offsets[device.id])
+
+    def device(self, device_id: str) -> Optional[SimulatedDevice]:
+        """
+        Returns the device with the given identifier.
+
+        :param device_id: Identifier of the device.
+        :return: The device, or None if there is no such device.
+        """
+        for device in self.joined():
+            if device.id == device_id:
+                return device
+        return None
+
+    def device_by_unit(self, unit: int) -> Optional[SimulatedDevice]:
+        """
+        Returns the device with the given virtual Modbus server ID.
+
+        :param unit: Virtual server ID of the device.
+        :return: The device, or None if no device has this server ID.
+        """
+        for device in self.devices:
+            if device.fields[UNIT_ID_FIELD_ID].isdigit() and int(device.fields[UNIT_ID_FIELD_ID]) == unit:
+                return device
+        return None
+
+    def expire_sessions(self) -> None:
+        """
+        Invalidates all login sessions, as a restart of the gateway does.
+        """
+        self.tokens.clear()
+
+    def start(self) -> str:
+        """
+        Starts serving the web interface and the Modbus server on free ports of localhost in background threads.
+
+        :return: URL of the simulator.
+        """
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.server.daemon_threads = True
+        self.server.simulator = self
+        self.thread = threading.Thread(target=self.server.serve_forever, name='gateway-simulator', daemon=True)
+        self.thread.start()
+        self.modbus_server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _ModbusHandler)
+        self.modbus_server.daemon_threads = True
+        self.modbus_server.simulator = self
+        threading.Thread(target=self.modbus_server.serve_forever, name='modbus-simulator', daemon=True).start()
+        logger.info(f"Gateway simulator with {len(self.devices)} PowerTags listening on {self.url}, "
+                    f"Modbus on port {self.modbus_port}.")
+        return self.url
+
+    def stop(self) -> None:
+        """
+        Stops the simulator.
+        """
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self.modbus_server:
+            self.modbus_server.shutdown()
+            self.modbus_server.server_close()
+            self.modbus_server = None
+
+    def __enter__(self) -> 'GatewaySimulator':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    Serves the requests of a GatewaySimulator.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    @property
+    def simulator(self) -> GatewaySimulator:
+        return self.server.simulator
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(format % args)
+
+    def _send(self, status: int, body=None, headers: Optional[Dict[str, str]] = None) -> None:
+        delay = self.simulator.latency + random.uniform(0, self.simulator.jitter)
+        if delay:
+            time.sleep(delay)
+        payload = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length)) if length else None
+
+    def _authorized(self) -> bool:
+        cookie = self.headers.get('Cookie') or ''
+        tokens = {part.strip()[len('session='):] for part in cookie.split(';') if part.strip().startswith('session=')}
+        now = time.monotonic()
+        if any(self.simulator.tokens.get(token, 0) > now for token in tokens):
+            return True
+        self._send(401, {'error': 'Unauthorized'})
+        return False
+
+    def _device(self):
+        parts = self.path.strip('/').split('/')
+        device = self.simulator.device(parts[2]) if len(parts) >= 3 else None
+        if device is None:
+            self._send(404, {'error': 'Device not found'})
+        return device, parts[3:]
+
+    def do_POST(self) -> None:
+        body = self._body()
+        if self.path == HttpBackend.LOGIN_PATH:
+            if body and body.get('username') == HttpBackend.USERNAME and body.get('password') == self.simulator.password:
+                token = secrets.token_hex(16)
+                lifetime = self.simulator.session_lifetime
+                self.simulator.tokens[token] = time.monotonic() + lifetime if lifetime else float('inf')
+                max_age = f'; Max-Age={int(lifetime)}' if lifetime else ''
+                self._send(200, {}, {'Set-Cookie': f'session={token}; Path=/; HttpOnly{max_age}'})
+            else:
+                self._send(401, {'error': 'Invalid credentials'})
+        elif self.path == HttpBackend.DISCOVERY_PATH and self._authorized():
+            now = time.monotonic()
+            self.simulator.discovery_end = now + self.simulator.discovery_time
+            if self.simulator.discovery_start is None:
+                self.simulator.discovery_start = now
+            self._send(200, {})
+        elif self.path == HttpBackend.CONFIGURATION_PATH and self._authorized():
+            self._import(body)
+        elif self.path not in (HttpBackend.DISCOVERY_PATH, HttpBackend.CONFIGURATION_PATH):
+            self._send(404, {'error': 'Not found'})
+
+    def _import(self, configuration) -> None:
+        # Like the gateway, the whole configuration is applied or none of it
+        if not isinstance(configuration, dict) or configuration.get('version') != CONFIGURATION_VERSION:
+            self._send(400, {'error': 'Unsupported configuration version'})
+            return
+        devices = {device.fields[SOURCE_ID_FIELD_ID][-4:]: device for device in self.simulator.joined()}
+        changes, errors = [], []
+        for entry in configuration.get('devices') or []:
+            device = devices.get(str(entry.get('rfid')))
+            fields = entry.get('fields') or {}
+            unknown = [key for key in fields if key not in FORM_FIELDS.values() or key == SOURCE_ID_FIELD_ID]
+            if device is None:
+                errors.append(f"{entry.get('rfid')}: device not found")
+            elif unknown:
+                errors.append(f"{entry.get('rfid')}: unknown fields {unknown}")
+            else:
+                changes.append((device, fields))
+        if errors:
+            self._send(400, {'error': 'Configuration rejected', 'details': errors})
+            return
+        with self.simulator.lock:
+            for device, fields in changes:
+                device.fields.update({key: str(value) for key, value in fields.items()})
+        self._send(200, {'imported': len(changes)})
+
+    def _send_page(self) -> None:
+        payload = (PAGE.replace('__FIELDS__', json.dumps(FORM_FIELDS))
+                   .replace('__TITLES__', json.dumps(list(READING_TITLES)))
+                   .replace('__STATUS__', DISCOVERY_STATUS_FIELD_ID)).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self) -> None:
+        if self.path.split('?')[0] in ('/', '/index.html'):
+            self._send_page()
+            return
+        if not self._authorized():
+            return
+        if self.path == HttpBackend.DISCOVERY_PATH:
+            searching = time.monotonic() < self.simulator.discovery_end
+            self._send(200, {DISCOVERY_STATUS_FIELD_ID: "Searching" if searching else "Finished"})
+        elif self.path == HttpBackend.DEVICES_PATH:
+            self._send(200, [dict(device.fields, id=device.id) for device in self.simulator.joined()])
+        elif self.path.startswith(HttpBackend.DEVICES_PATH + '/'):
+            device, rest = self._device()
+            if device is None:
+                return
+            if rest == ['realtime']:
+                self._send(200, device.readings())
+            elif not rest:
+                with self.simulator.lock:
+                    self._send(200, dict(device.fields))
+            else:
+                self._send(404, {'error': 'Not found'})
+        else:
+            self._send(404, {'error': 'Not found'})
+
+    def do_DELETE(self) -> None:
+        if self.path != HttpBackend.DISCOVERY_PATH:
+            self._send(404, {'error': 'Not found'})
+        elif self._authorized():
+            self.simulator.discovery_end = time.monotonic()
+            self._send(200, {})
+
+    def do_PATCH(self) -> None:
+        if not self._authorized():
+            return
+        device, rest = self._device()
+        if device is None:
+            return
+        body = self._body() or {}
+        unknown = [key for key in body if key not in device.fields or key == SOURCE_ID_FIELD_ID]
+        if rest or unknown:
+            self._send(400, {'error': f'Unknown fields: {unknown}'})
+            return
+        with self.simulator.lock:
+            device.fields.update({key: str(value) for key, value in body.items()})
+        self._send(200, dict(device.fields))
+
+
+class _ModbusHandler(socketserver.BaseRequestHandler):
+    """
+    Serves the Modbus TCP requests of a GatewaySimulator, reading holding registers only.
+    """
+
+    def _receive(self, size: int) -> bytes:
+        data = b''
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                return b''
+            data += chunk
+        return data
+
+    def handle(self) -> None:
+        simulator = self.server.simulator
+        while True:
+            header = self._receive(7)
+            if not header:
+                return
+            transaction, protocol, length, unit = struct.unpack('>HHHB', header)
+            pdu = self._receive(length - 1)
+            if not pdu:
+                return
+            if simulator.latency:
+                time.sleep(simulator.latency)
+            function = pdu[0]
+            device = simulator.device_by_unit(unit)
+            if function != READ_HOLDING_REGISTERS:
+                reply = struct.pack('>BB', function | 0x80, 0x01)
+            elif device is None:
+                reply = struct.pack('>BB', function | 0x80, 0x0B)
+            else:
+                address, count = struct.unpack('>HH', pdu[1:5])
+                offset = address - FIRST_REGISTER
+                if offset < 0 or offset + count > REGISTER_COUNT:
+                    reply = struct.pack('>BB', function | 0x80, 0x02)
+                else:
+                    registers = device.registers()[offset:offset + count]
+                    reply = struct.pack(f'>BB{count}H', function, 2 * count, *registers)
+            self.request.sendall(struct.pack('>HHHB', transaction, protocol, len(reply) + 1, unit) + reply)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve a simulated PAS600 gateway on localhost.")
+    parser.add_argument('--devices', type=int, default=20, help="Number of simulated PowerTags.")
+    parser.add_argument('--password', default='password', help="Password accepted by the login.")
+    parser.add_argument('--latency', type=float, default=0.0, help="Delay of every response in seconds.")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Maximum random delay added to the latency.")
+    parser.add_argument('--discovery-time', type=float, default=5.0, help="Duration of the search in seconds.")
+    parser.add_argument('--session-lifetime', type=float, help="Time in seconds a login session stays valid.")
+    parser.add_argument('--join-time', type=float, default=0.0,
+                        help="Time in seconds within which the PowerTags join once the search has started.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    simulator = GatewaySimulator(args.devices, args.password, discovery_time=args.discovery_time,
+                                 latency=args.latency, jitter=args.jitter, session_lifetime=args.session_lifetime,
+                                 join_time=args.join_time)
+    simulator.start()
+    try:
+        simulator.thread.join()
+    except KeyboardInterrupt:
+        simulator.stop()
@@ -0,0 +1,217 @@
+import csv
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import ContextManager, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# JSON-lines file the individual timing events are appended to
+EVENTS_FILE = "PowerTags_events.jsonl"
+
+# Number of events kept in memory before they are appended to the events file
+EVENTS_BUFFER_SIZE = 256
+
+# Serializes appends of several gateways running in parallel to the same timings and events files
+_file_lock = threading.Lock()
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Returns the given percentile of the values using the nearest-rank method.
+
+    :param values: Values to compute the percentile of.
+    :param fraction: Percentile as a fraction between 0 and 1.
+    :return: The percentile, or 0.0 if there are no values.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+class StepTimings:
+    """
+    Collects how long each step of a configuration run actually took on a gateway.
+    """
+
+    def __init__(self, gateway: str = '', events_file: Optional[str] = None) -> None:
+        """
+        Initializes an empty collection of step timings.
+
+        :param gateway: Name or URL of the gateway the timings are recorded for.
+        :param events_file: Optional JSON-lines file every recorded duration is appended to as an event.
+        """
+        self.gateway = gateway
+        self.events_file = events_file
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        # Total recorded time and name of every PowerTag, keyed by its RFID, or by its name if the RFID is unknown
+        self.tag_totals: Dict[str, float] = defaultdict(float)
+        self.tag_ids: Dict[str, Tuple[str, str]] = {}
+        self.events: List[str] = []
+        # Numbers of occurrences, e.g. of the round trips to the gateway
+        self.counters: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        # PowerTag the current thread is working on
+        self._context = threading.local()
+
+    def record(self, step: str, seconds: float, tag: Optional[str] = None, rfid: Optional[str] = None) -> None:
+        """
+        Records a single duration of a step.
+
+        :param step: Name of the step.
+        :param seconds: Duration of the step in seconds.
+        :param tag: Name of the PowerTag the step belongs to, the one set by tagged is used if not given.
+        :param rfid: RFID of the PowerTag the step belongs to, the one set by tagged is used if not given.
+        """
+        tag = getattr(self._context, 'tag', '') if tag is None else tag
+        rfid = getattr(self._context, 'rfid', '') if rfid is None else rfid
+        flush = False
+        with self._lock:
+            self.samples[step].append(seconds)
+            if tag or rfid:
+                key = rfid or tag
+                self.tag_totals[key] += seconds
+                known_tag, known_rfid = self.tag_ids.get(key, ('', ''))
+                self.tag_ids[key] = (tag or known_tag, rfid or known_rfid)
+            if self.events_file:
+                self.events.append(json.dumps({'time': round(time.time(), 3), 'gateway': self.gateway,
+                                               'step': step, 'tag': tag, 'rfid': rfid,
+                                               'seconds': round(seconds, 4)}))
+                flush = len(self.events) >= EVENTS_BUFFER_SIZE
+        if flush:
+            self.flush_events()
+
+    def count(self, counter: str, increment: int = 1) -> None:
+        """
+        Counts an occurrence, e.g. a round trip to the gateway.
+
+        :param counter: Name of the counter.
+        :param increment: Number of occurrences to add.
+        """
+        with self._lock:
+            self.counters[counter] += increment
+
+    @contextmanager
+    def tagged(self, tag: str, rfid: str = '') -> Iterator[None]:
+        """
+        Attributes the durations recorded by the current thread within the enclosed block to a PowerTag.
+
+        :param tag: Name of the PowerTag.
+        :param rfid: RFID of the PowerTag.
+        """
+        previous = getattr(self._context, 'tag', ''), getattr(self._context, 'rfid', '')
+        self._context.tag, self._context.rfid = tag, rfid
+        try:
+            yield
+        finally:
+            self._context.tag, self._context.rfid = previous
+
+    @contextmanager
+    def measure(self, step: str) -> Iterator[None]:
+        """
+        Measures the duration of the enclosed block and records it under the given step.
+
+        :param step: Name of the step.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(step, time.perf_counter() - start)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Summarizes the recorded durations of every step.
+
+        :return: Dictionary mapping the step name to its count, p50, p95 and max duration.
+        """
+        with self._lock:
+            return {step: {'count': len(values),
+                           'p50': percentile(values, 0.5),
+                           'p95': percentile(values, 0.95),
+                           'max': max(values)}
+                    for step, values in self.samples.items() if values}
+
+    def slowest_tags(self, count: int = 5) -> List[Tuple[str, str, float]]:
+        """
+        Returns the PowerTags which took the longest in total.
+
+        :param count: Maximum number of returned PowerTags.
+        :return: List of the PowerTag name, RFID and total recorded duration in seconds, the slowest first.
+        """
+        with self._lock:
+            totals = sorted(self.tag_totals.items(), key=lambda item: item[1], reverse=True)[:count]
+            return [(*self.tag_ids[key], seconds) for key, seconds in totals]
+
+    def log_summary(self) -> None:
+        """
+        Logs the summary of every step, the counters and the slowest PowerTags.
+        """
+        for step, stats in self.summary().items():
+            logger.info(f"[{self.gateway}] {step}: n={stats['count']}, p50={stats['p50']:.2f} s, "
+                        f"p95={stats['p95']:.2f} s, max={stats['max']:.2f} s")
+        for counter, value in sorted(self.counters.items()):
+            logger.info(f"[{self.gateway}] {counter}: {value}")
+        for tag, rfid, seconds in self.slowest_tags():
+            logger.info(f"[{self.gateway}] slowest: {tag or '-'} ({rfid or '-'}) {seconds:.2f} s")
+
+    def flush_events(self) -> None:
+        """
+        Appends the buffered events to the events file.
+        """
+        with self._lock:
+            events, self.events = self.events, []
+        if not events or not self.events_file:
+            return
+        with _file_lock:
+            with open(self.events_file, 'a', encoding='utf-8') as events_file:
+                events_file.write('\n'.join(events) + '\n')
+
+    def save(self, filename: str = "PowerTags_timings.csv") -> None:
+        """
+        Appends all recorded durations to a CSV file, so the latency distribution can be compared across runs.
+
+        :param filename: Name of the timings file.
+        """
+        self.flush_events()
+        with self._lock:
+            rows = [(self.gateway, step, f"{seconds:.3f}") for step, values in self.samples.items()
+                    for seconds in values]
+        with _file_lock:
+            new_file = not os.path.exists(filename)
+            with open(filename, 'a', newline='', encoding='utf-8') as timings_file:
+                writer = csv.writer(timings_file, delimiter=';')
+                if new_file:
+                    writer.writerow(['Gateway', 'Step', 'Seconds'])
+                writer.writerows(rows)
+        logger.info(f"Step timings successfully saved to {filename}.")
+
+
+def measure(timings: Optional[StepTimings], step: str) -> ContextManager:
+    """
+    Measures the enclosed block if a collection of timings is given.
+
+    :param timings: Optional collection the duration is recorded in.
+    :param step: Name of the step.
+    :return: Context manager measuring the block.
+    """
+    return timings.measure(step) if timings else nullcontext()
+
+
+def tagged(timings: Optional[StepTimings], tag: str, rfid: str = '') -> ContextManager:
+    """
+    Attributes the durations recorded within the enclosed block to a PowerTag if a collection of timings is given.
+
+    :param timings: Optional collection the durations are recorded in.
+    :param tag: Name of the PowerTag.
+    :param rfid: RFID of the PowerTag.
+    :return: Context manager setting the PowerTag.
+    """
+    return timings.tagged(tag, rfid) if timings else nullcontext()